@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Compare job shapes and scaling options for a workload on a recorded pool trace.
+
+Runs ``dask_iclx.simulation.CapacitySimulator`` offline for every shape given as
+``CORES:MEMORY:JOBS`` (``JOBS`` may be ``adapt`` for adaptive scaling up to
+``--maximum`` jobs) and prints time-to-capacity, makespan and idle slot-hours.
+
+    python benchmarks/capacity.py trace.json workload.json --shape 1:2GiB:500 4:8GiB:125
+    python benchmarks/capacity.py trace.json workload.json --shape 4:8GiB:adapt --hedge 0 0.1
+"""
+
+import argparse
+import statistics
+
+from dask_iclx.simulation import CapacitySimulator, PoolTrace, Workload
+
+
+def fmt(seconds):
+    return "never" if seconds is None else f"{seconds / 60:.1f}m"
+
+
+def median(results, attr):
+    values = [getattr(r, attr) for r in results]
+    if any(v is None for v in values):
+        return None
+    return statistics.median(values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("trace", help="pool trace JSON file")
+    parser.add_argument("workload", help="workload JSON file")
+    parser.add_argument("--shape", nargs="+", default=["1:2GiB:100"])
+    parser.add_argument("--hedge", type=float, nargs="+", default=[0])
+    parser.add_argument("--fairshare", action="store_true")
+    parser.add_argument(
+        "--maximum", type=int, default=500, help="adaptive maximum jobs"
+    )
+    parser.add_argument("--trials", type=int, default=20)
+    args = parser.parse_args()
+
+    trace = PoolTrace.from_file(args.trace)
+    workload = Workload.from_file(args.workload)
+    print(
+        f"{'shape':>16} {'hedge':>6} {'to capacity':>12} {'makespan':>10}"
+        f" {'idle slot-h':>12} {'evictions':>10}"
+    )
+    for shape in args.shape:
+        cores, memory, jobs = shape.split(":")
+        scaling = (
+            {"adapt": {"maximum": args.maximum}}
+            if jobs == "adapt"
+            else {"jobs": int(jobs)}
+        )
+        for fraction in args.hedge:
+            results = [
+                CapacitySimulator(
+                    trace,
+                    workload,
+                    cores=int(cores),
+                    memory=memory,
+                    hedge=fraction,
+                    fairshare=args.fairshare,
+                    seed=seed,
+                    **scaling,
+                ).run()
+                for seed in range(args.trials)
+            ]
+
+            print(
+                f"{shape:>16} {fraction:6.2f}"
+                f" {fmt(median(results, 'time_to_capacity')):>12}"
+                f" {fmt(median(results, 'makespan')):>10}"
+                f" {median(results, 'idle_slot_hours'):12.1f}"
+                f" {median(results, 'evictions'):10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
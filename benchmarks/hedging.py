@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Benchmark the time until all requested workers run, with and without hedging.
+
+By default the ramp-up is simulated: every job's time to match and start is
+drawn from a heavy-tailed (log-normal) distribution, and the time to 100% of
+the target is the time the target-th job starts. ``--live`` measures the same
+on the IC pool with real ``ICCluster`` jobs.
+
+    python benchmarks/hedging.py --workers 100 --hedge 0 0.05 0.1 0.2
+    python benchmarks/hedging.py --live --workers 20 --hedge 0 0.2
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from dask_iclx.hedging import hedged_jobs
+
+
+def simulate(workers, fraction, median, sigma, rng):
+    """Return the time until ``workers`` of the submitted jobs have started."""
+    submitted = hedged_jobs(workers, 0, fraction)
+    starts = sorted(rng.lognormvariate(0, sigma) * median for _ in range(submitted))
+    return starts[workers - 1], submitted - workers
+
+
+def run_simulated(args):
+    rng = random.Random(args.seed)
+    print(f"{'hedge':>6} {'median':>9} {'p90':>9} {'p99':>9} {'cancelled':>10}")
+    for fraction in args.hedge:
+        results = [
+            simulate(args.workers, fraction, args.median, args.sigma, rng)
+            for _ in range(args.trials)
+        ]
+        times = sorted(t for t, _ in results)
+        p90 = times[int(0.9 * len(times))]
+        p99 = times[int(0.99 * len(times))]
+        print(
+            f"{fraction:6.2f} {statistics.median(times):8.0f}s {p90:8.0f}s {p99:8.0f}s"
+            f" {results[0][1]:10d}"
+        )
+
+
+def run_live(args):
+    from distributed import Client
+
+    from dask_iclx import ICCluster
+
+    for fraction in args.hedge:
+        with ICCluster(
+            cores=1, memory="2 GiB", hedge=fraction, container_runtime="none"
+        ) as cluster:
+            with Client(cluster) as client:
+                start = time.perf_counter()
+                cluster.scale(args.workers)
+                client.wait_for_workers(args.workers, timeout=args.timeout)
+                elapsed = time.perf_counter() - start
+        print(f"hedge {fraction:4.2f}: {elapsed:8.1f}s to {args.workers} workers")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=100)
+    parser.add_argument("--hedge", type=float, nargs="+", default=[0, 0.05, 0.1, 0.2])
+    parser.add_argument("--trials", type=int, default=1000)
+    parser.add_argument(
+        "--median", type=float, default=60, help="median job start time [s]"
+    )
+    parser.add_argument(
+        "--sigma", type=float, default=1.0, help="log-normal shape of start times"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--live", action="store_true", help="run on the IC pool")
+    parser.add_argument("--timeout", type=float, default=3600)
+    args = parser.parse_args()
+
+    if args.live:
+        run_live(args)
+    else:
+        run_simulated(args)
+
+
+if __name__ == "__main__":
+    main()
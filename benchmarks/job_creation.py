@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Benchmark creating and rendering many ICJob instances.
+
+Compares the full ``HTCondorJob`` initialisation of every job with the
+per-cluster :class:`dask_iclx.cluster.JobTemplateCache` used by ``ICCluster``.
+
+    python benchmarks/job_creation.py --jobs 10000
+"""
+
+import argparse
+import time
+
+from dask_iclx.cluster import ICCluster, ICJob, JobTemplateCache
+
+SCHEDULER = "tls://10.0.0.1:60000"
+
+
+def job_kwargs():
+    kwargs = ICCluster._modify_kwargs(
+        {"cores": 1, "memory": "4 GiB", "log_directory": None},
+        worker_port_range=[60000, 60099],
+    )
+    # The cluster would pass the worker half of a temporary Security object
+    kwargs["security"] = None
+    return kwargs
+
+
+def create(n, kwargs):
+    start = time.perf_counter()
+    for i in range(n):
+        ICJob(SCHEDULER, name=f"dask-worker-{i}", **kwargs).job_script()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=10000)
+    args = parser.parse_args()
+
+    kwargs = job_kwargs()
+    uncached = create(args.jobs, kwargs)
+    cached = create(args.jobs, dict(kwargs, template_cache=JobTemplateCache()))
+
+    print(f"{args.jobs} jobs without cache: {uncached:8.3f} s")
+    print(f"{args.jobs} jobs with cache:    {cached:8.3f} s")
+    print(f"speed-up: {uncached / cached:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
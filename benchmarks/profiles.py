@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Benchmark scenarios for the workload profiles in ``jobqueue-ic.yaml``.
+
+Each profile is paired with the workload it is tuned for. The scenario is run
+on a local cluster twice, once with the base configuration and once with the
+profile applied, so the gain can be read off without needing access to the
+HTCondor pool. The profile's ``distributed`` settings are set in the config for
+the second run only. Its job settings are mapped onto the local workers of both
+runs, so the topology is the same: ``processes`` splits the same cores into that
+many workers per job, ``death-timeout`` is passed to them.
+
+    python benchmarks/profiles.py                       # all profiles
+    python benchmarks/profiles.py --profile low-latency
+"""
+
+import argparse
+import statistics
+import time
+
+import dask
+from distributed import Client, LocalCluster
+
+import dask_iclx  # noqa: F401  (loads the package configuration)
+from dask_iclx.config import get_profile, profile_distributed_config
+
+
+def _spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+    return seconds
+
+
+def _noop(x):
+    return x
+
+
+def _allocate(i, size):
+    return bytes(size)
+
+
+def _total(*parts):
+    return sum(len(p) for p in parts)
+
+
+def throughput(client):
+    """Many independent CPU-bound tasks: tasks per second."""
+    n = 2000
+    start = time.perf_counter()
+    client.gather(client.map(_spin, [0.005] * n, pure=False))
+    return "tasks/s", n / (time.perf_counter() - start)
+
+
+def low_latency(client):
+    """Sequential submit/result round trips: median latency."""
+    latencies = []
+    for i in range(200):
+        start = time.perf_counter()
+        client.submit(_noop, i, pure=False).result()
+        latencies.append(time.perf_counter() - start)
+    return "ms/round-trip", 1000 * statistics.median(latencies)
+
+
+def memory_heavy(client):
+    """Large partitions reduced to a single value: wall time."""
+    start = time.perf_counter()
+    parts = client.map(_allocate, range(40), size=32 * 2**20, pure=False)
+    client.submit(_total, *parts).result()
+    return "s", time.perf_counter() - start
+
+
+def many_small_tasks(client):
+    """Tens of thousands of trivial tasks: tasks per second."""
+    n = 20000
+    start = time.perf_counter()
+    client.gather(client.map(_noop, range(n), pure=False))
+    return "tasks/s", n / (time.perf_counter() - start)
+
+
+SCENARIOS = {
+    "throughput": throughput,
+    "low-latency": low_latency,
+    "memory-heavy": memory_heavy,
+    "many-small-tasks": many_small_tasks,
+}
+
+
+def cluster_kwargs(profile, n_workers, threads_per_worker):
+    """Return the ``LocalCluster`` arguments matching the job settings of ``profile``."""
+    kwargs = {"n_workers": n_workers, "threads_per_worker": threads_per_worker}
+    if profile.get("processes"):
+        # Each job (here, each group of cores) is split into ``processes`` workers
+        cores = n_workers * threads_per_worker
+        kwargs["n_workers"] = profile["processes"]
+        kwargs["threads_per_worker"] = max(cores // profile["processes"], 1)
+    if profile.get("death-timeout") is not None:
+        kwargs["death_timeout"] = profile["death-timeout"]
+    return kwargs
+
+
+def run(scenario, config, kwargs):
+    with dask.config.set(config):
+        with LocalCluster(dashboard_address=None, **kwargs) as cluster:
+            with Client(cluster) as client:
+                return scenario(client)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", choices=sorted(SCENARIOS), action="append")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+
+    for name in args.profile or sorted(SCENARIOS):
+        scenario = SCENARIOS[name]
+        profile = get_profile(name)
+        # Both runs use the profile's worker topology, so only its settings differ
+        kwargs = cluster_kwargs(profile, args.workers, args.threads)
+        unit, base = run(scenario, {}, kwargs)
+        _, tuned = run(scenario, profile_distributed_config(profile), kwargs)
+        print(f"{name:>18}: base {base:10.2f} {unit}  profile {tuned:10.2f} {unit}")
+
+
+if __name__ == "__main__":
+    main()
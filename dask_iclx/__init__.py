@@ -1,6 +1,9 @@
 import logging as _logging
+from .broadcast import BroadcastCachePlugin, node_cached
 from .cluster import ICCluster
 from .config import _ensure_user_config_file, _set_base_config
+from .gather import shared_gather
+from .staging import staged_path
 
 _logger = _logging.getLogger(__name__)
 _logger.setLevel(_logging.DEBUG)
@@ -9,4 +12,10 @@ _logger.addHandler(_logging.NullHandler())
 _ensure_user_config_file()
 _set_base_config()
 
-__all__ = ["ICCluster"]
+__all__ = [
+    "BroadcastCachePlugin",
+    "ICCluster",
+    "node_cached",
+    "shared_gather",
+    "staged_path",
+]
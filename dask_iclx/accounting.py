@@ -0,0 +1,355 @@
+import asyncio
+import json
+import logging
+import math
+import subprocess
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import dask
+
+logger = logging.getLogger(__name__)
+
+# Job ad attributes needed to account for a job
+JOB_AD_ATTRIBUTES = [
+    "ClusterId",
+    "ProcId",
+    "JobStatus",
+    "JobStartDate",
+    "RemoteWallClockTime",
+    "RequestCpus",
+    "RequestMemory",
+    "RequestDisk",
+    "RequestGpus",
+]
+
+
+def condor_job_ads(job_ids, target_args=()):
+    """
+    Return the job ads of ``job_ids`` from the queue and history of a schedd.
+
+    Parameters
+    ----------
+    job_ids : list of str
+        HTCondor job ids, ie ``["1234.0", "1235.0"]``.
+    target_args : list of str
+        ``-name``/``-pool`` arguments selecting the schedd. Defaults to the local schedd.
+
+    Returns
+    -------
+    list of dict
+        One ad per job found, keyed by attribute name.
+    """
+    if not job_ids:
+        return []
+    attributes = ",".join(JOB_AD_ATTRIBUTES)
+    ads = {}
+    for command in (["condor_history", "-match", str(len(job_ids))], ["condor_q"]):
+        try:
+            out = subprocess.run(
+                [*command, *target_args, "-json", "-attributes", attributes, *job_ids],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.debug("Could not query job ads with %s: %s", command[0], e)
+            continue
+        # Queue ads come last so they take precedence over history ads
+        for ad in json.loads(out or "[]"):
+            ads[f"{ad['ClusterId']}.{ad['ProcId']}"] = ad
+    return list(ads.values())
+
+
+@dataclass
+class JobUsage:
+    """Requested resources, wall time and Dask busy time of one job."""
+
+    job_id: Optional[str]
+    name: str
+    cores: float
+    memory: float
+    disk: float
+    gpus: float
+    wall_seconds: float = 0.0
+    busy_seconds: float = 0.0
+    # Set once the job has left the cluster, its usage is then final
+    closed: bool = False
+
+    @property
+    def cpu_hours_requested(self):
+        return self.cores * self.wall_seconds / 3600
+
+    @property
+    def cpu_hours_used(self):
+        return min(self.busy_seconds / 3600, self.cpu_hours_requested)
+
+    @property
+    def utilisation(self):
+        if not self.cpu_hours_requested:
+            return 0.0
+        return self.cpu_hours_used / self.cpu_hours_requested
+
+    @property
+    def idle_worker_hours(self):
+        return self.wall_seconds / 3600 * (1 - self.utilisation)
+
+
+@dataclass
+class UtilisationReport:
+    """Cost and utilisation of the jobs of an :class:`ICCluster`."""
+
+    timestamp: float
+    jobs: List[JobUsage] = field(default_factory=list)
+    interval_utilisation: Optional[float] = None
+    recommended_jobs: Optional[int] = None
+
+    @property
+    def cpu_hours_requested(self):
+        return sum(j.cpu_hours_requested for j in self.jobs)
+
+    @property
+    def cpu_hours_used(self):
+        return sum(j.cpu_hours_used for j in self.jobs)
+
+    @property
+    def idle_cpu_hours(self):
+        return self.cpu_hours_requested - self.cpu_hours_used
+
+    @property
+    def idle_worker_hours(self):
+        return sum(j.idle_worker_hours for j in self.jobs)
+
+    @property
+    def memory_gib_hours_requested(self):
+        return sum(j.memory / 2**30 * j.wall_seconds / 3600 for j in self.jobs)
+
+    @property
+    def disk_gib_hours_requested(self):
+        return sum(j.disk / 2**30 * j.wall_seconds / 3600 for j in self.jobs)
+
+    @property
+    def gpu_hours_requested(self):
+        return sum(j.gpus * j.wall_seconds / 3600 for j in self.jobs)
+
+    @property
+    def utilisation(self):
+        if not self.cpu_hours_requested:
+            return 0.0
+        return self.cpu_hours_used / self.cpu_hours_requested
+
+    def summary(self):
+        """Return a human readable summary of the report."""
+        lines = [
+            f"Jobs accounted:          {len(self.jobs)}",
+            f"CPU-hours requested:     {self.cpu_hours_requested:.2f}",
+            f"CPU-hours used:          {self.cpu_hours_used:.2f}",
+            f"Idle CPU-hours:          {self.idle_cpu_hours:.2f}",
+            f"Idle worker-hours:       {self.idle_worker_hours:.2f}",
+            f"Memory GiB-hours:        {self.memory_gib_hours_requested:.2f}",
+            f"Disk GiB-hours:          {self.disk_gib_hours_requested:.2f}",
+            f"GPU-hours requested:     {self.gpu_hours_requested:.2f}",
+            f"Utilisation:             {self.utilisation:.1%}",
+        ]
+        if self.recommended_jobs is not None:
+            lines.append(
+                f"Recommendation:          scale down to {self.recommended_jobs} jobs"
+            )
+        return "\n".join(lines)
+
+
+class ClusterAccountant:
+    """
+    Account for the slot time held by the jobs of an :class:`ICCluster`.
+
+    Requested resources and wall time come from the HTCondor job ads, busy time per worker
+    from the scheduler task stream. The cluster installs the task stream when it starts and
+    calls :meth:`collect` every ``jobqueue.ic.accounting.interval``, so busy time accumulates
+    over the life of the cluster. Tasks that fall out of the bounded stream buffer
+    (``distributed.scheduler.dashboard.tasks.task-stream-length``) between two collections
+    are not counted, and a warning is logged.
+    Jobs that have left the cluster, e.g. after a scale-down or recycling, are accounted once
+    more from their final ad and stay in later reports.
+
+    Parameters
+    ----------
+    cluster : ICCluster
+        Cluster to account for.
+    ad_source : callable, optional
+        Called with a list of job ids, returns their job ads. For jobs on other schedds it is also
+        passed the ``-name``/``-pool`` arguments of their target. Defaults to :func:`condor_job_ads`.
+    threshold : float, optional
+        Utilisation below which a scale-down is recommended.
+        Defaults to ``jobqueue.ic.accounting.scale-down-threshold``.
+    window : int, optional
+        Number of consecutive reports that must stay below ``threshold``.
+        Defaults to ``jobqueue.ic.accounting.scale-down-window``.
+    """
+
+    def __init__(
+        self,
+        cluster,
+        ad_source: Optional[Callable] = None,
+        threshold: Optional[float] = None,
+        window: Optional[int] = None,
+    ):
+        config_name = getattr(cluster, "config_name", "ic")
+        self.cluster = cluster
+        self.ad_source = ad_source or condor_job_ads
+        self.threshold = (
+            threshold
+            if threshold is not None
+            else dask.config.get(
+                f"jobqueue.{config_name}.accounting.scale-down-threshold", 0.5
+            )
+        )
+        self.window = window or dask.config.get(
+            f"jobqueue.{config_name}.accounting.scale-down-window", 3
+        )
+        self.busy_seconds: Dict[str, float] = {}
+        self.history: List[float] = []
+        self._stream_index = 0
+        # Submitted jobs seen in the cluster with their last usage, and the final usage
+        # of those that left it
+        self._jobs = {}
+        self._usage: Dict[str, JobUsage] = {}
+        self.closed: Dict[str, JobUsage] = {}
+        # CPU-hours requested and used per job at the previous report
+        self._last_totals: Dict[str, tuple] = {}
+
+    def start(self):
+        """Install the scheduler's task stream, which only records tasks from then on."""
+        self._stream_index = self.cluster.scheduler.get_task_stream_index()
+
+    def collect(self):
+        """Add the compute time of tasks finished since the last call to ``busy_seconds``."""
+        scheduler = self.cluster.scheduler
+        records = scheduler.get_task_stream(start_index=self._stream_index)
+        index = scheduler.get_task_stream_index()
+        lost = index - self._stream_index - len(records)
+        if lost > 0:
+            logger.warning(
+                "%d finished tasks left the task stream before they were accounted for, "
+                "lower jobqueue.ic.accounting.interval",
+                lost,
+            )
+        self._stream_index = index
+        for record in records:
+            ws = scheduler.workers.get(record.get("worker"))
+            worker = str(ws.name) if ws is not None else record.get("worker")
+            busy = sum(
+                ss["stop"] - ss["start"]
+                for ss in record["startstops"]
+                if ss.get("action") == "compute"
+            )
+            self.busy_seconds[worker] = self.busy_seconds.get(worker, 0.0) + busy
+
+    def _job_busy_seconds(self, name):
+        """Sum the busy time of all worker processes started by job ``name``."""
+        return sum(
+            busy
+            for worker, busy in self.busy_seconds.items()
+            if worker == name or worker.startswith(f"{name}-")
+        )
+
+    def _job_usage(self, name, job, ad, now):
+        gpus = job.job_header_dict.get("request_gpus", 0)
+        usage = JobUsage(
+            job_id=job.job_id,
+            name=str(name),
+            cores=job.worker_cores,
+            memory=job.worker_memory,
+            disk=job.worker_disk,
+            gpus=float(gpus or 0),
+        )
+        if ad:
+            usage.cores = ad.get("RequestCpus", usage.cores)
+            # RequestMemory is in MiB and RequestDisk in KiB
+            if "RequestMemory" in ad:
+                usage.memory = ad["RequestMemory"] * 2**20
+            if "RequestDisk" in ad:
+                usage.disk = ad["RequestDisk"] * 2**10
+            usage.gpus = ad.get("RequestGpus", usage.gpus) or 0
+            if ad.get("RemoteWallClockTime"):
+                usage.wall_seconds = ad["RemoteWallClockTime"]
+            elif ad.get("JobStartDate"):
+                usage.wall_seconds = max(now - ad["JobStartDate"], 0)
+        usage.busy_seconds = self._job_busy_seconds(usage.name)
+        return usage
+
+    def _recommend(self, report):
+        # Per-job deltas, so jobs leaving the cluster do not distort the interval
+        requested = used = 0.0
+        for job in report.jobs:
+            last_requested, last_used = self._last_totals.get(job.name, (0.0, 0.0))
+            requested += max(job.cpu_hours_requested - last_requested, 0)
+            used += max(job.cpu_hours_used - last_used, 0)
+            self._last_totals[job.name] = (job.cpu_hours_requested, job.cpu_hours_used)
+        if requested <= 0:
+            return
+        report.interval_utilisation = used / requested
+        self.history = [*self.history, report.interval_utilisation][-self.window :]
+        running = sum(1 for j in report.jobs if j.wall_seconds and not j.closed)
+        if (
+            running
+            and len(self.history) == self.window
+            and all(u < self.threshold for u in self.history)
+        ):
+            mean = sum(self.history) / len(self.history)
+            report.recommended_jobs = min(
+                math.ceil(running * mean / self.threshold), running - 1
+            )
+
+    async def _report(self, now=None):
+        self.collect()
+        current = dict(self.cluster.workers)
+        self._jobs.update({name: job for name, job in current.items() if job.job_id})
+        jobs = {**self._jobs, **current}
+
+        # Cluster ids are only unique per schedd, so ads are queried per submit target
+        by_target = {}
+        for job in jobs.values():
+            if job.job_id:
+                target = getattr(job, "submit_target", None)
+                by_target.setdefault(target, []).append(job.job_id)
+        loop = asyncio.get_running_loop()
+        ads = {}
+        for target, job_ids in by_target.items():
+            args = (job_ids, target.command_args) if target is not None else (job_ids,)
+            found = await loop.run_in_executor(None, self.ad_source, *args)
+            for ad in found:
+                ads[(target, f"{ad['ClusterId']}.{ad['ProcId']}")] = ad
+
+        now = now or time.time()
+        report = UtilisationReport(timestamp=now)
+        for name, job in jobs.items():
+            ad = ads.get((getattr(job, "submit_target", None), job.job_id))
+            usage = self._job_usage(name, job, ad, now)
+            if name not in current:
+                # The job has closed, its usage is final from now on
+                last = self._usage.pop(name, None)
+                if ad is None and last is not None:
+                    usage.wall_seconds = last.wall_seconds
+                usage.closed = True
+                self.closed[usage.name] = usage
+                del self._jobs[name]
+            elif job.job_id:
+                self._usage[name] = usage
+            report.jobs.append(usage)
+        names = {str(name) for name in jobs}
+        report.jobs.extend(
+            usage for name, usage in self.closed.items() if name not in names
+        )
+        self._recommend(report)
+        return report
+
+    def report(self, now=None):
+        """
+        Return a :class:`UtilisationReport` for the jobs of the cluster, including those
+        that have already closed.
+
+        Every call also records the utilisation since the previous call, which drives
+        the scale-down recommendation.
+        """
+        return self.cluster.sync(self._report, now=now)
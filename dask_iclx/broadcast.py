@@ -0,0 +1,355 @@
+import atexit
+import contextlib
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import re
+import shutil
+import socket
+import tempfile
+
+import dask
+from distributed import WorkerPlugin, get_worker
+
+from .preload import read_machine_ad
+
+logger = logging.getLogger(__name__)
+
+PLUGIN_NAME = "iclx-broadcast-cache"
+
+
+def default_directory(config_name="ic"):
+    """
+    Return the node-local directory broadcast objects are kept in.
+
+    ``jobqueue.ic.broadcast.directory`` if set, otherwise ``/dev/shm`` so that the objects
+    live in shared memory, then the slot scratch directory, then the temporary directory.
+    """
+    directory = dask.config.get(f"jobqueue.{config_name}.broadcast.directory", None)
+    if not directory:
+        for candidate in ("/dev/shm", os.environ.get("_CONDOR_SCRATCH_DIR")):
+            if candidate and os.access(candidate, os.W_OK):
+                directory = candidate
+                break
+        else:
+            directory = tempfile.gettempdir()
+        directory = os.path.join(directory, f"dask-iclx-broadcast-{os.getuid()}")
+    return os.path.expanduser(directory)
+
+
+def default_namespace():
+    """
+    Return the name of the process namespace references are recorded in.
+
+    Pids are only unique per host and, with containers, per job, so this combines the host
+    name with the HTCondor job id read from ``$_CONDOR_JOB_AD``.
+    """
+    ad = read_machine_ad(os.environ.get("_CONDOR_JOB_AD"))
+    job = f"{ad['clusterid']}.{ad['procid']}" if "clusterid" in ad else "local"
+    return re.sub(r"[^\w.-]", "_", f"{socket.gethostname()}_{job}")
+
+
+def _held(path):
+    """Return whether a process holds the reference at ``path``, removing it if not."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return False
+    with f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        os.unlink(path)
+        return False
+
+
+class NodeBroadcastCache:
+    """
+    Objects stored once per node in mmap-backed files and shared by every worker on it.
+
+    NumPy arrays are returned as read-only memory-mapped arrays and bytes-like objects as
+    read-only ``memoryview``, so each process maps the same pages instead of holding a copy.
+    Every process attaching an object leaves a reference under
+    ``<entry>.refs/<namespace>.<pid>`` and holds a shared ``flock`` on it while attached; the
+    entry is deleted when the last live reference is released. The lock goes away with the
+    process, so references left by processes that died without releasing them are ignored,
+    whichever job or pid namespace they were in, and a crashed worker does not pin the entry.
+
+    Parameters
+    ----------
+    directory : str, optional
+        Node-local directory holding the objects. Defaults to :func:`default_directory`.
+    pid : int, optional
+        Process id the references are recorded under. Defaults to the current process.
+    namespace : str, optional
+        Namespace the pids belong to. Defaults to :func:`default_namespace`.
+    """
+
+    def __init__(self, directory=None, pid=None, namespace=None):
+        self.directory = directory or default_directory()
+        self.pid = pid or os.getpid()
+        self.namespace = namespace or default_namespace()
+        os.makedirs(self.directory, exist_ok=True)
+        # Views handed out by this process, keeping the mappings alive
+        self._views = {}
+        # Open reference files, locked while this process holds the object
+        self._reference_files = {}
+
+    def _digest(self, key):
+        return hashlib.sha256(str(key).encode()).hexdigest()[:32]
+
+    def _base(self, key):
+        return os.path.join(self.directory, self._digest(key))
+
+    @contextlib.contextmanager
+    def _lock(self, digest, blocking=True):
+        """Hold the lock of one entry, yielding False if ``blocking`` is off and it is taken."""
+        with open(os.path.join(self.directory, f".{digest}.lock"), "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @property
+    def _reference(self):
+        return f"{self.namespace}.{self.pid}"
+
+    def _data_path(self, key):
+        base = self._base(key)
+        for suffix in (".npy", ".bin"):
+            if os.path.exists(base + suffix):
+                return base + suffix
+        return None
+
+    def __contains__(self, key):
+        return self._data_path(key) is not None
+
+    def _write(self, key, value):
+        base = self._base(key)
+        fd, tmp = tempfile.mkstemp(
+            dir=self.directory, prefix=f".tmp-{self._digest(key)}-"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if type(value).__module__ == "numpy" and hasattr(value, "dtype"):
+                    import numpy
+
+                    numpy.save(f, value, allow_pickle=False)
+                    suffix = ".npy"
+                else:
+                    f.write(memoryview(value))
+                    suffix = ".bin"
+            os.replace(tmp, base + suffix)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _attach(self, key, path):
+        if key not in self._reference_files:
+            refs = self._base(key) + ".refs"
+            os.makedirs(refs, exist_ok=True)
+            f = open(os.path.join(refs, self._reference), "a")
+            fcntl.flock(f, fcntl.LOCK_SH)
+            self._reference_files[key] = f
+        if key in self._views:
+            return self._views[key]
+        if path.endswith(".npy"):
+            import numpy
+
+            view = numpy.load(path, mmap_mode="r", allow_pickle=False)
+        else:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size:
+                    view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+                else:
+                    view = memoryview(b"")
+        self._views[key] = view
+        return view
+
+    def get(self, key):
+        """Return the shared view of ``key``, raising ``KeyError`` if it is not stored."""
+        with self._lock(self._digest(key)):
+            path = self._data_path(key)
+            if path is None:
+                raise KeyError(key)
+            return self._attach(key, path)
+
+    def put(self, key, value):
+        """
+        Store ``value`` under ``key`` unless another worker already did, and return its view.
+
+        Parameters
+        ----------
+        key : str
+            Name of the object, the same on every worker.
+        value : numpy.ndarray or bytes-like
+            Object to share. Arrays must not hold Python objects.
+        """
+        with self._lock(self._digest(key)):
+            path = self._data_path(key)
+            if path is None:
+                self._write(key, value)
+                path = self._data_path(key)
+            return self._attach(key, path)
+
+    def get_or_create(self, key, loader):
+        """
+        Return the view of ``key``, calling ``loader()`` to create it if no worker on the
+        node has yet. The entry's lock is held while loading so the object is only loaded
+        once; other objects can be loaded meanwhile.
+        """
+        with self._lock(self._digest(key)):
+            path = self._data_path(key)
+            if path is None:
+                self._write(key, loader())
+                path = self._data_path(key)
+            return self._attach(key, path)
+
+    def _live_references(self, base):
+        """Return the live references under ``base``, removing the dead ones."""
+        refs = base + ".refs"
+        try:
+            names = os.listdir(refs)
+        except FileNotFoundError:
+            return []
+        live = []
+        for name in names:
+            # A reference is live while its process holds the lock on it
+            if name.rpartition(".")[2].isdigit() and _held(os.path.join(refs, name)):
+                live.append(name)
+        return live
+
+    def references(self, key):
+        """Return the pids of the live processes holding ``key``."""
+        return [
+            int(name.rpartition(".")[2])
+            for name in self._live_references(self._base(key))
+        ]
+
+    def _remove_unreferenced(self, base):
+        """Delete the entry at ``base`` if no live process holds it, with its lock held."""
+        if self._live_references(base):
+            return False
+        # Mapped pages stay valid in other views until they are dropped
+        for suffix in (".npy", ".bin"):
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(base + suffix)
+        shutil.rmtree(base + ".refs", ignore_errors=True)
+        return True
+
+    def release(self, key):
+        """Drop this process' reference to ``key``, deleting the entry if it was the last."""
+        self._views.pop(key, None)
+        reference = self._reference_files.pop(key, None)
+        base = self._base(key)
+        with self._lock(self._digest(key)):
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(os.path.join(base + ".refs", self._reference))
+            if reference is not None:
+                reference.close()
+            if self._remove_unreferenced(base):
+                logger.debug("Removed broadcast object %s", key)
+
+    def sweep(self):
+        """
+        Remove what crashed workers left behind: entries without a live reference, the
+        references of dead processes, and files of interrupted writes.
+        """
+        entries = {}
+        for name in os.listdir(self.directory):
+            match = re.match(r"^(\.tmp-)?([0-9a-f]{32})", name)
+            if match:
+                tmp = entries.setdefault(match.group(2), [])
+                if match.group(1):
+                    tmp.append(name)
+        for digest, tmp in entries.items():
+            # An entry being written or loaded is locked, and left alone
+            with self._lock(digest, blocking=False) as locked:
+                if not locked:
+                    continue
+                for name in tmp:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.unlink(os.path.join(self.directory, name))
+                if self._remove_unreferenced(os.path.join(self.directory, digest)):
+                    logger.debug("Removed stale broadcast object %s", digest)
+
+    def close(self):
+        """Release every object attached by this process."""
+        for key in list(self._views):
+            self.release(key)
+
+
+class BroadcastCachePlugin(WorkerPlugin):
+    """
+    Worker plugin giving tasks access to a :class:`NodeBroadcastCache`.
+
+    Register it with ``client.register_plugin(BroadcastCachePlugin())`` and use
+    :func:`node_cached` in tasks. References are released when the worker closes.
+
+    Parameters
+    ----------
+    directory : str, optional
+        Node-local directory holding the objects. Defaults to :func:`default_directory`.
+    """
+
+    name = PLUGIN_NAME
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.cache = None
+
+    def setup(self, worker):
+        self.cache = NodeBroadcastCache(self.directory)
+        self.cache.sweep()
+
+    def teardown(self, worker):
+        if self.cache is not None:
+            self.cache.close()
+
+
+_process_cache = None
+
+
+def _cache():
+    global _process_cache
+    try:
+        plugin = get_worker().plugins.get(PLUGIN_NAME)
+    except ValueError:
+        plugin = None
+    if plugin is not None and plugin.cache is not None:
+        return plugin.cache
+    # Outside of a worker with the plugin, references are released at exit
+    if _process_cache is None:
+        _process_cache = NodeBroadcastCache()
+        atexit.register(_process_cache.close)
+    return _process_cache
+
+
+def node_cached(key, loader):
+    """
+    Return a zero-copy view of the object ``key``, shared by all workers on the node.
+
+    Call this from inside a task. The first worker on the node to ask for ``key`` calls
+    ``loader()`` and stores the result, the others map the stored copy.
+
+    Parameters
+    ----------
+    key : str
+        Name of the object, the same on every worker.
+    loader : callable
+        Returns the object, a NumPy array or bytes-like.
+
+    Returns
+    -------
+    numpy.ndarray or memoryview
+        Read-only view of the object.
+    """
+    return _cache().get_or_create(key, loader)
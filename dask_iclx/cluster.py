@@ -1,3 +1,4 @@
+import asyncio
 import logging
 
 from collections import ChainMap
@@ -5,8 +6,42 @@ import warnings
 import dask
 from dask_jobqueue import HTCondorCluster
 from dask_jobqueue.htcondor import HTCondorJob
+from distributed.core import Status
+from distributed.deploy.spec import ProcessInterface
+import math
+import os
 import re
+import shlex
 import sys
+import time
+
+from dask.utils import parse_bytes, parse_timedelta
+from tornado.ioloop import PeriodicCallback
+
+from .accounting import ClusterAccountant
+from .config import get_profile, profile_distributed_config, profile_environment
+from .eventlog import (
+    RUNNING,
+    TERMINATED,
+    JobStateEngine,
+    default_log_directory,
+    job_log_path,
+)
+from .fairshare import FairShareScaler, condor_fairshare_source
+from .hardware import hardware_directives
+from .hedging import hedged_jobs, select_surplus
+from .profiling import (
+    ContinuousProfiler,
+    collect_stacks,
+    default_format,
+    default_profile_path,
+    write_profile,
+)
+from .preload import STARTUP_TOPIC
+from .recycling import RecyclePolicy, runtime_limit
+from .staging import staging_setup
+from .startup import bytecode_cache_key, startup_setup
+from .targets import SubmitRouter
 
 
 logger = logging.getLogger(__name__)
@@ -18,6 +53,11 @@ def merge(*args):
     return dict(ChainMap(*filter(None, args)))
 
 
+def directive_key(directives, name):
+    # Submit commands are case insensitive, so reuse the user's spelling if present
+    return {k.lower(): k for k in directives}.get(name.lower(), name)
+
+
 def check_job_script_prologue(var, job_script_prologue):
     """
     Check if an environment variable is set in job_script_prologue.
@@ -72,10 +112,66 @@ def get_xroot_url(eos_path):
     return f"root://eosuser.cern.ch//eos/user/{eos_match.group('username')[:1]}/{eos_match.group('username')}{eos_match.group('path')}"
 
 
+class JobTemplateCache:
+    """
+    Per-cluster cache of the job-invariant state of :class:`ICJob`.
+
+    The first job created for a scheduler address runs the full ``HTCondorJob``
+    initialisation under a placeholder name and renders its submit description once.
+    Later jobs copy that state and only substitute their own name.
+    """
+
+    placeholder = "__dask_iclx_job_name__"
+
+    def __init__(self):
+        self._templates = {}
+
+    def __len__(self):
+        return len(self._templates)
+
+    def get(self, job_cls, scheduler, disk, base_class_kwargs):
+        key = (job_cls, scheduler)
+        template = self._templates.get(key)
+        if template is None:
+            template = job_cls(
+                scheduler=scheduler,
+                name=self.placeholder,
+                disk=disk,
+                **base_class_kwargs,
+            )
+            template._rendered_script = template.job_script()
+            self._templates[key] = template
+        return template
+
+    def clear(self):
+        self._templates.clear()
+
+
 class ICJob(HTCondorJob):
     config_name = "ic"
 
-    def __init__(self, scheduler=None, name=None, disk=None, **base_class_kwargs):
+    def __init__(
+        self,
+        scheduler=None,
+        name=None,
+        disk=None,
+        template_cache=None,
+        submit_router=None,
+        **base_class_kwargs,
+    ):
+        self.submit_router = submit_router
+        self.submit_target = None
+        self.submitted_at = None
+        # Whether the job counts as queued on its target in the submit router
+        self.queued = False
+
+        if template_cache is not None:
+            template = template_cache.get(
+                type(self), scheduler, disk, base_class_kwargs
+            )
+            self._init_from_template(template, name)
+            return
+
         if disk is None:
             num_cores = base_class_kwargs.get("cores", 1)
             disk = f"{int(num_cores) * 20} GB"
@@ -90,6 +186,107 @@ class ICJob(HTCondorJob):
             self.job_header_dict.pop("Stream_Output", None)
             self.job_header_dict.pop("Stream_Error", None)
 
+    def _init_from_template(self, template, name):
+        """Copy the job-invariant state of ``template`` and fill in the per-job fields."""
+        ProcessInterface.__init__(self)
+        process_state = set(self.__dict__)
+        self.__dict__.update(
+            {k: v for k, v in template.__dict__.items() if k not in process_state}
+        )
+
+        placeholder = JobTemplateCache.placeholder
+        self.name = name
+        self.job_header_dict = {
+            k: name if v == placeholder else v
+            for k, v in template.job_header_dict.items()
+        }
+        self._command_template = template._command_template.replace(
+            placeholder, str(name)
+        )
+        # Names needing Condor argument quoting are rendered from scratch
+        if re.match(r"^[\w.-]+$", str(name)):
+            self._rendered_script = template._rendered_script.replace(
+                placeholder, str(name)
+            )
+        else:
+            del self._rendered_script
+
+    def job_script(self):
+        """Construct a job submission script, reusing the cached rendering if available"""
+        rendered = getattr(self, "_rendered_script", None)
+        if rendered is not None:
+            return rendered
+        return super().job_script()
+
+    @property
+    def state_key(self):
+        """Job id qualified by its submit target, unique across schedds."""
+        if self.job_id and self.submit_target is not None:
+            return f"{self.submit_target.label}/{self.job_id}"
+        return self.job_id
+
+    def _apply_submit_target(self, target):
+        """Direct the submission, cancellation and log files of this job to ``target``."""
+        if not hasattr(self, "_base_commands"):
+            self._base_commands = (self.submit_command, self.cancel_command)
+        args = " ".join(shlex.quote(arg) for arg in target.command_args)
+        self.submit_command = f"{self._base_commands[0].rstrip()} {args}"
+        self.cancel_command = f"{self._base_commands[1].rstrip()} {args}"
+
+        # Cluster ids are only unique per schedd, keep the files of each target apart
+        previous = self.submit_target
+        for key in ("Output", "Error", "Log"):
+            value = self.job_header_dict.get(key)
+            if value is None:
+                continue
+            # Only the file name, the directories may contain "worker-" as well
+            directory, name = os.path.split(value)
+            if previous is not None:
+                name = name.replace(f"worker-{previous.label}-", "worker-", 1)
+            name = name.replace("worker-", f"worker-{target.label}-", 1)
+            self.job_header_dict[key] = os.path.join(directory, name)
+        self.__dict__.pop("_rendered_script", None)
+        self.submit_target = target
+
+    async def start(self):
+        """Submit the job, trying the submit targets of the router in turn"""
+        if self.submit_router is None:
+            await super().start()
+            self.submitted_at = time.time()
+            return
+
+        error = None
+        for target in self.submit_router.candidates():
+            self._apply_submit_target(target)
+            start = time.monotonic()
+            try:
+                await super().start()
+            except RuntimeError as e:
+                self.submit_router.record_failure(target)
+                error = e
+                continue
+            self.submit_router.record_submit(target, time.monotonic() - start)
+            self.submitted_at = time.time()
+            self.queued = True
+            return
+        raise RuntimeError("Job submission failed on every submit target") from error
+
+    async def close(self):
+        # A job cancelled before it started no longer counts as queued on its target
+        self._left_queue(started=False)
+        await super().close()
+
+    def _left_queue(self, started):
+        """Tell the submit router, once, that the job has left the queue of its target."""
+        if not self.queued:
+            return
+        self.queued = False
+        if started:
+            delay = time.time() - (self.submitted_at or time.time())
+            self.submit_router.record_start(self.submit_target, delay)
+        else:
+            self.submit_router.record_gone(self.submit_target)
+
 
 class ICCluster(HTCondorCluster):
     __doc__ = (
@@ -108,6 +305,50 @@ class ICCluster(HTCondorCluster):
     lcg: If set to ``True`` will use the LCG environment in CVMFS and use that to run the python interpreter on server
     and client. Needs to be sourced before running the python interpreter. Defaults to False.
     worker_port_range: The range of ports to use for the workers. If None, defaults to ``[60000, 60999]``.
+    profile: Name of a workload profile from ``jobqueue.ic.profiles`` (e.g. ``throughput``, ``low-latency``,
+    ``memory-heavy``, ``many-small-tasks``) layered on top of the base configuration. Its ``distributed`` settings
+    reach the workers; the scheduler only gets those read when it is created, such as work-stealing, while
+    per-connection ones like ``distributed.comm.compression`` follow the configuration of the client process.
+
+    ``cluster.accounting.report()`` returns the CPU-hours requested vs used by the cluster's jobs,
+    their idle worker time, and a scale-down recommendation when utilisation stays low.
+
+    fairshare: If ``True``, cap ``scale()`` requests to the user's accounting-group quota (from ``condor_userprio``)
+    and pace them to the start rate the user's priority gives, submitting the rest as headroom appears and queued
+    jobs start. The quota is read off the event loop every ``jobqueue.ic.fairshare.interval``; if it cannot be read
+    scaling is not capped. A callable returning a :class:`dask_iclx.fairshare.FairShareState` can be given instead.
+    ``cluster.fairshare.last_plan.eta_seconds`` is the predicted time until all requested workers are running,
+    None while the quota holds them back. Defaults to ``False``.
+    hedge: Extra fraction of jobs to submit when scaling up, e.g. ``0.1``. Once the requested number of workers
+    has connected, surplus jobs that have not started are cancelled, held ones first and newest first. Jobs that
+    already run are never cancelled. Job states come from the HTCondor user log: without it, jobs of unknown
+    state may be running and are cancelled last. Defaults to ``jobqueue.ic.hedge.fraction``.
+    submit_targets: List of schedds or pools to spread jobs over. Each entry is a schedd name or a dict with
+    ``name``, ``pool`` and ``weight`` keys. Jobs go to the target with the lowest expected start time from its
+    observed submit latency and start rate; failing targets are skipped for a while. Submission, log files,
+    cancellation and accounting follow each job to its target. Defaults to ``jobqueue.ic.submit-targets``,
+    an empty list meaning the local schedd.
+    stage_inputs: List of input files to stage into every job, either through HTCondor file transfer or a
+    content-hashed node-local cache (``jobqueue.ic.staging.method``). Tasks get the local copy with
+    :func:`dask_iclx.staged_path`.
+    preload: List of modules the workers import before connecting (``jobqueue.ic.preload.modules``). Start-up and
+    import times are reported through ``cluster.import_timings()``. ``jobqueue.ic.preload.bytecode-cache`` points
+    ``PYTHONPYCACHEPREFIX`` at a shared bytecode cache per worker image or LCG view.
+    detect_hardware: Advertise the node's CPU flags, microarchitecture levels, CPU model (``cpu-model-<model>``) and
+    SSD scratch as worker resources, read from the slot's machine ad or else detected on the node, so tasks can target them with
+    ``dask.annotate(resources={"avx512f": 1})``. ``require_hardware`` and ``prefer_hardware`` add matching
+    ``requirements`` and ``rank`` expressions to the jobs.
+    recycle: If ``True``, replace workers before they reach the ``+MaxRuntime`` set in the job directives (or
+    ``jobqueue.ic.recycle.lifetime``). Lifetimes are staggered so workers from one scale event are not retired
+    together, each replacement job is submitted ahead of time, and the old worker is retired gracefully once its
+    replacement has connected. A lifetime such as ``"8h"`` can be given instead of ``True``.
+
+    ``cluster.job_states`` follows the HTCondor user logs of the cluster's jobs and keeps their state
+    (submitted/idle/running/held/evicted/terminated) without querying the schedd. Use
+    ``cluster.job_state(name)`` for a lookup and ``cluster.job_states.add_callback`` to be told of changes.
+
+    ``cluster.profile(duration=...)`` writes the merged worker profiles to ``log_directory`` as speedscope or
+    collapsed stacks, and ``cluster.start_profiling()`` keeps collecting them for the life of the cluster.
     """
     )
     config_name = "ic"
@@ -122,6 +363,16 @@ class ICCluster(HTCondorCluster):
         gpus=None,
         lcg=False,
         worker_port_range=None,
+        profile=None,
+        fairshare=False,
+        hedge=None,
+        submit_targets=None,
+        stage_inputs=None,
+        preload=None,
+        detect_hardware=None,
+        require_hardware=None,
+        prefer_hardware=None,
+        recycle=False,
         **base_class_kwargs,
     ):
         """
@@ -131,6 +382,16 @@ class ICCluster(HTCondorCluster):
         :param: gpus: The number of GPUs to request. Defaults to ``0``.
         :param lcg: If True, use the LCG environment from cvmfs. Please note you need to haveloaded the environment before running the python interpreter. Defaults to False.
         :param worker_port_range: The range of ports to use for the workers. If None, defaults to ``[60000, 60999]``.
+        :param profile: Name of a workload profile from ``jobqueue.ic.profiles``. Explicit keyword arguments take precedence over the profile, which takes precedence over the base configuration. Defaults to ``jobqueue.ic.profile``.
+        :param fairshare: If True, cap scale requests to the user's priority and group quota. A callable returning a ``FairShareState`` replaces ``condor_userprio`` as the source. Defaults to False.
+        :param hedge: Extra fraction of jobs to submit when scaling up. Surplus jobs that have not started are cancelled once the requested workers have connected. Defaults to ``jobqueue.ic.hedge.fraction``.
+        :param submit_targets: List of schedd names or ``{"name", "pool", "weight"}`` dicts to distribute jobs over. Defaults to the local schedd.
+        :param stage_inputs: List of input files to stage into every job. Tasks resolve the local copy with ``dask_iclx.staged_path``.
+        :param detect_hardware: If True, workers detect their CPU flags, microarchitecture level and scratch disk type and advertise them as resources, e.g. ``{"avx512f": 4, "x86_64-v4": 4, "ssd": 4}``. Defaults to ``jobqueue.ic.hardware.detect``.
+        :param require_hardware: List of hardware features (``"avx2"``, ``"x86_64-v3"``, ...) the job's machine must have, added to ``requirements``.
+        :param prefer_hardware: List of hardware features to ``rank`` machines by, the first weighing the most.
+        :param recycle: If True, replace workers ahead of the job runtime limit with staggered lifetimes, retiring each once its replacement has connected. A lifetime like ``"8h"`` overrides ``jobqueue.ic.recycle.lifetime`` and ``+MaxRuntime``. Defaults to False.
+        :param preload: List of modules the workers import before connecting, e.g. ``["numpy", "awkward"]``. Their import times are reported by ``import_timings``. Defaults to ``jobqueue.ic.preload.modules``.
         :param base_class_kwargs: Additional keyword arguments like ``cores`` or ``memory`` to pass to `dask_jobqueue.HTCondorCluster`.
         """
 
@@ -151,6 +412,16 @@ class ICCluster(HTCondorCluster):
                 )
 
         worker_port_range = worker_port_range or [60000, 60099]
+        profile = profile or dask.config.get(
+            f"jobqueue.{self.config_name}.profile", None
+        )
+        preload = preload or dask.config.get(
+            f"jobqueue.{self.config_name}.preload.modules", None
+        )
+        if detect_hardware is None:
+            detect_hardware = dask.config.get(
+                f"jobqueue.{self.config_name}.hardware.detect", False
+            )
 
         base_class_kwargs = ICCluster._modify_kwargs(
             base_class_kwargs,
@@ -159,6 +430,28 @@ class ICCluster(HTCondorCluster):
             gpus=gpus,
             lcg=lcg,
             worker_port_range=worker_port_range,
+            profile=profile,
+            stage_inputs=stage_inputs,
+            preload=preload,
+            detect_hardware=detect_hardware,
+            require_hardware=require_hardware,
+            prefer_hardware=prefer_hardware,
+        )
+        # condor_submit fails if the directory of the user log does not exist
+        directives = base_class_kwargs.get("job_extra_directives") or {}
+        log = directives.get(directive_key(directives, "Log"))
+        log_directory = os.path.dirname(str(log or ""))
+        if log_directory and "$(" not in log_directory:
+            os.makedirs(log_directory, exist_ok=True)
+
+        # The scheduler runs in this process, so the profile's distributed settings are
+        # applied while it is being created, in _start. Settings read on every connection,
+        # such as distributed.comm.compression, only reach the workers: the scheduler's
+        # comms follow the configuration of this process once _start returns.
+        self._scheduler_config = (
+            profile_distributed_config(get_profile(profile, self.config_name))
+            if profile
+            else {}
         )
 
         warnings.simplefilter(action="ignore", category=FutureWarning)
@@ -166,10 +459,459 @@ class ICCluster(HTCondorCluster):
             "ignore", message=".*Using a temporary security object.*"
         )
 
+        # Jobs of this cluster share one rendered submit description
+        base_class_kwargs["template_cache"] = JobTemplateCache()
+
+        submit_targets = submit_targets or dask.config.get(
+            f"jobqueue.{self.config_name}.submit-targets", None
+        )
+        self.submit_router = SubmitRouter(submit_targets) if submit_targets else None
+        if self.submit_router is not None:
+            base_class_kwargs["submit_router"] = self.submit_router
+
+        # Set before the base class, which may already scale to n_workers
+        # and starts the periodic callbacks in _start
+        self.fairshare = None
+        self._fairshare_target = None
+        if fairshare:
+            self.fairshare = FairShareScaler(
+                condor_fairshare_source if fairshare is True else fairshare,
+                cores_per_job=base_class_kwargs.get("cores")
+                or dask.config.get(f"jobqueue.{self.config_name}.cores"),
+                config_name=self.config_name,
+            )
+        self.hedge = (
+            hedge
+            if hedge is not None
+            else dask.config.get(f"jobqueue.{self.config_name}.hedge.fraction", 0)
+        )
+        self._hedge_target = None
+        self._hedge_extra = 0
+        self.accounting = ClusterAccountant(self)
+        self.job_states = JobStateEngine(
+            state_file=dask.config.get(
+                f"jobqueue.{self.config_name}.event-log.state-file", None
+            )
+        )
+        if self.submit_router is not None:
+            self.job_states.add_callback(self._record_job_start)
+        self._job_log_paths = set()
+        self._profiler = None
+        self.recycle = (
+            self._recycle_policy(recycle, base_class_kwargs["job_extra_directives"])
+            if recycle
+            else None
+        )
+
         super().__init__(**base_class_kwargs)
 
         warnings.resetwarnings()
 
+    async def _start(self):
+        interval = dask.config.get(f"jobqueue.{self.config_name}.event-log.interval")
+        self._add_periodic_callback("job-states", self._poll_job_states, interval)
+        if self.fairshare is not None:
+            # Read before the first scale, which plans against the snapshot
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.fairshare.refresh)
+            interval = dask.config.get(
+                f"jobqueue.{self.config_name}.fairshare.interval"
+            )
+            self._add_periodic_callback("fairshare", self._fairshare_rescale, interval)
+        if self.hedge:
+            interval = dask.config.get(f"jobqueue.{self.config_name}.hedge.interval")
+            self._add_periodic_callback("hedge", self._cancel_hedge_surplus, interval)
+        interval = dask.config.get(
+            f"jobqueue.{self.config_name}.profiling.continuous-interval", None
+        )
+        if interval and self._job_kwargs.get("log_directory"):
+            self.start_profiling(interval)
+        if self.recycle is not None:
+            interval = dask.config.get(f"jobqueue.{self.config_name}.recycle.interval")
+            self._add_periodic_callback("recycle", self._recycle_workers, interval)
+        interval = dask.config.get(f"jobqueue.{self.config_name}.accounting.interval")
+        self._add_periodic_callback("accounting", self.accounting.collect, interval)
+        # With asynchronous=True the scheduler is only created here, after __init__
+        with dask.config.set(self._scheduler_config):
+            await super()._start()
+        # Tasks finish before the first report, record them from the start
+        if getattr(self, "scheduler", None) is not None:
+            self.accounting.start()
+
+    def _add_periodic_callback(self, name, callback, interval):
+        """Run ``callback`` every ``interval`` while the cluster is running."""
+        pc = PeriodicCallback(callback, parse_timedelta(interval) * 1000)
+        self.periodic_callbacks[name] = pc
+
+    async def _poll_job_states(self):
+        """Follow the user logs of all submitted jobs and update ``job_states``."""
+        jobs = list(self.workers.values())
+        watched = {}
+        for job in jobs:
+            path = job_log_path(job)
+            # A log has nothing more to tell once its jobs have terminated
+            if path and self.job_states.state(job.state_key) != TERMINATED:
+                target = job.submit_target
+                watched[path] = target.label if target else None
+        for path in set(self.job_states.logs) - set(watched):
+            self.job_states.unwatch(path)
+        for path, namespace in watched.items():
+            self.job_states.watch(path, namespace)
+        keys = {job.state_key for job in jobs}
+        for key in (
+            set(self.job_states.states) | set(self.job_states.last_event)
+        ) - keys:
+            self.job_states.forget(key)
+        paths = {job_log_path(job) for job in jobs} - {None}
+        self._remove_event_logs(self._job_log_paths - paths)
+        self._job_log_paths = paths
+
+        # Only the reading blocks, the state changes and their callbacks stay on the loop
+        loop = asyncio.get_running_loop()
+        events = await loop.run_in_executor(None, self.job_states.read)
+        self.job_states.update(events)
+        if self.submit_router is not None:
+            # Jobs whose start the event log missed have started once their worker connects
+            for name in self._connected_jobs():
+                job = self.workers.get(name)
+                if job is not None:
+                    job._left_queue(started=True)
+
+    def _remove_event_logs(self, paths):
+        """Delete the user logs of closed jobs from the default event log directory."""
+        directory = default_log_directory(self.config_name)
+        for path in paths:
+            if os.path.dirname(path) == directory:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def job_state(self, name):
+        """
+        Return the HTCondor state of the job running worker ``name``, from the user event log.
+
+        Returns None if the job has not been submitted or no event has been seen yet.
+        """
+        job = self.workers.get(name)
+        if job is None or not job.job_id:
+            return None
+        return self.job_states.state(job.state_key)
+
+    def _record_job_start(self, key, old, new):
+        """Feed job starts from the event log back to the submit router."""
+        if new not in (RUNNING, TERMINATED) or old in (RUNNING, TERMINATED):
+            return
+        for job in list(self.workers.values()):
+            if job.state_key == key and job.submit_target is not None:
+                job._left_queue(started=new == RUNNING)
+                return
+
+    def import_timings(self):
+        """
+        Return the start-up timings reported by workers started with ``preload``, by worker name.
+
+        Each entry has the ``worker`` address, ``startup``, the seconds from the worker process
+        starting to the preload running, ``imports``, the seconds each preloaded module took to
+        import (None if it failed), ``import_seconds``, the time spent on all of them, and the
+        ``pycache_prefix`` the worker used.
+        """
+        return {msg["name"]: msg for _, msg in self.scheduler.get_events(STARTUP_TOPIC)}
+
+    def worker_hardware(self):
+        """
+        Return the hardware detected by workers started with ``detect_hardware``, by worker name.
+
+        Each entry has the CPU ``model``, the CPU ``flags`` found, the ``microarch`` levels and the
+        ``scratch`` disk type (``"ssd"``, ``"hdd"`` or None), as advertised in the worker resources.
+        """
+        return {
+            name: msg["hardware"]
+            for name, msg in self.import_timings().items()
+            if msg.get("hardware")
+        }
+
+    def profile(self, duration=10, filename=None, format=None):
+        """
+        Sample all workers for ``duration`` and write the profile merged by task prefix.
+
+        :param duration: Time to sample for, in seconds or as a string like ``"30s"``.
+        :param filename: File to write to. Defaults to a timestamped file in ``log_directory``.
+        :param format: ``"speedscope"`` or ``"collapsed"`` stacks. Defaults to ``jobqueue.ic.profiling.format``.
+        :return: The path of the profile written.
+        """
+        format = format or default_format(self.config_name)
+        path = filename or default_profile_path(
+            self, format, suffix=f"-{int(time.time())}"
+        )
+        return self.sync(self._profile, parse_timedelta(duration), path, format)
+
+    async def _profile(self, duration, path, format):
+        start = time.time()
+        await asyncio.sleep(duration)
+        stacks = await collect_stacks(
+            self.scheduler, start=start, stop=time.time(), by_prefix=True
+        )
+        write_profile(stacks, path, format, name=self.name)
+        return path
+
+    def start_profiling(self, interval="60s", filename=None, format=None):
+        """
+        Collect the worker profiles every ``interval`` for the rest of the cluster's life.
+
+        The accumulated profile is rewritten to ``filename`` (by default in ``log_directory``)
+        after every collection, so it is kept when the cluster closes.
+        """
+        if self._profiler is not None:
+            stopped = self.stop_profiling()
+            if self.asynchronous:
+                asyncio.ensure_future(stopped)
+        format = format or default_format(self.config_name)
+        path = filename or default_profile_path(self, format)
+        self._profiler = ContinuousProfiler(self, path, format)
+        pc = PeriodicCallback(self._profiler.collect, parse_timedelta(interval) * 1000)
+        self.periodic_callbacks["profiling"] = pc
+        if self.status == Status.running:
+            pc.start()
+        return path
+
+    def stop_profiling(self):
+        """
+        Stop continuous profiling, returning the path of the profile or None.
+
+        On an asynchronous cluster, await the result.
+        """
+        pc = self.periodic_callbacks.pop("profiling", None)
+        if pc is not None:
+            pc.stop()
+        profiler, self._profiler = self._profiler, None
+        return self.sync(self._stop_profiling, profiler)
+
+    async def _stop_profiling(self, profiler):
+        if profiler is None:
+            return None
+        if self.status == Status.running:
+            await profiler.collect(final=True)
+        return profiler.path
+
+    async def _close(self):
+        # The samples since the last collection are gone with the scheduler
+        profiler, self._profiler = getattr(self, "_profiler", None), None
+        if profiler is not None:
+            try:
+                await profiler.collect(final=True)
+            except Exception as e:
+                logger.warning("Could not collect the final profile: %s", e)
+        paths = getattr(self, "_job_log_paths", set()) | {
+            job_log_path(job) for job in getattr(self, "workers", {}).values()
+        }
+        await super()._close()
+        self._remove_event_logs(paths - {None})
+
+    def _connected_jobs(self):
+        """Names of the jobs whose workers have connected to the scheduler."""
+        worker_names = {str(w["name"]) for w in self.scheduler_info["workers"].values()}
+        connected = set()
+        for name, spec in self.worker_spec.items():
+            suffixes = spec.get("group", [""])
+            if any(f"{name}{suffix}" in worker_names for suffix in suffixes):
+                connected.add(name)
+        return connected
+
+    def _job_worker_names(self, name):
+        """Names of the workers of job ``name``."""
+        return [
+            f"{name}{suffix}" for suffix in self.worker_spec[name].get("group", [""])
+        ]
+
+    @property
+    def plan(self):
+        # Workers being recycled are on their way out, their replacements take their place.
+        # Surplus hedged jobs are not part of the target either, so adaptive scaling does
+        # not count them as missing workers and leaves their cancelling to the hedge.
+        plan = super().plan
+        leaving = list(self._hedge_candidates())
+        if getattr(self, "recycle", None) is not None:
+            leaving.extend(self.recycle.replacements)
+        for name in leaving:
+            if name in self.worker_spec:
+                plan -= set(self._job_worker_names(name))
+        return plan
+
+    def _running_jobs(self):
+        """Number of jobs whose workers have connected to the scheduler."""
+        return len(self._connected_jobs())
+
+    def scale(self, n=None, jobs=0, memory=None, cores=None):
+        """Scale cluster to specified configurations.
+
+        With ``hedge`` set, an extra fraction of the missing jobs is submitted and the
+        surplus is cancelled once the target has connected. With ``fairshare`` enabled,
+        the number of jobs submitted is capped to what the user's group quota allows;
+        the remainder is submitted as headroom appears.
+        See :meth:`dask_jobqueue.JobQueueCluster.scale` for the parameters.
+        """
+        if getattr(self, "fairshare", None) is None and not getattr(
+            self, "hedge", None
+        ):
+            return super().scale(n, jobs=jobs, memory=memory, cores=cores)
+
+        if n is not None:
+            jobs = int(math.ceil(n / self._dummy_job.worker_processes))
+        if memory is not None:
+            jobs = max(jobs, math.ceil(parse_bytes(memory) / self._memory_per_worker()))
+        if cores is not None:
+            jobs = max(jobs, math.ceil(cores / self._threads_per_worker()))
+
+        submit = self._plan_jobs(jobs)
+        # Scaling down cancels the jobs least likely to start first, rather than
+        # whichever the base class picks
+        excess = len(self.worker_spec) - submit
+        if excess > 0:
+            for name in self._select_surplus(excess):
+                del self.worker_spec[name]
+        return super().scale(jobs=submit)
+
+    def _plan_jobs(self, jobs, state=None):
+        """
+        Return the number of jobs to submit for a target of ``jobs``, after hedging and
+        the fair-share cap, and remember the targets the periodic callbacks work towards.
+        """
+        running = self._running_jobs()
+        extra = hedged_jobs(jobs, running, self.hedge) - jobs
+        # The surplus submitted for a target is kept when scaling to it again, or up
+        # from it, rather than shrinking as the hedged jobs start
+        if self._hedge_target is not None and jobs >= self._hedge_target:
+            extra = max(extra, self._hedge_extra)
+        self._hedge_target = jobs if extra else None
+        self._hedge_extra = extra
+        submit = jobs + extra
+
+        if self.fairshare is not None:
+            plan = self.fairshare.plan(submit, running=running, state=state)
+            self._fairshare_target = submit if plan.capped else None
+            if plan.capped:
+                logger.info(
+                    "Fair-share %s allows %d of %d requested jobs now, deferring the rest",
+                    "quota" if plan.quota_limited else "start rate",
+                    plan.allowed,
+                    plan.requested,
+                )
+            # Jobs already queued towards the target are not cancelled by the cap
+            submit = max(plan.allowed, min(submit, len(self.worker_spec)))
+        return submit
+
+    def _select_surplus(self, count, connected=None):
+        """Choose ``count`` of the cluster's jobs to cancel, see :func:`select_surplus`."""
+        if connected is None:
+            connected = self._connected_jobs()
+        states = {
+            name: self.job_states.state(job.state_key) if job.job_id else None
+            for name, job in self.workers.items()
+        }
+        return select_surplus(list(self.worker_spec), connected, states, count)
+
+    def _hedge_candidates(self):
+        """Jobs the hedge will cancel once its target has connected."""
+        target = getattr(self, "_hedge_target", None)
+        if target is None or len(self.worker_spec) <= target:
+            return []
+        return self._select_surplus(len(self.worker_spec) - target)
+
+    def _hedge_surplus(self):
+        """Return the surplus hedged jobs to cancel, once the target number has connected."""
+        target = self._hedge_target
+        if target is None:
+            return []
+        connected = self._connected_jobs()
+        if len(connected) < target:
+            return []
+
+        surplus = self._select_surplus(len(self.worker_spec) - target, connected)
+        self._hedge_target = None
+        self._hedge_extra = 0
+        self._fairshare_target = None
+        return surplus
+
+    async def _cancel_hedge_surplus(self):
+        """Cancel the surplus hedged jobs once the target number of jobs has connected."""
+        surplus = self._hedge_surplus()
+        if surplus:
+            logger.info("Cancelling %d surplus hedged jobs", len(surplus))
+            await self.scale_down(surplus)
+
+    def _fairshare_replan(self, state):
+        """
+        Return the number of jobs the fair-share quota and start rate now allow towards
+        the deferred target, or None if nothing is deferred.
+        """
+        if self._fairshare_target is None:
+            return None
+        target = self._fairshare_target
+        plan = self.fairshare.plan(target, running=self._running_jobs(), state=state)
+        if not plan.capped:
+            self._fairshare_target = None
+        return plan.allowed
+
+    async def _fairshare_rescale(self):
+        """Refresh the fair-share state and submit deferred jobs once there is room for them."""
+        # The source runs condor_userprio, which must not block the event loop
+        loop = asyncio.get_running_loop()
+        state = await loop.run_in_executor(None, self.fairshare.refresh)
+        allowed = self._fairshare_replan(state)
+        if allowed is not None and allowed > len(self.worker_spec):
+            HTCondorCluster.scale(self, jobs=allowed)
+
+    def _recycle_policy(self, recycle, directives):
+        """Build the recycling policy, the lifetime bounded by the job's ``+MaxRuntime``."""
+        config = f"jobqueue.{self.config_name}.recycle"
+        lifetime = (
+            dask.config.get(f"{config}.lifetime", None) if recycle is True else recycle
+        )
+        limits = [
+            parse_timedelta(limit)
+            for limit in (lifetime, runtime_limit(directives))
+            if limit
+        ]
+        if not limits:
+            raise ValueError(
+                "Worker recycling needs a lifetime: set +MaxRuntime in job_extra_directives, "
+                f"{config}.lifetime or pass it as recycle"
+            )
+        return RecyclePolicy(
+            min(limits),
+            stagger=dask.config.get(f"{config}.stagger", 0.2),
+            margin=dask.config.get(f"{config}.margin", "5m"),
+            lead=dask.config.get(f"{config}.lead-time", "10m"),
+        )
+
+    async def _recycle_workers(self):
+        """Submit replacements for workers nearing their lifetime and retire the old ones."""
+        policy = self.recycle
+        connected = self._connected_jobs()
+        now = time.time()
+        policy.observe(connected, self.worker_spec, now)
+
+        due = policy.due(connected, now)
+        for name in due:
+            spec = self.new_worker_spec()
+            self.worker_spec.update(spec)
+            policy.replacements[name] = next(iter(spec))
+            logger.info("Submitting a replacement for worker %s", name)
+        if due:
+            await self._correct_state()
+
+        retire = policy.retirable(connected)
+        if not retire:
+            return
+        names = [w for name in retire for w in self._job_worker_names(name)]
+        logger.info("Retiring recycled workers %s", ", ".join(names))
+        # Moves their data to the other workers before closing them
+        await self.scheduler_comm.retire_workers(names=names, close_workers=True)
+        for name in retire:
+            policy.forget(name)
+        await self.scale_down(retire)
+
     @classmethod
     def _modify_kwargs(
         cls,
@@ -180,6 +922,12 @@ class ICCluster(HTCondorCluster):
         gpus=None,
         lcg=False,
         worker_port_range=None,
+        profile=None,
+        stage_inputs=None,
+        preload=None,
+        detect_hardware=False,
+        require_hardware=None,
+        prefer_hardware=None,
     ):
         """
         This method implements the special modifications to adapt dask-jobqueue to run on the CERN cluster.
@@ -188,6 +936,12 @@ class ICCluster(HTCondorCluster):
         """
         modified = kwargs.copy()
 
+        # Layer the profile between the explicit kwargs and the base config
+        profile_config = get_profile(profile, cls.config_name) if profile else {}
+        for key, value in profile_config.items():
+            if key != "distributed":
+                modified.setdefault(key.replace("-", "_"), value)
+
         container_runtime = container_runtime or dask.config.get(
             f"jobqueue.{cls.config_name}.container-runtime"
         )
@@ -206,6 +960,75 @@ class ICCluster(HTCondorCluster):
             if logdir and modified["log_directory"].startswith("/eos/")
             else None
         )
+        # The job state engine follows the user logs, so every job writes one locally
+        event_log_directory = (
+            os.path.abspath(os.path.expanduser(logdir))
+            if logdir and not xroot_url
+            else default_log_directory(cls.config_name)
+        )
+
+        cache_max_size = dask.config.get(
+            f"jobqueue.{cls.config_name}.staging.cache-max-size", None
+        )
+        stage_directives, stage_prologue = staging_setup(
+            stage_inputs,
+            method=dask.config.get(
+                f"jobqueue.{cls.config_name}.staging.method", "cache"
+            ),
+            cache_directory=dask.config.get(
+                f"jobqueue.{cls.config_name}.staging.cache-directory",
+                "/tmp/dask-iclx-cache",
+            ),
+            cache_max_size=parse_bytes(cache_max_size) if cache_max_size else None,
+        )
+
+        startup_directives, startup_env, startup_args = startup_setup(
+            preload,
+            bytecode_cache=dask.config.get(
+                f"jobqueue.{cls.config_name}.preload.bytecode-cache", None
+            ),
+            key=bytecode_cache_key(worker_image, container_runtime, lcg),
+            hardware_flags=dask.config.get(
+                f"jobqueue.{cls.config_name}.hardware.flags", []
+            )
+            if detect_hardware
+            else None,
+        )
+        # Staged inputs and the preload script are appended to the user's file transfer
+        transfer_files = [
+            files
+            for files in (
+                stage_directives.pop("transfer_input_files", None),
+                startup_directives.pop("transfer_input_files", None),
+            )
+            if files
+        ]
+
+        if stage_prologue:
+            modified["job_script_prologue"] = [
+                *stage_prologue,
+                *(
+                    kwargs.get(
+                        "job_script_prologue",
+                        dask.config.get(
+                            f"jobqueue.{cls.config_name}.job_script_prologue", []
+                        ),
+                    )
+                    or []
+                ),
+            ]
+
+        user_directives = merge(
+            kwargs.get(
+                "job_extra_directives",
+                dask.config.get(f"jobqueue.{cls.config_name}.job_extra_directives"),
+            ),
+            kwargs.get(
+                "job_extra", dask.config.get(f"jobqueue.{cls.config_name}.job_extra")
+            ),
+        )
+        # A user log, in any spelling, replaces the one in the event log directory
+        user_log = user_directives.pop(directive_key(user_directives, "Log"), None)
 
         modified["job_extra_directives"] = merge(
             {"universe": "vanilla"},
@@ -219,20 +1042,42 @@ class ICCluster(HTCondorCluster):
             {"output_destination": f"{xroot_url}"} if xroot_url else None,
             {"Output": "worker-$(ClusterId).$(ProcId).out"} if xroot_url else None,
             {"Error": "worker-$(ClusterId).$(ProcId).err"} if xroot_url else None,
-            {"Log": "worker-$(ClusterId).log"} if xroot_url else None,
+            {"Log": user_log or f"{event_log_directory}/worker-$(ClusterId).log"},
             {"MY.SpoolOnEvict": False} if logdir else None,
+            startup_directives,
+            stage_directives,
             # extra user input
-            kwargs.get(
-                "job_extra_directives",
-                dask.config.get(f"jobqueue.{cls.config_name}.job_extra_directives"),
-            ),
-            kwargs.get(
-                "job_extra", dask.config.get(f"jobqueue.{cls.config_name}.job_extra")
-            ),
-            # never transfer files
+            user_directives,
+            # never transfer output files
             {"transfer_output_files": '""'},
         )
 
+        if transfer_files:
+            directives = modified["job_extra_directives"]
+            key = directive_key(directives, "transfer_input_files")
+            directives[key] = ",".join(
+                filter(None, [directives.get(key), *transfer_files])
+            )
+
+        # Match the job to machines with the requested hardware
+        if require_hardware or prefer_hardware:
+            directives = modified["job_extra_directives"]
+            existing = None
+            if require_hardware:
+                existing = directives.pop(
+                    directive_key(directives, "requirements"), None
+                )
+            if prefer_hardware:
+                directives.pop(directive_key(directives, "rank"), None)
+            directives.update(
+                hardware_directives(
+                    require_hardware,
+                    prefer_hardware,
+                    existing=existing,
+                    config_name=cls.config_name,
+                )
+            )
+
         # We don't support -spool (for now, at least)
         submit_command_extra = kwargs.get("submit_command_extra", [])
         if "-spool" in submit_command_extra:
@@ -247,6 +1092,7 @@ class ICCluster(HTCondorCluster):
                 dask.config.get(f"jobqueue.{cls.config_name}.worker_extra_args"),
             ),
             f"--worker-port {worker_port_range[0]}:{worker_port_range[-1]}",
+            *startup_args,
         ]
 
         # Handle GPUs
@@ -255,13 +1101,18 @@ class ICCluster(HTCondorCluster):
             or dask.config.get(f"jobqueue.{cls.config_name}.job_extra_directives", {})
         ).get("environment", "")
         nvml_env = "DASK_DISTRIBUTED__DIAGNOSTICS__NVML=False"
+        extra_env = []
         if gpus is None:
             # Sometimes we can land on a GPU node, even if we don't request GPUs
             # To avoid pynvml.nvml.NVMLError_LibRmVersionMismatch, we turn off GPU monitoring
-            if existing_env:
-                combined_env = f"{existing_env},{nvml_env}"
-            else:
-                combined_env = nvml_env
+            extra_env.append(nvml_env)
+
+        # Forward the profile's distributed settings to the workers
+        extra_env.extend(profile_environment(profile_config))
+        extra_env.extend(startup_env)
+
+        if extra_env:
+            combined_env = ",".join(filter(None, [existing_env, *extra_env]))
 
             # Strip the environment from the old job_extra_directives
             old_env = modified.get("job_extra_directives", {}).get("environment", "")
@@ -21,3 +21,48 @@ def _set_base_config(priority: str = "old"):
 
 def _user_config_file_path() -> Path:
     return Path(dask.config.PATH) / CONFIG_FILE
+
+
+def _flatten_config(config, prefix=""):
+    """Flatten a nested config mapping into dotted keys."""
+    flat = {}
+    for key, value in (config or {}).items():
+        dotted = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten_config(value, dotted))
+        else:
+            flat[dotted] = value
+    return flat
+
+
+def get_profile(name: str, config_name: str = "ic") -> dict:
+    """
+    Return the workload profile ``name`` from the ``jobqueue.<config_name>.profiles`` section.
+
+    Raises
+    ------
+    ValueError
+        If the profile is not defined.
+    """
+    profiles = dask.config.get(f"jobqueue.{config_name}.profiles", None) or {}
+    if name not in profiles:
+        raise ValueError(
+            f"Unknown profile {name!r}. Available profiles: {', '.join(sorted(profiles)) or 'none'}"
+        )
+    return profiles[name]
+
+
+def profile_distributed_config(profile: dict) -> dict:
+    """Return the ``distributed`` settings of a profile as flat ``distributed.*`` keys."""
+    return _flatten_config(profile.get("distributed", {}), "distributed")
+
+
+def profile_environment(profile: dict) -> list:
+    """Return the ``distributed`` settings of a profile as ``DASK_*`` environment assignments."""
+    env = []
+    for key, value in profile_distributed_config(profile).items():
+        var = "DASK_" + "__".join(
+            part.upper().replace("-", "_") for part in key.split(".")
+        )
+        env.append(f"{var}={value}")
+    return env
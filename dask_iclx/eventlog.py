@@ -0,0 +1,284 @@
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import dask
+
+logger = logging.getLogger(__name__)
+
+# Job states tracked by the engine
+SUBMITTED = "submitted"
+IDLE = "idle"
+RUNNING = "running"
+HELD = "held"
+EVICTED = "evicted"
+TERMINATED = "terminated"
+
+# HTCondor user log event codes and the job state they lead to
+EVENT_STATES = {
+    0: SUBMITTED,  # Job submitted
+    1: RUNNING,  # Job executing
+    4: EVICTED,  # Job evicted from machine
+    5: TERMINATED,  # Job terminated
+    7: IDLE,  # Shadow exception, job goes back to idle
+    9: TERMINATED,  # Job aborted (condor_rm)
+    12: HELD,  # Job held
+    13: IDLE,  # Job released
+    24: IDLE,  # Reconnect failed, job goes back to idle
+}
+
+_EVENT_HEADER = re.compile(
+    r"^(?P<code>\d{3}) \((?P<cluster>\d+)\.(?P<proc>\d+)\.\d+\) (?P<timestamp>\S+ \S+) (?P<text>.*)$"
+)
+_EVENT_END = b"...\n"
+
+
+@dataclass
+class JobEvent:
+    """One event of an HTCondor user log."""
+
+    code: int
+    job_id: str
+    timestamp: Optional[datetime]
+    text: str
+
+    @property
+    def state(self):
+        return EVENT_STATES.get(self.code)
+
+
+def _parse_timestamp(value):
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%m/%d %H:%M:%S"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_event(block):
+    """
+    Parse one event of a classic-format user log.
+
+    Parameters
+    ----------
+    block : str
+        Lines of the event, without the closing ``...`` line.
+
+    Returns
+    -------
+    JobEvent or None
+        None if the block is not a recognisable event.
+    """
+    header, _, body = block.partition("\n")
+    match = _EVENT_HEADER.match(header)
+    if not match:
+        return None
+    return JobEvent(
+        code=int(match.group("code")),
+        job_id=f"{int(match.group('cluster'))}.{int(match.group('proc'))}",
+        timestamp=_parse_timestamp(match.group("timestamp")),
+        text="\n".join([match.group("text"), body]).strip(),
+    )
+
+
+class JobEventLog:
+    """
+    Incremental reader of an HTCondor user event log.
+
+    Only complete events are consumed, so a partially written event at the end of the file
+    is read again on the next call. ``offset`` can be saved and passed back to resume.
+    Job ids are prefixed with ``namespace/`` if given, to keep ids from different schedds apart.
+    """
+
+    def __init__(self, path, offset=0, namespace=None):
+        self.path = path
+        self.offset = offset
+        self.namespace = namespace
+
+    def read_events(self):
+        """Return the events appended since the last call."""
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+
+        events = []
+        consumed = 0
+        while True:
+            end = data.find(_EVENT_END, consumed)
+            if end < 0:
+                break
+            event = parse_event(data[consumed:end].decode(errors="replace"))
+            if event is not None:
+                if self.namespace:
+                    event.job_id = f"{self.namespace}/{event.job_id}"
+                events.append(event)
+            else:
+                logger.debug("Skipping unparsable event in %s", self.path)
+            consumed = end + len(_EVENT_END)
+        self.offset += consumed
+        return events
+
+
+class JobStateEngine:
+    """
+    Job state table fed by HTCondor user event logs instead of schedd queries.
+
+    Parameters
+    ----------
+    state_file : str, optional
+        JSON file the log offsets and job states are saved to after every poll,
+        and resumed from on creation.
+    """
+
+    def __init__(self, state_file: Optional[str] = None):
+        self.state_file = state_file
+        self.logs: Dict[str, JobEventLog] = {}
+        self.states: Dict[str, str] = {}
+        self.last_event: Dict[str, JobEvent] = {}
+        self._callbacks: List[Callable] = []
+        if state_file and os.path.exists(state_file):
+            self._load()
+
+    def _load(self):
+        with open(self.state_file) as f:
+            saved = json.load(f)
+        namespaces = saved.get("namespaces", {})
+        for path, offset in saved.get("offsets", {}).items():
+            self.logs[path] = JobEventLog(path, offset, namespaces.get(path))
+        self.states.update(saved.get("states", {}))
+
+    def save(self):
+        """Save the log offsets and job states to ``state_file``."""
+        if not self.state_file:
+            return
+        tmp = f"{self.state_file}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(
+                {
+                    "offsets": {p: log.offset for p, log in self.logs.items()},
+                    "namespaces": {
+                        p: log.namespace
+                        for p, log in self.logs.items()
+                        if log.namespace
+                    },
+                    "states": self.states,
+                },
+                f,
+            )
+        os.replace(tmp, self.state_file)
+
+    def watch(self, path, namespace=None):
+        """Start following the user log at ``path``, prefixing its job ids with ``namespace``."""
+        if path not in self.logs:
+            self.logs[path] = JobEventLog(path, namespace=namespace)
+
+    def unwatch(self, path):
+        """Stop following the user log at ``path``."""
+        self.logs.pop(path, None)
+
+    def forget(self, job_id):
+        """Drop the state and last event of ``job_id``."""
+        self.states.pop(job_id, None)
+        self.last_event.pop(job_id, None)
+
+    def add_callback(self, callback):
+        """
+        Call ``callback(job_id, old_state, new_state)`` on every job state change.
+        """
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        self._callbacks.remove(callback)
+
+    def state(self, job_id):
+        """Return the last known state of ``job_id``, or None if no event was seen."""
+        return self.states.get(job_id)
+
+    def jobs_in(self, state):
+        """Return the job ids currently in ``state``."""
+        return [job_id for job_id, s in self.states.items() if s == state]
+
+    def apply(self, event):
+        """Update the state table with ``event``."""
+        self.last_event[event.job_id] = event
+        new = event.state
+        old = self.states.get(event.job_id)
+        if new is None or new == old:
+            return
+        self.states[event.job_id] = new
+        for callback in self._callbacks:
+            try:
+                callback(event.job_id, old, new)
+            except Exception:
+                logger.exception("Job state callback %s failed", callback)
+
+    def read(self):
+        """
+        Read new events from all watched logs, without applying them.
+
+        Returns
+        -------
+        list of JobEvent
+            The events read.
+        """
+        events = []
+        for log in list(self.logs.values()):
+            events.extend(log.read_events())
+        return events
+
+    def update(self, events):
+        """Apply ``events`` to the state table and save it."""
+        for event in events:
+            self.apply(event)
+        if events:
+            self.save()
+
+    def poll(self):
+        """
+        Read new events from all watched logs and update the state table.
+
+        Returns
+        -------
+        list of JobEvent
+            The events read.
+        """
+        events = self.read()
+        self.update(events)
+        return events
+
+
+def default_log_directory(config_name="ic"):
+    """
+    Return the local directory the user logs of clusters without a local ``log_directory``
+    are written to: ``jobqueue.ic.event-log.directory``, by default ``~/.dask-iclx/event-logs``.
+    """
+    directory = dask.config.get(f"jobqueue.{config_name}.event-log.directory", None)
+    return os.path.abspath(
+        os.path.expanduser(directory or os.path.join("~", ".dask-iclx", "event-logs"))
+    )
+
+
+def job_log_path(job):
+    """
+    Return the user log path of a submitted :class:`ICJob`, or None if it has no log.
+    """
+    log = job.job_header_dict.get("Log")
+    if not log or not job.job_id:
+        return None
+    cluster_id, _, proc_id = job.job_id.partition(".")
+    macros = {
+        "LogDirectory": job.job_header_dict.get("LogDirectory", ""),
+        "ClusterId": cluster_id,
+        "ProcId": proc_id or "0",
+    }
+    return re.sub(
+        r"\$\((\w+)\)", lambda m: str(macros.get(m.group(1), m.group(0))), log
+    )
@@ -0,0 +1,255 @@
+import getpass
+import logging
+import math
+import re
+import subprocess
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import dask
+from dask.utils import parse_timedelta
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FairShareState:
+    """Fair-share standing of the submitting user in the pool."""
+
+    user: str
+    # Effective user priority, lower is better
+    priority: float
+    # Quota of the user's accounting group in slots, None if there is no group quota
+    quota: Optional[float] = None
+    # Slots currently used by the accounting group (or the user if there is no group)
+    usage: float = 0.0
+    # Observed job starts per minute for this user, if known
+    start_rate: Optional[float] = None
+
+
+@dataclass
+class ScalePlan:
+    """Outcome of capping a scale request to what the pool will start."""
+
+    requested: int
+    allowed: int
+    running: int
+    # Job starts per minute expected for this user
+    start_rate: float
+    # Seconds until all requested jobs are running, None if the quota prevents it or the
+    # fair-share state is unknown
+    eta_seconds: Optional[float]
+    # Whether the group quota, rather than the start rate, holds jobs back
+    quota_limited: bool = False
+
+    @property
+    def capped(self):
+        return self.allowed < self.requested
+
+    @property
+    def deferred(self):
+        return self.requested - self.allowed
+
+
+def _parse_userprio(out):
+    """Split ``condor_userprio -long`` output into one dict per numbered entry."""
+    entries = {}
+    for line in out.splitlines():
+        match = re.match(r"^\s*(\w+?)(\d+)\s*=\s*(.+?)\s*$", line)
+        if not match:
+            continue
+        attr, index, value = match.groups()
+        if value.startswith('"'):
+            value = value.strip('"')
+        elif value.lower() in ("true", "false"):
+            value = value.lower() == "true"
+        else:
+            try:
+                value = float(value)
+            except ValueError:
+                pass
+        entries.setdefault(int(index), {})[attr] = value
+    return list(entries.values())
+
+
+def condor_fairshare_source(user=None):
+    """
+    Return the :class:`FairShareState` of ``user`` from ``condor_userprio``.
+
+    Parameters
+    ----------
+    user : str, optional
+        User name without the domain. Defaults to the current user.
+    """
+    user = user or getpass.getuser()
+    out = subprocess.run(
+        ["condor_userprio", "-allusers", "-long"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    entries = _parse_userprio(out)
+
+    def local_name(entry):
+        return str(entry.get("Name", "")).split("@")[0].split(".")[-1]
+
+    users = [e for e in entries if not e.get("IsAccountingGroup")]
+    mine = [e for e in users if local_name(e) == user]
+    if not mine:
+        # Users that have not run anything recently have no entry and the best priority
+        return FairShareState(user=user, priority=0.5)
+    entry = mine[0]
+
+    state = FairShareState(
+        user=user,
+        priority=entry.get("Priority", 0.5),
+        usage=entry.get("ResourcesUsed", 0.0),
+    )
+    group = entry.get("AccountingGroup")
+    for e in entries:
+        if e.get("IsAccountingGroup") and e.get("Name") == group:
+            quota = e.get("EffectiveQuota", e.get("ConfigQuota"))
+            if quota:
+                state.quota = quota
+                state.usage = e.get("ResourcesUsed", state.usage)
+    return state
+
+
+class FairShareScaler:
+    """
+    Cap and pace scale requests to what the user's priority and group quota will start.
+
+    The group quota caps the number of jobs. Within the quota, jobs are paced to the start
+    rate the user's priority gives: no more are queued than are expected to start within
+    ``horizon``, the rest follow as the queued ones start.
+
+    The fair-share state is a snapshot refreshed by :meth:`refresh`, which runs the source
+    and is meant to be called off the event loop. Planning never calls the source itself.
+    Without a snapshot, e.g. when the source failed, requests are not capped.
+
+    Parameters
+    ----------
+    source : callable
+        Called without arguments, returns a :class:`FairShareState`.
+        :func:`condor_fairshare_source` reads it from the pool, tests can use a local stand-in.
+    cores_per_job : int
+        Slots taken by each job, used to convert the quota into jobs.
+    start_rate : float, optional
+        Job starts per minute at the reference priority, used when the source does not report
+        an observed rate. Defaults to ``jobqueue.ic.fairshare.start-rate``.
+    reference_priority : float, optional
+        Priority at or below which ``start_rate`` applies. Worse priorities start proportionally
+        slower. Defaults to ``jobqueue.ic.fairshare.reference-priority``.
+    horizon : float or str, optional
+        Jobs expected to start within this time are queued ahead of the running ones.
+        Defaults to ``jobqueue.ic.fairshare.pace-horizon``.
+    """
+
+    def __init__(
+        self,
+        source: Callable[[], FairShareState],
+        cores_per_job: int = 1,
+        start_rate: Optional[float] = None,
+        reference_priority: Optional[float] = None,
+        horizon=None,
+        config_name: str = "ic",
+    ):
+        self.source = source
+        self.cores_per_job = cores_per_job
+        self.start_rate = start_rate or dask.config.get(
+            f"jobqueue.{config_name}.fairshare.start-rate", 10
+        )
+        self.reference_priority = reference_priority or dask.config.get(
+            f"jobqueue.{config_name}.fairshare.reference-priority", 1000
+        )
+        self.horizon = parse_timedelta(
+            horizon
+            or dask.config.get(f"jobqueue.{config_name}.fairshare.pace-horizon", "5m")
+        )
+        self.last_plan: Optional[ScalePlan] = None
+        # Last fair-share state read from the source and when it was read
+        self.state: Optional[FairShareState] = None
+        self.updated: Optional[float] = None
+
+    def refresh(self):
+        """
+        Read the fair-share state from the source into the snapshot.
+
+        Blocks while the source runs. On failure a warning is logged and the snapshot is
+        cleared, so scaling falls back to uncapped submission until the source recovers.
+        """
+        try:
+            self.state = self.source()
+        except Exception as e:
+            if self.state is not None or self.updated is None:
+                logger.warning(
+                    "Could not read the fair-share state, scaling uncapped: %s", e
+                )
+            self.state = None
+        self.updated = time.time()
+        return self.state
+
+    def expected_start_rate(self, state):
+        """Return the expected job starts per minute for ``state``."""
+        if state.start_rate:
+            return state.start_rate
+        return self.start_rate * min(
+            1.0, self.reference_priority / max(state.priority, 1e-9)
+        )
+
+    def plan(self, requested, running=0, state=None):
+        """
+        Return the :class:`ScalePlan` for scaling to ``requested`` jobs.
+
+        Parameters
+        ----------
+        requested : int
+            Target number of jobs.
+        running : int
+            Jobs of this cluster that are already running. They are included in the group usage.
+        state : FairShareState, optional
+            Fair-share state to plan against. Defaults to the last snapshot.
+        """
+        state = state if state is not None else self.state
+        if state is None:
+            self.last_plan = ScalePlan(
+                requested=requested,
+                allowed=requested,
+                running=running,
+                start_rate=self.start_rate,
+                eta_seconds=None,
+            )
+            return self.last_plan
+
+        rate = self.expected_start_rate(state)
+        allowed = requested
+        quota_limited = False
+        if requested > running:
+            if state.quota is not None:
+                headroom = math.floor(
+                    max(state.quota - state.usage, 0) / self.cores_per_job
+                )
+                allowed = max(min(requested, running + headroom), running)
+                quota_limited = allowed < requested
+            if rate:
+                # Only queue what the priority is expected to start within the horizon
+                pace = math.ceil(rate * self.horizon / 60)
+                allowed = min(allowed, running + max(pace, 1))
+
+        if quota_limited:
+            eta = None
+        elif requested <= running:
+            eta = 0.0
+        else:
+            eta = (requested - running) / rate * 60 if rate else None
+        self.last_plan = ScalePlan(
+            requested=requested,
+            allowed=allowed,
+            running=running,
+            start_rate=rate,
+            eta_seconds=eta,
+            quota_limited=quota_limited,
+        )
+        logger.debug("Fair-share plan: %s", self.last_plan)
+        return self.last_plan
@@ -0,0 +1,208 @@
+import logging
+import mmap
+import os
+import pickle
+import shutil
+import tempfile
+import uuid
+import weakref
+
+import dask
+from distributed import default_client
+
+logger = logging.getLogger(__name__)
+
+# File formats results are written in, by file suffix
+FORMATS = {"npy": ".npy", "arrow": ".arrow", "raw": ".bin", "pickle": ".pkl"}
+
+
+def _result_format(value):
+    """Pick the file format ``value`` is written in."""
+    module = type(value).__module__.split(".")[0]
+    if module == "numpy" and hasattr(value, "dtype") and not value.dtype.hasobject:
+        return "npy"
+    if module == "pyarrow" and hasattr(value, "schema"):
+        return "arrow"
+    if module == "pandas" and hasattr(value, "columns"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return "pickle"
+        return "arrow"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "raw"
+    return "pickle"
+
+
+def write_result(value, directory):
+    """
+    Write ``value`` to a new file in ``directory`` and return its path and format.
+
+    Runs on the worker holding the result. The file is written under a temporary name and
+    renamed, so a reader never sees a partial file.
+    """
+    format = _result_format(value)
+    path = os.path.join(directory, f"{uuid.uuid4().hex}{FORMATS[format]}")
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if format == "npy":
+                import numpy
+
+                numpy.save(f, value, allow_pickle=False)
+            elif format == "arrow":
+                import pyarrow
+
+                table = (
+                    pyarrow.Table.from_pandas(value)
+                    if type(value).__module__.startswith("pandas")
+                    else value
+                )
+                with pyarrow.ipc.new_file(f, table.schema) as writer:
+                    writer.write(table)
+            elif format == "raw":
+                f.write(memoryview(value))
+            else:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return {"path": path, "format": format, "nbytes": os.path.getsize(path)}
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    # The last result of a gather removes its directory
+    try:
+        os.rmdir(os.path.dirname(path))
+    except OSError:
+        pass
+
+
+class SharedResult:
+    """
+    Handle to a result written to the shared filesystem by :func:`shared_gather`.
+
+    ``value`` maps the file lazily on first access: NumPy arrays come back as read-only
+    memory-mapped arrays, Arrow tables (and pandas frames, as Arrow tables) zero-copy from a
+    memory-mapped IPC file and bytes as a ``memoryview``. Other objects are unpickled into
+    memory. The file is deleted when the handle is released or garbage collected. Views
+    obtained before that stay valid, as the mapping outlives the directory entry.
+    """
+
+    def __init__(self, path, format, nbytes=0):
+        self.path = path
+        self.format = format
+        self.nbytes = nbytes
+        self._value = None
+        self._loaded = False
+        self._finalizer = weakref.finalize(self, _remove, path)
+
+    def __repr__(self):
+        return f"<SharedResult {self.format} {self.nbytes} bytes at {self.path}>"
+
+    @property
+    def released(self):
+        return not self._finalizer.alive
+
+    @property
+    def value(self):
+        """The result, memory-mapped where the format allows it."""
+        if self.released:
+            raise ValueError(f"{self!r} has been released")
+        if not self._loaded:
+            self._value = self._load()
+            self._loaded = True
+        return self._value
+
+    def _load(self):
+        if self.format == "npy":
+            import numpy
+
+            return numpy.load(self.path, mmap_mode="r", allow_pickle=False)
+        if self.format == "arrow":
+            import pyarrow
+
+            return pyarrow.ipc.open_file(pyarrow.memory_map(self.path)).read_all()
+        if self.format == "raw":
+            with open(self.path, "rb") as f:
+                if not os.fstat(f.fileno()).st_size:
+                    return memoryview(b"")
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        with open(self.path, "rb") as f:
+            return pickle.load(f)
+
+    def release(self):
+        """Delete the file. Views already obtained from ``value`` stay valid."""
+        self._value = None
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def shared_gather(futures, directory=None, client=None, config_name="ic"):
+    """
+    Gather results through the shared filesystem instead of the client connection.
+
+    Every worker writes the results it holds into a new directory under ``directory``,
+    and the client only receives their paths. Results are read lazily, memory-mapped,
+    through the returned handles.
+
+    Parameters
+    ----------
+    futures : list of Future
+        Results to gather.
+    directory : str, optional
+        Shared directory visible to the workers and the client, e.g. on ``/vols``.
+        Defaults to ``jobqueue.ic.shared-gather.directory``.
+    client : Client, optional
+        Defaults to the current client.
+
+    Returns
+    -------
+    list of SharedResult
+        One handle per future, in order.
+    """
+    directory = directory or dask.config.get(
+        f"jobqueue.{config_name}.shared-gather.directory", None
+    )
+    if not directory:
+        raise ValueError(
+            "No shared directory to gather through, pass directory or set "
+            f"jobqueue.{config_name}.shared-gather.directory"
+        )
+    futures = list(futures)
+    if not futures:
+        return []
+    client = client or default_client()
+    directory = os.path.join(
+        os.path.expanduser(directory), f"dask-iclx-gather-{uuid.uuid4().hex[:12]}"
+    )
+    os.makedirs(directory)
+
+    # Each write runs where its result is, so no result crosses the network
+    writes = [
+        client.submit(write_result, future, directory, pure=False) for future in futures
+    ]
+    try:
+        written = client.gather(writes)
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    finally:
+        client.cancel(writes)
+    logger.debug(
+        "Gathered %d results (%d bytes) through %s",
+        len(written),
+        sum(w["nbytes"] for w in written),
+        directory,
+    )
+    return [SharedResult(**w) for w in written]
@@ -0,0 +1,55 @@
+import re
+
+import dask
+
+from .preload import MICROARCH_LEVELS
+
+_MICROARCH = {level for level, _ in MICROARCH_LEVELS}
+
+
+def feature_expression(feature, config_name="ic"):
+    """
+    Return the ClassAd expression matching machines with ``feature``.
+
+    ``jobqueue.ic.hardware.expressions`` maps feature names to custom expressions. Otherwise
+    microarchitecture levels (``x86_64-v3``) compare against ``Microarch`` and CPU flags
+    (``avx512f``) use the ``has_<flag>`` machine attributes.
+    """
+    custom = dask.config.get(f"jobqueue.{config_name}.hardware.expressions", {}) or {}
+    if feature in custom:
+        return f"({custom[feature]})"
+    if feature in _MICROARCH:
+        return f'(Microarch >= "{feature}")'
+    if re.match(r"^[a-z0-9_]+$", feature):
+        return f"(has_{feature} =?= True)"
+    raise ValueError(
+        f"No machine attribute for hardware feature {feature!r}, "
+        f"add one to jobqueue.{config_name}.hardware.expressions"
+    )
+
+
+def hardware_directives(require=None, prefer=None, existing=None, config_name="ic"):
+    """
+    Return the ``requirements`` and ``rank`` directives for hardware features.
+
+    Parameters
+    ----------
+    require : list of str, optional
+        Features every job's machine must have.
+    prefer : list of str, optional
+        Features to rank machines by, the first weighing the most.
+    existing : str, optional
+        Requirements already set, combined with the new ones.
+    """
+    directives = {}
+    if require:
+        terms = [feature_expression(f, config_name) for f in require]
+        if existing:
+            terms.insert(0, f"({existing})")
+        directives["requirements"] = " && ".join(terms)
+    if prefer:
+        directives["rank"] = " + ".join(
+            f"{len(prefer) - i} * {feature_expression(f, config_name)}"
+            for i, f in enumerate(prefer)
+        )
+    return directives
@@ -0,0 +1,61 @@
+import math
+
+from .eventlog import EVICTED, HELD, IDLE, SUBMITTED
+
+
+def hedged_jobs(target, running, fraction):
+    """
+    Return the number of jobs to submit to reach ``target`` running jobs with hedging.
+
+    Only the jobs still to start are hedged, so repeated calls for the same target (as
+    adaptive scaling makes) do not keep adding surplus.
+
+    Parameters
+    ----------
+    target : int
+        Number of jobs wanted.
+    running : int
+        Jobs already running.
+    fraction : float
+        Extra fraction of the missing jobs to submit.
+    """
+    if not fraction or target <= running:
+        return target
+    return target + math.ceil((target - running) * fraction)
+
+
+# Surplus jobs are cancelled in this order. Held jobs will not start without
+# intervention, idle ones have not used any slot time. Jobs without a known state,
+# e.g. when there is no event log, may already be running and go last. Running jobs
+# are never cancelled: they have already been matched and are charged to the user's usage.
+_CANCEL_ORDER = {HELD: 0, EVICTED: 1, IDLE: 1, SUBMITTED: 1, None: 2}
+
+
+def select_surplus(names, connected, states, count):
+    """
+    Choose up to ``count`` surplus jobs to cancel once the target has connected.
+
+    Parameters
+    ----------
+    names : list
+        Job names in submission order.
+    connected : set
+        Names of jobs whose workers have connected.
+    states : dict
+        Job state per name, from the user event log, None if unknown.
+    count : int
+        Number of surplus jobs.
+
+    Returns
+    -------
+    list
+        Names to cancel: held jobs first, then queued ones and last those of unknown
+        state, newest first.
+    """
+    candidates = [
+        (position, name)
+        for position, name in enumerate(names)
+        if name not in connected and states.get(name) in _CANCEL_ORDER
+    ]
+    candidates.sort(key=lambda c: (_CANCEL_ORDER[states.get(c[1])], -c[0]))
+    return [name for _, name in candidates[: max(count, 0)]]
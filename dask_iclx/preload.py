@@ -0,0 +1,230 @@
+"""
+Worker preload shipped with ``ICCluster(preload=[...])`` and ``ICCluster(detect_hardware=True)``.
+
+Imports the modules listed in ``DASK_ICLX_PRELOAD_MODULES`` before the worker connects, and
+reports how long the worker took to start and each import took under the ``iclx-startup``
+scheduler event topic. With ``DASK_ICLX_HARDWARE_FLAGS`` set, it also detects the node's
+hardware features and advertises them as worker resources. The file is transferred with every
+job and loaded by path, so it only uses the standard library.
+"""
+
+import asyncio
+import importlib
+import os
+import re
+import sys
+import time
+
+# Colon-separated modules to import when the worker starts
+PRELOAD_MODULES_ENV = "DASK_ICLX_PRELOAD_MODULES"
+
+# Colon-separated CPU flags to advertise as worker resources, enables hardware detection
+HARDWARE_FLAGS_ENV = "DASK_ICLX_HARDWARE_FLAGS"
+
+# Resource advertised by workers whose scratch directory is on an SSD
+SSD_RESOURCE = "ssd"
+
+# Prefix of the resource naming the CPU model, e.g. ``cpu-model-amd-epyc-7763-64-core-processor``
+CPU_MODEL_PREFIX = "cpu-model-"
+
+# CPU flags required by each x86-64 microarchitecture level, on top of the previous level
+MICROARCH_LEVELS = [
+    ("x86_64-v2", {"cx16", "lahf_lm", "popcnt", "sse4_1", "sse4_2", "ssse3"}),
+    ("x86_64-v3", {"avx", "avx2", "bmi1", "bmi2", "f16c", "fma", "movbe", "xsave"}),
+    ("x86_64-v4", {"avx512f", "avx512bw", "avx512cd", "avx512dq", "avx512vl"}),
+]
+
+# Scheduler event topic the timings are reported under
+STARTUP_TOPIC = "iclx-startup"
+
+
+def _process_start():
+    try:
+        import psutil
+
+        return psutil.Process().create_time()
+    except Exception:
+        return None
+
+
+def warm_imports(modules):
+    """Import ``modules`` and return the seconds each took, None for those that failed."""
+    timings = {}
+    for module in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            timings[module] = None
+            continue
+        timings[module] = time.perf_counter() - start
+    return timings
+
+
+def read_machine_ad(path):
+    """Return the attributes of the machine ad file at ``path``, with lowercase names."""
+    ad = {}
+    try:
+        with open(path) as f:
+            lines = f.read().splitlines()
+    except (OSError, TypeError):
+        return ad
+    for line in lines:
+        name, sep, value = line.partition("=")
+        if not sep:
+            continue
+        value = value.strip()
+        if value.lower() in ("true", "false"):
+            value = value.lower() == "true"
+        else:
+            value = value.strip('"')
+        ad[name.strip().lower()] = value
+    return ad
+
+
+def read_cpuinfo(path="/proc/cpuinfo"):
+    """Return the CPU flags and model name of the first processor in ``path``."""
+    flags, model = set(), None
+    try:
+        with open(path) as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                name = name.strip()
+                if name == "flags" and not flags:
+                    flags = set(value.split())
+                elif name == "model name" and model is None:
+                    model = value.strip()
+    except OSError:
+        pass
+    return flags, model
+
+
+def microarch_levels(flags):
+    """Return the x86-64 microarchitecture levels ``flags`` support, lowest first."""
+    levels = []
+    for level, required in MICROARCH_LEVELS:
+        if not required <= flags:
+            break
+        levels.append(level)
+    return levels
+
+
+def scratch_type(path):
+    """Return ``"ssd"`` or ``"hdd"`` for the block device holding ``path``, None if unknown."""
+    try:
+        dev = os.stat(path).st_dev
+    except OSError:
+        return None
+    block = f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}"
+    # Partitions have their queue on the parent device
+    for queue in (f"{block}/queue/rotational", f"{block}/../queue/rotational"):
+        try:
+            with open(queue) as f:
+                return "hdd" if f.read().strip() == "1" else "ssd"
+        except OSError:
+            continue
+    return None
+
+
+def detect_hardware(flags, machine_ad=None, cpuinfo="/proc/cpuinfo", scratch=None):
+    """
+    Detect the hardware features of the node.
+
+    The slot's machine ad is preferred (``has_<flag>``, ``Microarch`` and ``CPUModel``),
+    falling back to ``/proc/cpuinfo`` for what the ad does not say.
+
+    Parameters
+    ----------
+    flags : list of str
+        CPU flags to look for.
+    machine_ad : str, optional
+        Machine ad file. Defaults to ``$_CONDOR_MACHINE_AD``.
+    cpuinfo : str
+        cpuinfo file.
+    scratch : str, optional
+        Scratch directory. Defaults to ``$_CONDOR_SCRATCH_DIR``.
+
+    Returns
+    -------
+    dict
+        ``model``, the ``flags`` present, the ``microarch`` levels and the ``scratch`` disk type.
+    """
+    ad = read_machine_ad(machine_ad or os.environ.get("_CONDOR_MACHINE_AD"))
+    cpu_flags, model = read_cpuinfo(cpuinfo)
+    present = [
+        flag
+        for flag in flags
+        if (ad[f"has_{flag}"] is True if f"has_{flag}" in ad else flag in cpu_flags)
+    ]
+    microarch = ad.get("microarch")
+    if microarch:
+        levels = [level for level, _ in MICROARCH_LEVELS if level <= microarch]
+    else:
+        levels = microarch_levels(cpu_flags)
+    return {
+        "model": ad.get("cpumodel") or model,
+        "flags": present,
+        "microarch": levels,
+        "scratch": scratch_type(
+            scratch or os.environ.get("_CONDOR_SCRATCH_DIR") or os.getcwd()
+        ),
+    }
+
+
+def model_resource(model):
+    """Return the resource name of the CPU ``model``, lowercase with dashes."""
+    return CPU_MODEL_PREFIX + re.sub(r"[^a-z0-9.]+", "-", model.lower()).strip("-")
+
+
+def hardware_resources(hardware, nthreads):
+    """
+    Return the worker resources advertising ``hardware``.
+
+    Each feature, and the CPU model, is advertised with one unit per thread, so that
+    tasks requiring it can still use every thread of the worker.
+    """
+    names = [*hardware["flags"], *hardware["microarch"]]
+    if hardware["scratch"] == "ssd":
+        names.append(SSD_RESOURCE)
+    if hardware.get("model"):
+        names.append(model_resource(hardware["model"]))
+    return {name: float(nthreads) for name in names}
+
+
+async def _report(worker, msg):
+    # Events are only delivered once the worker is connected to the scheduler
+    while not worker.batched_stream.comm:
+        if worker.status.name in ("closing", "closed", "failed"):
+            return
+        await asyncio.sleep(0.1)
+    # The scheduler adds the worker address as "worker"
+    worker.log_event(STARTUP_TOPIC, {"name": str(worker.name), **msg})
+
+
+def dask_setup(worker):
+    # Taken first, so the start-up time does not include the preload's own work
+    now = time.time()
+    created = _process_start()
+    modules = [m for m in os.environ.get(PRELOAD_MODULES_ENV, "").split(":") if m]
+    start = time.perf_counter()
+    imports = warm_imports(modules)
+    import_seconds = time.perf_counter() - start
+    hardware = None
+    if HARDWARE_FLAGS_ENV in os.environ:
+        flags = [f for f in os.environ[HARDWARE_FLAGS_ENV].split(":") if f]
+        hardware = detect_hardware(flags)
+        # Set before the worker registers, which sends its resources to the scheduler
+        for name, quantity in hardware_resources(
+            hardware, worker.state.nthreads
+        ).items():
+            worker.state.total_resources[name] = quantity
+            worker.state.available_resources[name] = quantity
+    msg = {
+        # Interpreter start up to the preload, mostly importing distributed
+        "startup": now - created if created else None,
+        "imports": imports,
+        "import_seconds": import_seconds,
+        "pycache_prefix": sys.pycache_prefix,
+        "hardware": hardware,
+    }
+    asyncio.ensure_future(_report(worker, msg))
@@ -0,0 +1,228 @@
+import json
+import logging
+import os
+import time
+from collections import Counter
+
+import dask
+from dask.utils import parse_timedelta
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FORMATS = ("speedscope", "collapsed")
+
+_SUFFIXES = {"speedscope": ".speedscope.json", "collapsed": ".collapsed"}
+
+
+def _frame_name(node):
+    desc = node["description"]
+    if not isinstance(desc, dict):
+        return str(desc)
+    name = f"{desc.get('name', '')} ({desc.get('filename', '')}:{desc.get('line_number', 0)})"
+    # Semicolons separate frames in collapsed stacks
+    return name.replace(";", ":")
+
+
+def collapse(tree, prefix=None):
+    """
+    Flatten a Dask profile tree into collapsed stacks.
+
+    Parameters
+    ----------
+    tree : dict
+        Profile tree as returned by ``Scheduler.get_profile``.
+    prefix : str, optional
+        Frame put at the bottom of every stack, ie the task prefix.
+
+    Returns
+    -------
+    collections.Counter
+        Sample count per stack, frames separated by ``;`` from the outermost.
+    """
+    stacks = Counter()
+    root = [prefix] if prefix else []
+
+    # Workers do not count a sample on its innermost frame, so the samples a node has
+    # beyond its children are those whose innermost frame is one of its children.
+    # They can only be placed when there is a single child, otherwise they stay on the node.
+    def walk(node, path, leaf=0):
+        children = list(node.get("children", {}).values())
+        rest = node["count"] - sum(child["count"] for child in children)
+        if len(children) == 1:
+            own = leaf
+            children_leaf = [rest]
+        else:
+            own = leaf + rest
+            children_leaf = [0] * len(children)
+        if own > 0 and path:
+            stacks[";".join(path)] += own
+        for child, child_leaf in zip(children, children_leaf):
+            walk(child, [*path, _frame_name(child)], child_leaf)
+
+    walk(tree, root)
+    return stacks
+
+
+def write_collapsed(stacks, path):
+    """Write ``stacks`` in the collapsed format read by ``flamegraph.pl`` and speedscope."""
+    with open(path, "w") as f:
+        for stack, count in sorted(stacks.items()):
+            f.write(f"{stack} {count}\n")
+
+
+def write_speedscope(stacks, path, name="dask-iclx"):
+    """
+    Write ``stacks`` as a speedscope file, with one sampled profile per task prefix.
+
+    The first frame of each stack is taken as its task prefix.
+    """
+    frames, index = [], {}
+    profiles = {}
+    for stack, count in sorted(stacks.items()):
+        prefix, *rest = stack.split(";")
+        samples = []
+        for frame in rest or [prefix]:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({"name": frame})
+            samples.append(index[frame])
+        profile = profiles.setdefault(prefix, {"samples": [], "weights": []})
+        profile["samples"].append(samples)
+        profile["weights"].append(count)
+
+    document = {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "dask-iclx",
+        "shared": {"frames": frames},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": prefix,
+                "unit": "none",
+                "startValue": 0,
+                "endValue": sum(profile["weights"]),
+                **profile,
+            }
+            for prefix, profile in profiles.items()
+        ],
+    }
+    with open(path, "w") as f:
+        json.dump(document, f)
+
+
+def write_profile(stacks, path, format="speedscope", name="dask-iclx"):
+    """Write ``stacks`` to ``path`` in one of :data:`PROFILE_FORMATS`."""
+    if format == "speedscope":
+        write_speedscope(stacks, path, name=name)
+    elif format == "collapsed":
+        write_collapsed(stacks, path)
+    else:
+        raise ValueError(
+            f"Unknown profile format {format!r}, must be one of {', '.join(PROFILE_FORMATS)}"
+        )
+
+
+async def collect_stacks(scheduler, start=None, stop=None, by_prefix=False):
+    """
+    Gather the worker profiles between ``start`` and ``stop``.
+
+    Workers sample their threads continuously (``distributed.worker.profile``), so this
+    only fetches what they recorded. Window boundaries are rounded to the worker profile
+    cycle.
+
+    By default the profile is fetched with a single request and every stack starts with
+    an ``all`` frame. With ``by_prefix`` the stacks are split by task prefix, at the cost
+    of one request per prefix.
+    """
+    if not by_prefix:
+        return collapse(
+            await scheduler.get_profile(start=start, stop=stop), prefix="all"
+        )
+    stacks = Counter()
+    for prefix in list(scheduler.task_prefixes):
+        tree = await scheduler.get_profile(start=start, stop=stop, key=prefix)
+        stacks.update(collapse(tree, prefix=prefix))
+    return stacks
+
+
+def default_profile_path(cluster, format="speedscope", suffix=""):
+    """
+    Return the path of a profile of ``cluster`` in its ``log_directory``.
+
+    Raises ``ValueError`` if the cluster has no ``log_directory``.
+    """
+    log_directory = getattr(cluster, "_job_kwargs", {}).get("log_directory")
+    if not log_directory:
+        raise ValueError(
+            "The cluster has no log_directory, pass the filename to write the profile to"
+        )
+    if format not in _SUFFIXES:
+        raise ValueError(
+            f"Unknown profile format {format!r}, must be one of {', '.join(PROFILE_FORMATS)}"
+        )
+    return os.path.join(
+        os.path.expanduser(log_directory),
+        f"profile-{cluster.name}{suffix}{_SUFFIXES[format]}",
+    )
+
+
+class ContinuousProfiler:
+    """
+    Accumulate the worker profiles of a cluster over its lifetime.
+
+    Every ``collect`` adds the samples recorded since the previous one, fetched with one
+    request for all workers, and rewrites the profile file, so the profile survives the
+    cluster. Combine with a longer
+    ``distributed.worker.profile.interval`` on the workers to keep the sampling overhead low
+    on long production runs.
+
+    Parameters
+    ----------
+    cluster : ICCluster
+        Cluster to profile.
+    path : str
+        File the accumulated profile is written to.
+    format : str
+        One of :data:`PROFILE_FORMATS`.
+    """
+
+    def __init__(self, cluster, path, format="speedscope"):
+        if format not in PROFILE_FORMATS:
+            raise ValueError(
+                f"Unknown profile format {format!r}, must be one of {', '.join(PROFILE_FORMATS)}"
+            )
+        self.cluster = cluster
+        self.path = path
+        self.format = format
+        self.stacks = Counter()
+        self._start = time.time()
+
+    async def collect(self, final=False):
+        """
+        Add the samples recorded since the last call and rewrite the profile.
+
+        Workers return the cycle closed after ``stop`` too, or the unfinished one if none
+        has, so a window stops two cycles back and the next one starts a cycle after it.
+        With ``final`` the window takes everything left, up to the unfinished cycle.
+        """
+        cycle = parse_timedelta(dask.config.get("distributed.worker.profile.cycle"))
+        stop = None if final else time.time() - 2 * cycle
+        if stop is not None and stop <= self._start:
+            return
+        window = await collect_stacks(
+            self.cluster.scheduler, start=self._start, stop=stop
+        )
+        if stop is not None:
+            self._start = stop + cycle
+        if not window:
+            return
+        self.stacks.update(window)
+        try:
+            write_profile(self.stacks, self.path, self.format, name=self.cluster.name)
+        except OSError as e:
+            logger.warning("Could not write the profile to %s: %s", self.path, e)
+
+
+def default_format(config_name="ic"):
+    return dask.config.get(f"jobqueue.{config_name}.profiling.format", "speedscope")
@@ -0,0 +1,148 @@
+import logging
+
+from dask.utils import parse_timedelta
+
+logger = logging.getLogger(__name__)
+
+# Spreads successive lifetimes evenly over the stagger window (golden ratio sequence)
+_GOLDEN = 0.6180339887498949
+
+
+def runtime_limit(directives):
+    """
+    Return the ``+MaxRuntime`` set in the job directives, in seconds, or None.
+
+    Both the ``+MaxRuntime`` and ``MY.MaxRuntime`` spellings are recognised. Values that
+    are not a plain number of seconds, e.g. ClassAd expressions, are ignored.
+    """
+    for key, value in (directives or {}).items():
+        name = key.lower()
+        if name.startswith("+"):
+            name = name[1:]
+        elif name.startswith("my."):
+            name = name[3:]
+        if name != "maxruntime":
+            continue
+        try:
+            return float(str(value).strip().strip('"'))
+        except ValueError:
+            logger.warning("Ignoring %s = %s, not a number of seconds", key, value)
+            return None
+    return None
+
+
+def staggered_lifetime(limit, index, stagger=0.2, margin=0):
+    """
+    Return the lifetime of the ``index``-th worker given a runtime ``limit``.
+
+    Lifetimes are spread over the last ``stagger`` fraction of ``limit - margin``, so
+    workers started together by one scale event are not all retired at once.
+
+    Parameters
+    ----------
+    limit : float
+        Runtime limit of the jobs, in seconds.
+    index : int
+        Number of lifetimes handed out before this one.
+    stagger : float
+        Fraction of the lifetime the deadlines are spread over.
+    margin : float
+        Seconds before the limit by which every worker is retired.
+    """
+    usable = max(limit - margin, 0)
+    return usable * (1 - stagger * ((index * _GOLDEN) % 1))
+
+
+class RecyclePolicy:
+    """
+    Bookkeeping for rolling worker recycling.
+
+    Every job gets a staggered lifetime when its worker first connects. ``lead`` seconds
+    before the end of that lifetime the job is due for a replacement, and once the
+    replacement has connected the old worker can be retired.
+
+    Parameters
+    ----------
+    lifetime : float or str
+        Runtime limit of the jobs, e.g. their ``+MaxRuntime``.
+    stagger : float
+        Fraction of the lifetime the deadlines are spread over.
+    margin : float or str
+        Time before the limit by which workers are retired.
+    lead : float or str
+        Time before its deadline a worker's replacement is submitted, at least the
+        usual queueing and start-up time of a job.
+    """
+
+    def __init__(self, lifetime, stagger=0.2, margin=300, lead=600):
+        self.lifetime = parse_timedelta(lifetime)
+        self.stagger = stagger
+        self.margin = parse_timedelta(margin)
+        self.lead = parse_timedelta(lead)
+        if not 0 <= stagger < 1:
+            raise ValueError(f"stagger must be between 0 and 1, got {stagger}")
+        shortest = (self.lifetime - self.margin) * (1 - stagger)
+        if shortest <= self.lead:
+            raise ValueError(
+                f"A worker lifetime of {self.lifetime:.0f}s leaves no time to run before its "
+                f"replacement is due, reduce the recycle margin or lead time"
+            )
+        # Time each job's worker first connected, and its lifetime from then
+        self.started = {}
+        self.lifetimes = {}
+        # Replacement job per job being recycled
+        self.replacements = {}
+        self._count = 0
+
+    def observe(self, connected, names, now):
+        """
+        Record the jobs whose workers have connected since the last call and forget
+        those no longer in ``names``, the jobs of the cluster.
+        """
+        for name in connected:
+            if name not in self.started:
+                self.started[name] = now
+                self.lifetimes[name] = staggered_lifetime(
+                    self.lifetime, self._count, self.stagger, self.margin
+                )
+                self._count += 1
+        names = set(names)
+        for name in list(self.started):
+            if name not in names:
+                self.forget(name)
+        # Replacements cancelled by a scale down are submitted again when due
+        for old, new in list(self.replacements.items()):
+            if new not in names:
+                del self.replacements[old]
+
+    def forget(self, name):
+        self.started.pop(name, None)
+        self.lifetimes.pop(name, None)
+        self.replacements.pop(name, None)
+
+    def deadline(self, name):
+        """Time by which the worker of ``name`` is retired, None if it has not connected."""
+        if name not in self.started:
+            return None
+        return self.started[name] + self.lifetimes[name]
+
+    def due(self, connected, now):
+        """Connected jobs without a replacement whose deadline is within the lead time."""
+        return [
+            name
+            for name in self.started
+            if name in connected
+            and name not in self.replacements
+            and self.deadline(name) - self.lead <= now
+        ]
+
+    def retirable(self, connected):
+        """
+        Jobs to retire: those whose replacement has connected, and those whose worker
+        has already gone, e.g. killed at the runtime limit, while they waited.
+        """
+        return [
+            old
+            for old, new in self.replacements.items()
+            if new in connected or old not in connected
+        ]
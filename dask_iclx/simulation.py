@@ -0,0 +1,581 @@
+import bisect
+import heapq
+import itertools
+import json
+import math
+import os
+import random
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import dask
+from dask.utils import parse_bytes, parse_timedelta
+
+from .cluster import ICCluster
+from .eventlog import (
+    EVICTED,
+    HELD,
+    IDLE,
+    RUNNING,
+    SUBMITTED,
+    TERMINATED,
+    JobEventLog,
+)
+from .fairshare import FairShareScaler, FairShareState
+
+
+def _bytes(value):
+    return parse_bytes(value) if isinstance(value, str) else float(value)
+
+
+@dataclass
+class PoolTrace:
+    """
+    Recorded availability of an HTCondor pool, replayed by :class:`CapacitySimulator`.
+
+    Times are seconds from the start of the trace.
+    """
+
+    # (time, free cores, free memory in bytes) steps, sorted by time
+    slots: List[Tuple[float, float, float]]
+    # Seconds from a slot being free to the job running on it
+    match_latency: List[float] = field(default_factory=lambda: [0.0])
+    # Evictions per running job-hour
+    eviction_rate: float = 0.0
+    # (time, FairShareState) steps of the user's standing, sorted by time
+    fairshare: List[Tuple[float, FairShareState]] = field(default_factory=list)
+
+    def __post_init__(self):
+        if not self.slots:
+            raise ValueError("A pool trace needs at least one slot availability step")
+        self.slots = sorted(self.slots)
+        self.fairshare = sorted(self.fairshare, key=lambda s: s[0])
+        self._slot_times = [s[0] for s in self.slots]
+        self._fairshare_times = [s[0] for s in self.fairshare]
+
+    def free(self, time):
+        """Return the free cores and memory of the pool at ``time``."""
+        i = max(bisect.bisect_right(self._slot_times, time) - 1, 0)
+        _, cores, memory = self.slots[i]
+        return cores, memory
+
+    def fairshare_state(self, time):
+        """Return the user's fair-share standing at ``time``, or None if not recorded."""
+        if not self.fairshare:
+            return None
+        i = max(bisect.bisect_right(self._fairshare_times, time) - 1, 0)
+        return self.fairshare[i][1]
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a trace from its JSON form::
+
+            {"slots": [{"time": 0, "cores": 2000, "memory": "8 TiB"}, ...],
+             "match_latency": [12, 30, 45, ...],
+             "eviction_rate": 0.02,
+             "fairshare": [{"time": 0, "user": "me", "priority": 800, "quota": 1000, "usage": 600}]}
+        """
+        return cls(
+            slots=[
+                (float(s["time"]), float(s["cores"]), _bytes(s["memory"]))
+                for s in data["slots"]
+            ],
+            match_latency=[float(t) for t in data.get("match_latency") or [0.0]],
+            eviction_rate=float(data.get("eviction_rate", 0.0)),
+            fairshare=[
+                (
+                    float(s["time"]),
+                    FairShareState(**{k: v for k, v in s.items() if k != "time"}),
+                )
+                for s in data.get("fairshare", [])
+            ],
+        )
+
+    def to_dict(self):
+        return {
+            "slots": [
+                {"time": t, "cores": cores, "memory": memory}
+                for t, cores, memory in self.slots
+            ],
+            "match_latency": self.match_latency,
+            "eviction_rate": self.eviction_rate,
+            "fairshare": [{"time": t, **asdict(s)} for t, s in self.fairshare],
+        }
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def to_file(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    @classmethod
+    def from_event_logs(cls, paths, slots, year=None):
+        """
+        Build a trace from the HTCondor user logs of a past run.
+
+        Match latencies are the times from submission (or eviction) to execution, and the
+        eviction rate is the number of evictions per job-hour spent running.
+
+        Parameters
+        ----------
+        paths : list of str
+            User logs, e.g. the ``worker-*.log`` files of a ``log_directory``.
+        slots : list
+            Slot availability steps, as for ``PoolTrace.slots``.
+        year : int, optional
+            Year of the events in logs whose timestamps have none (``MM/DD hh:mm:ss``).
+            Defaults to the year each log was last modified in.
+        """
+        latencies, evictions, running_seconds = [], 0, 0.0
+        for path in paths:
+            waiting, started = {}, {}
+            modified = datetime.fromtimestamp(os.path.getmtime(path))
+            for event in JobEventLog(path).read_events():
+                if event.timestamp is None or event.state is None:
+                    continue
+                t = _dated(event.timestamp, year, modified).timestamp()
+                if event.job_id in started and event.state != RUNNING:
+                    running_seconds += t - started.pop(event.job_id)
+                if event.state == EVICTED:
+                    evictions += 1
+                if event.state in (SUBMITTED, IDLE, EVICTED):
+                    waiting.setdefault(event.job_id, t)
+                elif event.state in (HELD, TERMINATED):
+                    # Time spent held is not waiting for a match
+                    waiting.pop(event.job_id, None)
+                elif event.state == RUNNING:
+                    if event.job_id in waiting:
+                        latencies.append(t - waiting.pop(event.job_id))
+                    started.setdefault(event.job_id, t)
+        return cls(
+            slots=slots,
+            match_latency=latencies or [0.0],
+            eviction_rate=evictions / (running_seconds / 3600)
+            if running_seconds
+            else 0.0,
+        )
+
+
+def _dated(timestamp, year, modified):
+    """Give ``timestamp`` a year if its log line had none, from ``year`` or ``modified``."""
+    # strptime defaults to 1900 when the format has no year
+    if timestamp.year != 1900:
+        return timestamp
+    if year is not None:
+        return timestamp.replace(year=year)
+    dated = timestamp.replace(year=modified.year)
+    # Events after the last modification were written in the year before
+    if dated > modified:
+        dated = dated.replace(year=modified.year - 1)
+    return dated
+
+
+@dataclass
+class Workload:
+    """Tasks to run, each taking one worker thread for its duration."""
+
+    task_seconds: List[float]
+
+    @classmethod
+    def uniform(cls, tasks, seconds):
+        return cls([float(seconds)] * tasks)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a workload from ``{"tasks": [{"count": 1000, "seconds": 30}, ...]}``."""
+        return cls(
+            [float(t["seconds"]) for t in data["tasks"] for _ in range(int(t["count"]))]
+        )
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+@dataclass
+class SimulationResult:
+    """Outcome of a :class:`CapacitySimulator` run. Times are in seconds."""
+
+    # Time until the requested number of jobs first ran, None if never
+    time_to_capacity: Optional[float]
+    # Time until the last task finished, None if the workload did not finish
+    makespan: Optional[float]
+    # Core-hours of running jobs with no task running on them
+    idle_slot_hours: float
+    # Core-hours of running jobs
+    slot_hours: float
+    jobs_submitted: int = 0
+    jobs_cancelled: int = 0
+    evictions: int = 0
+    peak_jobs: int = 0
+
+    def summary(self):
+        """Return a human readable summary of the result."""
+
+        def fmt(seconds):
+            return "never" if seconds is None else f"{seconds / 60:.1f} min"
+
+        return "\n".join(
+            [
+                f"Time to capacity:        {fmt(self.time_to_capacity)}",
+                f"Makespan:                {fmt(self.makespan)}",
+                f"Slot-hours:              {self.slot_hours:.2f}",
+                f"Idle slot-hours:         {self.idle_slot_hours:.2f}",
+                f"Jobs submitted:          {self.jobs_submitted}",
+                f"Jobs cancelled:          {self.jobs_cancelled}",
+                f"Evictions:               {self.evictions}",
+                f"Peak running jobs:       {self.peak_jobs}",
+            ]
+        )
+
+
+class _SimJob:
+    def __init__(self, name, submitted_at):
+        self.name = name
+        self.job_id = name
+        self.state_key = name
+        self.state = IDLE
+        self.submitted_at = submitted_at
+        # Bumped on eviction and cancellation, to drop the events of the previous run
+        self.generation = 0
+        self.reserved = False
+        self.busy = 0
+        self.tasks = {}
+
+
+class _SimStates:
+    def __init__(self, jobs):
+        self.jobs = jobs
+
+    def state(self, key):
+        job = self.jobs.get(key)
+        return job.state if job is not None else None
+
+
+class _SimulatedCluster:
+    """
+    Stand-in for :class:`ICCluster` in the simulator: the scaling decisions are made by the
+    ``ICCluster`` methods themselves, against simulated jobs.
+    """
+
+    _plan_jobs = ICCluster._plan_jobs
+    _hedge_surplus = ICCluster._hedge_surplus
+    _select_surplus = ICCluster._select_surplus
+    _hedge_candidates = ICCluster._hedge_candidates
+    _fairshare_replan = ICCluster._fairshare_replan
+
+    def __init__(self, hedge, fairshare):
+        self.hedge = hedge
+        self.fairshare = fairshare
+        self._hedge_target = None
+        self._hedge_extra = 0
+        self._fairshare_target = None
+        # Jobs in submission order, as in SpecCluster.worker_spec
+        self.worker_spec: Dict[str, _SimJob] = {}
+        self.workers = self.worker_spec
+        self.job_states = _SimStates(self.worker_spec)
+
+    def _connected_jobs(self):
+        return {name for name, job in self.worker_spec.items() if job.state == RUNNING}
+
+    def _running_jobs(self):
+        return len(self._connected_jobs())
+
+
+class CapacitySimulator:
+    """
+    Discrete-event simulation of running a workload on an :class:`ICCluster` in a recorded pool.
+
+    Jobs are matched in submission order whenever the pool, as recorded in ``trace``, has the
+    cores and memory free for them after the cluster's own jobs. They start after a match
+    latency drawn from the trace and are evicted at the trace's eviction rate, losing their
+    running tasks. Hedging and fair-share capping go through the ``ICCluster`` code. Adaptive
+    scaling follows ``Scheduler.adaptive_target`` and ``Adaptive``'s wait before closing jobs.
+    Everything runs on a simulated clock, without a pool or a scheduler.
+
+    Parameters
+    ----------
+    trace : PoolTrace
+        Recorded pool to replay.
+    workload : Workload
+        Tasks to run.
+    cores : int
+        Cores per job, each running one task at a time.
+    memory : str or int
+        Memory per job.
+    jobs : int, optional
+        Fixed number of jobs to scale to. Exclusive with ``adapt``.
+    adapt : dict, optional
+        ``{"minimum": ..., "maximum": ...}`` jobs for adaptive scaling.
+    hedge : float
+        Hedge fraction, as ``ICCluster(hedge=...)``.
+    fairshare : bool
+        Cap scaling to the fair-share standing recorded in the trace.
+    seed : int
+        Seed of the random draws.
+    max_time : float
+        Simulated seconds after which the run is abandoned.
+    """
+
+    def __init__(
+        self,
+        trace,
+        workload,
+        cores=1,
+        memory="2 GiB",
+        jobs=None,
+        adapt=None,
+        hedge=0.0,
+        fairshare=False,
+        seed=0,
+        max_time=14 * 86400,
+        config_name="ic",
+    ):
+        if (jobs is None) == (adapt is None):
+            raise ValueError("Exactly one of jobs or adapt must be given")
+        if fairshare and not trace.fairshare:
+            raise ValueError("The trace has no fair-share standing to cap scaling with")
+        self.trace = trace
+        self.workload = workload
+        self.cores = int(cores)
+        self.memory = _bytes(memory)
+        self.jobs = jobs
+        self.adapt = adapt
+        self.rng = random.Random(seed)
+        self.max_time = max_time
+        self.now = 0.0
+        scaler = None
+        if fairshare:
+            scaler = FairShareScaler(
+                self._fairshare_source,
+                cores_per_job=self.cores,
+                config_name=config_name,
+            )
+        self.cluster = _SimulatedCluster(hedge, scaler)
+
+        self.target_duration = parse_timedelta(
+            dask.config.get("distributed.adaptive.target-duration")
+        )
+        self.wait_count = dask.config.get("distributed.adaptive.wait-count")
+        self.intervals = {
+            "adapt": parse_timedelta(dask.config.get("distributed.adaptive.interval")),
+            "hedge": parse_timedelta(
+                dask.config.get(f"jobqueue.{config_name}.hedge.interval", "5s")
+            ),
+            "fairshare": parse_timedelta(
+                dask.config.get(f"jobqueue.{config_name}.fairshare.interval", "30s")
+            ),
+        }
+
+    def _fairshare_source(self):
+        state = self.trace.fairshare_state(self.now)
+        # The trace records the usage of others in the group, add this cluster's jobs
+        return FairShareState(
+            user=state.user,
+            priority=state.priority,
+            quota=state.quota,
+            usage=state.usage + self.cluster._running_jobs() * self.cores,
+            start_rate=state.start_rate,
+        )
+
+    def _push(self, time, kind, *data):
+        heapq.heappush(self._events, (time, next(self._seq), kind, data))
+
+    def _reserved(self):
+        jobs = [j for j in self.cluster.worker_spec.values() if j.reserved]
+        return len(jobs) * self.cores, len(jobs) * self.memory
+
+    def _match(self):
+        """Match idle jobs in submission order while the pool has room for them."""
+        free_cores, free_memory = self.trace.free(self.now)
+        used_cores, used_memory = self._reserved()
+        for job in self.cluster.worker_spec.values():
+            if job.reserved or job.state != IDLE:
+                continue
+            if (
+                used_cores + self.cores > free_cores
+                or used_memory + self.memory > free_memory
+            ):
+                break
+            job.reserved = True
+            used_cores += self.cores
+            used_memory += self.memory
+            latency = self.rng.choice(self.trace.match_latency)
+            self._push(self.now + latency, "start", job, job.generation)
+
+    def _submit(self, n):
+        """Scale the number of jobs to ``n``, as ``SpecCluster.scale`` does."""
+        spec = self.cluster.worker_spec
+        while len(spec) < n:
+            name = str(next(self._names))
+            spec[name] = _SimJob(name, self.now)
+            self.result.jobs_submitted += 1
+        if len(spec) > n:
+            # As ICCluster.scale, jobs go in the hedge cancel order, then the newest jobs go
+            for name in self.cluster._select_surplus(len(spec) - n):
+                self._cancel(name)
+            for name in list(spec)[n:]:
+                self._cancel(name)
+        self._match()
+
+    def _cancel(self, name):
+        job = self.cluster.worker_spec.pop(name)
+        job.generation += 1
+        job.reserved = False
+        job.state = TERMINATED
+        self._queue.extendleft(job.tasks.values())
+        job.tasks.clear()
+        job.busy = 0
+        self.result.jobs_cancelled += 1
+
+    def _dispatch(self):
+        for job in self.cluster.worker_spec.values():
+            while job.state == RUNNING and job.busy < self.cores and self._queue:
+                seconds = self._queue.popleft()
+                token = next(self._seq)
+                job.tasks[token] = seconds
+                job.busy += 1
+                self._push(self.now + seconds, "done", job, job.generation, token)
+
+    def _adaptive_target(self):
+        """Jobs wanted for the remaining work, following ``Scheduler.adaptive_target``."""
+        ready = len(self._queue)
+        queued = list(itertools.islice(self._queue, 100))
+        occupancy = sum(queued) * (ready / len(queued) if ready > 100 else 1)
+        processing = sum(j.busy for j in self.cluster.worker_spec.values())
+        occupancy += sum(
+            sum(j.tasks.values()) for j in self.cluster.worker_spec.values()
+        )
+        cpu = min(math.ceil(occupancy / self.target_duration), ready + processing)
+        jobs = math.ceil(cpu / self.cores)
+        return max(
+            self.adapt.get("minimum", 0), min(jobs, self.adapt.get("maximum", jobs))
+        )
+
+    def _adapt(self):
+        target = self._adaptive_target()
+        self._peak_target = max(self._peak_target, target)
+        spec = self.cluster.worker_spec
+        # As ICCluster.plan, the hedged surplus is left to the hedge
+        surplus = set(self.cluster._hedge_candidates())
+        plan = [name for name in spec if name not in surplus]
+        if target > len(plan):
+            self._close_count = 0
+            self._submit(self.cluster._plan_jobs(target))
+        elif target < len(plan):
+            # Adaptive only closes workers after wait-count consecutive recommendations,
+            # and retires idle workers rather than busy ones
+            self._close_count += 1
+            if self._close_count >= self.wait_count:
+                self._close_count = 0
+                idle = [n for n in plan if spec[n].state != RUNNING or not spec[n].busy]
+                for name in idle[::-1][: len(plan) - target]:
+                    self._cancel(name)
+        else:
+            self._close_count = 0
+
+    def _account(self, until):
+        dt = until - self.now
+        if dt <= 0:
+            return
+        running = [j for j in self.cluster.worker_spec.values() if j.state == RUNNING]
+        self.result.slot_hours += len(running) * self.cores * dt / 3600
+        self.result.idle_slot_hours += (
+            sum(self.cores - j.busy for j in running) * dt / 3600
+        )
+
+    def run(self):
+        """Run the simulation and return its :class:`SimulationResult`."""
+        self._events = []
+        self._seq = itertools.count()
+        self._names = itertools.count()
+        self._queue = deque(self.workload.task_seconds)
+        self._close_count = 0
+        self._peak_target = self.jobs or 0
+        self.result = SimulationResult(None, None, 0.0, 0.0)
+        capacity_times = []
+
+        for t, _, _ in self.trace.slots[1:]:
+            self._push(t, "slots")
+        if self.cluster.fairshare is not None:
+            # As in ICCluster._start, scaling plans against a snapshot read up front
+            self.cluster.fairshare.refresh()
+        if self.adapt is not None:
+            self._push(0.0, "adapt")
+        else:
+            self._submit(self.cluster._plan_jobs(self.jobs))
+        if self.cluster.hedge:
+            self._push(self.intervals["hedge"], "hedge")
+        if self.cluster.fairshare is not None:
+            self._push(self.intervals["fairshare"], "fairshare")
+
+        remaining = len(self._queue)
+        while self._events and remaining:
+            time, _, kind, data = heapq.heappop(self._events)
+            if time > self.max_time:
+                break
+            self._account(time)
+            self.now = time
+
+            if kind == "start":
+                job, generation = data
+                if generation != job.generation:
+                    continue
+                job.state = RUNNING
+                if self.trace.eviction_rate:
+                    delay = self.rng.expovariate(self.trace.eviction_rate / 3600)
+                    self._push(self.now + delay, "evict", job, job.generation)
+                running = self.cluster._running_jobs()
+                self.result.peak_jobs = max(self.result.peak_jobs, running)
+                capacity_times.append((self.now, running))
+            elif kind == "evict":
+                job, generation = data
+                if generation != job.generation:
+                    continue
+                job.generation += 1
+                job.state = IDLE
+                job.reserved = False
+                self._queue.extendleft(job.tasks.values())
+                job.tasks.clear()
+                job.busy = 0
+                self.result.evictions += 1
+                self._match()
+            elif kind == "done":
+                job, generation, token = data
+                if generation != job.generation:
+                    continue
+                del job.tasks[token]
+                job.busy -= 1
+                remaining -= 1
+            elif kind == "slots":
+                self._match()
+            elif kind == "adapt":
+                self._adapt()
+                self._push(self.now + self.intervals["adapt"], "adapt")
+            elif kind == "hedge":
+                for name in self.cluster._hedge_surplus():
+                    self._cancel(name)
+                self._push(self.now + self.intervals["hedge"], "hedge")
+            elif kind == "fairshare":
+                allowed = self.cluster._fairshare_replan(
+                    self.cluster.fairshare.refresh()
+                )
+                if allowed is not None and allowed > len(self.cluster.worker_spec):
+                    self._submit(allowed)
+                self._push(self.now + self.intervals["fairshare"], "fairshare")
+            self._dispatch()
+
+        if not remaining:
+            self.result.makespan = self.now
+        target = self._peak_target
+        self.result.time_to_capacity = next(
+            (t for t, running in capacity_times if target and running >= target), None
+        )
+        return self.result
@@ -0,0 +1,167 @@
+import hashlib
+import os
+import shlex
+
+# Set in the job environment to the directory holding the staged inputs
+STAGE_DIR_ENV = "DASK_ICLX_STAGE_DIR"
+
+STAGING_METHODS = ("cache", "transfer")
+
+
+def file_digest(path, block_size=2**20):
+    """
+    Return the SHA-256 digest of the content of ``path``.
+
+    Parameters
+    ----------
+    path : str
+        File to hash.
+    block_size : int
+        Bytes read at a time.
+
+    Returns
+    -------
+    str
+        Hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _check_inputs(paths):
+    paths = [os.path.abspath(os.path.expanduser(p)) for p in paths]
+    for path in paths:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Staged input {path} does not exist")
+    names = [os.path.basename(p) for p in paths]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise ValueError(
+            f"Staged inputs must have unique file names, got duplicates: {', '.join(duplicates)}"
+        )
+    return paths
+
+
+def _cache_commands(path, digest, cache_directory):
+    """Shell commands staging one file through the node-local cache."""
+    name = shlex.quote(os.path.basename(path))
+    source = shlex.quote(path)
+    entry = f"{shlex.quote(cache_directory)}/{digest}"
+    cached = f"{entry}/{name}"
+    target = f"${STAGE_DIR_ENV}/{name}"
+    return [
+        # The first job on the node copies the file in, atomically so that
+        # concurrent jobs never see a partial copy. The copy is only cached if it
+        # still has the digest computed at submission, otherwise the file changed
+        # since and this job uses its own copy. Jobs share the cached inode through
+        # their hardlinks, so it is made read-only before it is published.
+        f"mkdir -p {entry}",
+        f"if [ ! -e {cached} ]; then tmp=`mktemp {entry}/.{name}.XXXXXX`"
+        f" && cp {source} $tmp"
+        f" && if [ `sha256sum $tmp | cut -d ' ' -f 1` = {digest} ];"
+        f" then chmod a-w $tmp && mv -f $tmp {cached};"
+        f" else rm -f $tmp;"
+        f" echo 'dask-iclx: not caching input changed since submission:' {source} >&2;"
+        f" fi; fi",
+        # Hardlinks need the same filesystem, fall back to a symlink then a copy
+        f"if [ -e {cached} ]; then ln -f {cached} {target} 2>/dev/null"
+        f" || ln -sf {cached} {target}; touch {entry}; fi",
+        f"[ -e {target} ] || cp {source} {target}",
+    ]
+
+
+def _evict_commands(digests, cache_directory, max_size):
+    """Shell commands removing the least recently used cache entries above ``max_size``."""
+    cache = shlex.quote(cache_directory)
+    keep = "|".join(digests)
+    # Entries are touched when used, so the newest come first. Jobs holding a hardlink
+    # keep their copy when its entry is removed.
+    return [
+        f"total=0; for e in `ls -1t {cache}`; do"
+        f" size=`du -sk {cache}/$e 2>/dev/null | cut -f 1`; total=$((total + ${{size:-0}}));"
+        f" case $e in {keep}) ;; *) if [ $total -gt {max_size // 1024} ];"
+        f" then rm -rf {cache}/$e; fi;; esac; done",
+    ]
+
+
+def staging_setup(
+    paths, method="cache", cache_directory="/tmp/dask-iclx-cache", cache_max_size=None
+):
+    """
+    Return the submit directives and job prologue staging ``paths`` into each job.
+
+    Parameters
+    ----------
+    paths : list of str
+        Files to stage. File names must be unique.
+    method : str
+        ``"transfer"`` ships the files with every job through HTCondor file transfer.
+        ``"cache"`` copies each file once per node from the shared filesystem into a
+        content-hashed cache under ``cache_directory``, and hardlinks it into the job.
+    cache_directory : str
+        Node-local cache directory for the ``"cache"`` method.
+    cache_max_size : int, optional
+        Bytes the cache may hold. Each job removes the least recently used entries
+        beyond this size, except those it uses itself. None for no limit.
+
+    Returns
+    -------
+    tuple of (dict, list)
+        Extra submit directives and job script prologue commands.
+    """
+    if not paths:
+        return {}, []
+    if method not in STAGING_METHODS:
+        raise ValueError(
+            f"Unknown staging method {method!r}, must be one of {', '.join(STAGING_METHODS)}"
+        )
+    paths = _check_inputs(paths)
+
+    if method == "transfer":
+        directives = {
+            "should_transfer_files": "YES",
+            "when_to_transfer_output": "ON_EXIT",
+            "transfer_input_files": ",".join(paths),
+        }
+        # Transferred files land in the job's scratch directory
+        return directives, [f"export {STAGE_DIR_ENV}=$_CONDOR_SCRATCH_DIR"]
+
+    prologue = [
+        f"export {STAGE_DIR_ENV}=$_CONDOR_SCRATCH_DIR/dask-iclx-inputs",
+        f"mkdir -p ${STAGE_DIR_ENV}",
+    ]
+    digests = []
+    for path in paths:
+        digests.append(file_digest(path))
+        prologue.extend(_cache_commands(path, digests[-1], cache_directory))
+    if cache_max_size:
+        prologue.extend(_evict_commands(digests, cache_directory, cache_max_size))
+    return {}, prologue
+
+
+def staged_path(path):
+    """
+    Return the local path of a file staged with ``ICCluster(stage_inputs=[...])``.
+
+    Call this from inside a task with the path given to ``stage_inputs``. Outside of a
+    staged job, or if the file was not staged, the original path is returned.
+
+    Parameters
+    ----------
+    path : str
+        Path of the input file as given to ``stage_inputs``.
+
+    Returns
+    -------
+    str
+        Local path to read the file from.
+    """
+    stage_dir = os.environ.get(STAGE_DIR_ENV)
+    if stage_dir:
+        local = os.path.join(stage_dir, os.path.basename(path))
+        if os.path.exists(local):
+            return local
+    return path
@@ -0,0 +1,69 @@
+import hashlib
+import os
+import re
+import sys
+
+from .preload import HARDWARE_FLAGS_ENV, PRELOAD_MODULES_ENV
+
+PRELOAD_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "preload.py")
+
+
+def bytecode_cache_key(worker_image=None, container_runtime=None, lcg=False):
+    """
+    Return the name of the bytecode cache for the workers' Python environment.
+
+    Workers in a container share the cache of their image, others the cache of the
+    environment (e.g. LCG view) of the submitting interpreter. The key changes with the
+    image or view, so a new release never reads bytecode of an old one. Python versions
+    sharing an environment already keep apart through the ``cpython-XY`` tag of the files.
+    """
+    if container_runtime == "singularity" and worker_image and not lcg:
+        source = worker_image
+    else:
+        source = os.path.dirname(os.path.dirname(sys.executable))
+    name = re.sub(r"[^\w.-]", "_", os.path.basename(source.rstrip("/")) or "python")
+    return f"{name}-{hashlib.sha256(source.encode()).hexdigest()[:12]}"
+
+
+def startup_setup(modules=None, bytecode_cache=None, key="python", hardware_flags=None):
+    """
+    Return the submit directives, job environment and worker arguments to speed up worker start.
+
+    Parameters
+    ----------
+    modules : list of str, optional
+        Modules the workers import before connecting, through the ``preload.py`` worker
+        preload. It is transferred with every job.
+    bytecode_cache : str, optional
+        Shared directory ``PYTHONPYCACHEPREFIX`` points into.
+    key : str
+        Sub-directory of ``bytecode_cache`` for this environment, see :func:`bytecode_cache_key`.
+    hardware_flags : list of str, optional
+        CPU flags the preload looks for. If given, the workers detect their hardware and
+        advertise it as resources.
+
+    Returns
+    -------
+    tuple of (dict, list, list)
+        Extra submit directives, ``NAME=value`` environment entries and worker arguments.
+    """
+    directives, environment, args = {}, [], []
+    if bytecode_cache:
+        prefix = os.path.join(os.path.expanduser(bytecode_cache), key)
+        environment.append(f"PYTHONPYCACHEPREFIX={prefix}")
+    for module in modules or []:
+        if not re.match(r"^[\w.]+$", module):
+            raise ValueError(f"Invalid module name to preload: {module!r}")
+    if modules or hardware_flags is not None:
+        directives = {
+            "should_transfer_files": "YES",
+            "when_to_transfer_output": "ON_EXIT",
+            "transfer_input_files": PRELOAD_SCRIPT,
+        }
+        if modules:
+            environment.append(f"{PRELOAD_MODULES_ENV}={':'.join(modules)}")
+        if hardware_flags is not None:
+            environment.append(f"{HARDWARE_FLAGS_ENV}={':'.join(hardware_flags)}")
+        # Transferred files land in the job's scratch directory
+        args.append("--preload $_CONDOR_SCRATCH_DIR/preload.py")
+    return directives, environment, args
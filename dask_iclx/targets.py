@@ -0,0 +1,154 @@
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SubmitTarget:
+    """A schedd and/or pool jobs can be submitted to."""
+
+    # Schedd name, None for the local schedd
+    name: Optional[str] = None
+    # Collector of the pool, None for the local pool
+    pool: Optional[str] = None
+    weight: float = field(default=1.0, compare=False)
+
+    @classmethod
+    def from_spec(cls, spec):
+        """
+        Build a target from a schedd name, a ``SubmitTarget``, or a dict with
+        ``name``, ``pool`` and ``weight`` keys.
+        """
+        if isinstance(spec, cls):
+            return spec
+        if isinstance(spec, str):
+            return cls(name=spec)
+        if isinstance(spec, dict):
+            return cls(
+                name=spec.get("name"),
+                pool=spec.get("pool"),
+                weight=float(spec.get("weight", 1.0)),
+            )
+        raise TypeError(f"Cannot build a submit target from {spec!r}")
+
+    @property
+    def label(self):
+        """File-name safe identifier of the target."""
+        parts = [p for p in (self.pool, self.name) if p] or ["local"]
+        return re.sub(r"[^\w.-]", "_", "_".join(parts))
+
+    @property
+    def command_args(self):
+        """Arguments selecting this target for ``condor_submit``, ``condor_rm`` and ``condor_q``."""
+        args = []
+        if self.name:
+            args += ["-name", self.name]
+        if self.pool:
+            args += ["-pool", self.pool]
+        return args
+
+
+class _TargetStats:
+    def __init__(self):
+        self.submit_latency = None
+        self.start_delay = None
+        self.queued = 0
+        self.failures = 0
+        self.cooldown_until = 0.0
+
+
+class SubmitRouter:
+    """
+    Distribute jobs across submit targets by their observed submit latency and start rate.
+
+    Each job goes to the target with the lowest expected time until it starts, estimated as
+    ``(submit latency + start delay) * (queued jobs + 1) / weight`` from exponentially weighted
+    averages. Targets whose submissions fail (e.g. the per-user job limit of a schedd was hit)
+    are skipped for ``cooldown`` seconds, doubling with every consecutive failure.
+
+    Parameters
+    ----------
+    targets : list
+        Target specs, see :meth:`SubmitTarget.from_spec`.
+    smoothing : float
+        Weight of the newest observation in the averages.
+    cooldown : float
+        Seconds a failing target is skipped for after its first failure.
+    """
+
+    # Priors used until a target has been observed, so that every target is tried
+    default_submit_latency = 1.0
+    default_start_delay = 60.0
+
+    def __init__(self, targets, smoothing=0.3, cooldown=60.0):
+        self.targets: List[SubmitTarget] = [SubmitTarget.from_spec(t) for t in targets]
+        if not self.targets:
+            raise ValueError("At least one submit target is required")
+        self.smoothing = smoothing
+        self.cooldown = cooldown
+        self.stats: Dict[SubmitTarget, _TargetStats] = {
+            t: _TargetStats() for t in self.targets
+        }
+
+    def _average(self, old, new):
+        if old is None:
+            return new
+        return (1 - self.smoothing) * old + self.smoothing * new
+
+    def expected_wait(self, target):
+        """Expected seconds until one more job submitted to ``target`` starts."""
+        stats = self.stats[target]
+        latency = (
+            stats.submit_latency
+            if stats.submit_latency is not None
+            else self.default_submit_latency
+        )
+        delay = (
+            stats.start_delay
+            if stats.start_delay is not None
+            else self.default_start_delay
+        )
+        return (latency + delay) * (stats.queued + 1) / max(target.weight, 1e-9)
+
+    def candidates(self, now=None):
+        """Return the targets in the order they should be tried for the next job."""
+        now = now if now is not None else time.monotonic()
+        available = [t for t in self.targets if self.stats[t].cooldown_until <= now]
+        cooling = [t for t in self.targets if t not in available]
+        return sorted(available, key=self.expected_wait) + sorted(
+            cooling, key=lambda t: self.stats[t].cooldown_until
+        )
+
+    def record_submit(self, target, latency):
+        """Record a successful submission to ``target`` taking ``latency`` seconds."""
+        stats = self.stats[target]
+        stats.submit_latency = self._average(stats.submit_latency, latency)
+        stats.queued += 1
+        stats.failures = 0
+
+    def record_failure(self, target, now=None):
+        """Record a failed submission, skipping ``target`` for a while."""
+        now = now if now is not None else time.monotonic()
+        stats = self.stats[target]
+        stats.failures += 1
+        stats.cooldown_until = now + self.cooldown * 2 ** (stats.failures - 1)
+        logger.warning(
+            "Submission to %s failed, skipping it for %.0fs",
+            target.label,
+            stats.cooldown_until - now,
+        )
+
+    def record_start(self, target, delay):
+        """Record that a job queued on ``target`` started ``delay`` seconds after submission."""
+        stats = self.stats[target]
+        stats.start_delay = self._average(stats.start_delay, delay)
+        stats.queued = max(stats.queued - 1, 0)
+
+    def record_gone(self, target):
+        """Record that a job queued on ``target`` left the queue without starting."""
+        stats = self.stats[target]
+        stats.queued = max(stats.queued - 1, 0)
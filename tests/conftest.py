@@ -1,5 +1,8 @@
 """Pytest configuration for dask-iclx tests."""
 
+import dask
+import pytest
+
 
 def pytest_configure(config):
     """Configure pytest with custom markers and settings."""
@@ -10,3 +13,10 @@ def pytest_configure(config):
     config.addinivalue_line(
         "markers", "unit: mark test as a unit test that can run anywhere"
     )
+
+
+@pytest.fixture(autouse=True)
+def event_log_directory(tmp_path):
+    """Keep the user logs of test clusters out of the real home directory."""
+    with dask.config.set({"jobqueue.ic.event-log.directory": str(tmp_path / "ev")}):
+        yield tmp_path / "ev"
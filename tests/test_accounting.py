@@ -0,0 +1,257 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from dask_iclx.accounting import ClusterAccountant, JobUsage, condor_job_ads
+from dask_iclx.cluster import ICJob
+
+
+class FakeScheduler:
+    """Scheduler stand-in exposing the task stream API used by the accountant."""
+
+    def __init__(self, maxlen=None):
+        self.stream = []
+        self.workers = {}
+        self.maxlen = maxlen
+
+    def add_task(self, address, start, stop):
+        self.stream.append(
+            {
+                "worker": address,
+                "startstops": [
+                    {"action": "transfer", "start": start - 1, "stop": start},
+                    {"action": "compute", "start": start, "stop": stop},
+                ],
+            }
+        )
+
+    def get_task_stream(self, start_index=None):
+        # Like the scheduler's bounded buffer, older records are gone
+        oldest = max(len(self.stream) - self.maxlen, 0) if self.maxlen else 0
+        return self.stream[max(start_index or 0, oldest) :]
+
+    def get_task_stream_index(self):
+        return len(self.stream)
+
+
+class FakeCluster:
+    config_name = "ic"
+
+    def __init__(self, jobs):
+        self.scheduler = FakeScheduler()
+        self.workers = jobs
+
+    def sync(self, func, **kwargs):
+        return asyncio.run(func(**kwargs))
+
+
+def make_job(name, job_id, cores=2):
+    job = ICJob("tcp://scheduler:8786", name=name, cores=cores, memory="4 GiB")
+    job.job_id = job_id
+    return job
+
+
+@pytest.fixture
+def cluster():
+    cluster = FakeCluster(
+        {"c-0": make_job("c-0", "10.0"), "c-1": make_job("c-1", "11.0")}
+    )
+    cluster.scheduler.workers = {
+        "tcp://a:1": SimpleNamespace(name="c-0"),
+        "tcp://b:1": SimpleNamespace(name="c-1-0"),
+    }
+    return cluster
+
+
+def ads(wall):
+    return lambda job_ids: [
+        {
+            "ClusterId": int(job_id.split(".")[0]),
+            "ProcId": 0,
+            "RequestCpus": 2,
+            "RequestMemory": 4096,
+            "RemoteWallClockTime": wall,
+        }
+        for job_id in job_ids
+    ]
+
+
+class TestJobUsage:
+    """Test per-job usage figures."""
+
+    def test_utilisation(self):
+        usage = JobUsage("1.0", "c-0", 2, 0, 0, 0, wall_seconds=3600, busy_seconds=1800)
+        assert usage.cpu_hours_requested == 2
+        assert usage.cpu_hours_used == 0.5
+        assert usage.utilisation == 0.25
+        assert usage.idle_worker_hours == 0.75
+
+    def test_not_started(self):
+        usage = JobUsage(None, "c-0", 2, 0, 0, 0)
+        assert usage.utilisation == 0.0
+        assert usage.idle_worker_hours == 0.0
+
+
+class TestClusterAccountant:
+    """Test ClusterAccountant reports."""
+
+    def test_report(self, cluster):
+        cluster.scheduler.add_task("tcp://a:1", 0, 3600)
+        cluster.scheduler.add_task("tcp://b:1", 0, 1800)
+        accountant = ClusterAccountant(cluster, ad_source=ads(3600))
+
+        report = accountant.report(now=5000)
+
+        assert len(report.jobs) == 2
+        assert report.cpu_hours_requested == 4
+        assert report.cpu_hours_used == 1.5
+        assert report.idle_cpu_hours == 2.5
+        assert report.memory_gib_hours_requested == 8
+        assert report.utilisation == pytest.approx(0.375)
+        assert "CPU-hours used" in report.summary()
+
+    def test_busy_time_accumulates(self, cluster):
+        accountant = ClusterAccountant(cluster, ad_source=ads(3600))
+        cluster.scheduler.add_task("tcp://a:1", 0, 10)
+        accountant.report()
+        cluster.scheduler.add_task("tcp://a:1", 10, 30)
+        accountant.report()
+
+        assert accountant.busy_seconds == {"c-0": 30}
+
+    def test_wall_time_from_start_date(self, cluster):
+        def source(job_ids):
+            return [{"ClusterId": 10, "ProcId": 0, "JobStartDate": 1000}]
+
+        report = ClusterAccountant(cluster, ad_source=source).report(now=4600)
+        walls = {j.name: j.wall_seconds for j in report.jobs}
+
+        assert walls == {"c-0": 3600, "c-1": 0.0}
+        assert report.gpu_hours_requested == 0
+
+    def test_scale_down_recommendation(self, cluster):
+        wall = [0]
+        accountant = ClusterAccountant(
+            cluster,
+            ad_source=lambda ids: ads(wall[0])(ids),
+            threshold=0.5,
+            window=2,
+        )
+        for i in range(1, 3):
+            wall[0] = 3600 * i
+            cluster.scheduler.add_task("tcp://a:1", 0, 720)
+            report = accountant.report()
+
+        assert report.interval_utilisation == pytest.approx(0.05)
+        assert report.recommended_jobs == 1
+        assert "scale down to 1 jobs" in report.summary()
+
+    def test_no_recommendation_when_busy(self, cluster):
+        wall = [0]
+        accountant = ClusterAccountant(
+            cluster, ad_source=lambda ids: ads(wall[0])(ids), threshold=0.5, window=2
+        )
+        for i in range(1, 4):
+            wall[0] = 3600 * i
+            cluster.scheduler.add_task("tcp://a:1", 0, 7200)
+            cluster.scheduler.add_task("tcp://b:1", 0, 7200)
+            report = accountant.report()
+
+        assert report.recommended_jobs is None
+
+    def test_closed_jobs_stay_accounted(self, cluster):
+        wall = [3600]
+        accountant = ClusterAccountant(cluster, ad_source=lambda ids: ads(wall[0])(ids))
+        cluster.scheduler.add_task("tcp://b:1", 0, 1800)
+        accountant.report()
+
+        # c-1 is retired, its final ad comes from the history
+        del cluster.workers["c-1"]
+        wall[0] = 7200
+        report = accountant.report()
+        assert report.cpu_hours_requested == 8
+        assert report.cpu_hours_used == 0.5
+        assert [j.name for j in report.jobs if j.closed] == ["c-1"]
+
+        # Later reports keep its final usage without querying it again
+        wall[0] = 10800
+        report = accountant.report()
+        assert report.cpu_hours_requested == 10
+        assert accountant.closed["c-1"].wall_seconds == 7200
+
+    def test_closed_job_without_ad(self, cluster):
+        accountant = ClusterAccountant(cluster, ad_source=ads(3600))
+        accountant.report()
+        del cluster.workers["c-1"]
+        accountant.ad_source = lambda ids: ads(7200)([i for i in ids if i != "11.0"])
+
+        report = accountant.report()
+        assert accountant.closed["c-1"].wall_seconds == 3600
+        assert report.cpu_hours_requested == 6
+
+    def test_interval_after_scale_down(self, cluster):
+        wall = [3600]
+        accountant = ClusterAccountant(
+            cluster,
+            ad_source=lambda ids: ads(wall[0])(ids),
+            threshold=0.5,
+            window=1,
+        )
+        accountant.report()
+        # A scale-down leaves the totals of the remaining job to measure the interval by
+        del cluster.workers["c-1"]
+        wall[0] = 7200
+        cluster.scheduler.add_task("tcp://a:1", 0, 1800)
+        report = accountant.report()
+
+        assert report.interval_utilisation == pytest.approx(0.5 / 4)
+        assert report.recommended_jobs == 0
+
+    def test_collect_warns_on_lost_tasks(self, cluster, caplog):
+        accountant = ClusterAccountant(cluster, ad_source=ads(3600))
+        cluster.scheduler.add_task("tcp://a:1", 0, 10)
+        accountant.start()
+        cluster.scheduler.maxlen = 2
+        for _ in range(5):
+            cluster.scheduler.add_task("tcp://a:1", 0, 10)
+
+        accountant.collect()
+
+        assert accountant.busy_seconds == {"c-0": 20}
+        assert "3 finished tasks left the task stream" in caplog.text
+
+    def test_defaults_from_config(self, cluster):
+        accountant = ClusterAccountant(cluster)
+        assert accountant.threshold == 0.5
+        assert accountant.window == 3
+        assert accountant.ad_source is condor_job_ads
+
+
+class TestCondorJobAds:
+    """Test the default job ad source."""
+
+    def test_no_jobs(self):
+        assert condor_job_ads([]) == []
+
+    def test_queue_ads_take_precedence(self, monkeypatch):
+        import subprocess
+
+        def run(cmd, **kwargs):
+            status = 4 if cmd[0] == "condor_history" else 2
+            out = f'[{{"ClusterId": 1, "ProcId": 0, "JobStatus": {status}}}]'
+            return SimpleNamespace(stdout=out)
+
+        monkeypatch.setattr(subprocess, "run", run)
+        assert condor_job_ads(["1.0"]) == [
+            {"ClusterId": 1, "ProcId": 0, "JobStatus": 2}
+        ]
+
+    def test_missing_condor(self, monkeypatch):
+        import subprocess
+
+        def run(cmd, **kwargs):
+            raise FileNotFoundError(cmd[0])
+
+        monkeypatch.setattr(subprocess, "run", run)
+        assert condor_job_ads(["1.0"]) == []
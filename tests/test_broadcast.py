@@ -0,0 +1,141 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from dask_iclx import broadcast
+from dask_iclx.broadcast import (
+    BroadcastCachePlugin,
+    NodeBroadcastCache,
+    node_cached,
+)
+
+
+def crash(directory, *keys, namespace=None):
+    """Attach ``keys`` in a process that exits without releasing them."""
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys; from dask_iclx.broadcast import NodeBroadcastCache; "
+            "cache = NodeBroadcastCache(sys.argv[1], namespace=sys.argv[2] or None); "
+            "[cache.put(key, b'x') for key in sys.argv[3:]]",
+            str(directory),
+            namespace or "",
+            *keys,
+        ],
+        check=True,
+    )
+
+
+class TestNodeBroadcastCache:
+    """Test sharing objects between processes on a node."""
+
+    def test_put_get(self, tmp_path):
+        cache = NodeBroadcastCache(str(tmp_path))
+        view = cache.put("table", b"abcdef")
+        assert isinstance(view, memoryview)
+        assert view.readonly
+        assert bytes(view) == b"abcdef"
+        assert "table" in cache
+        assert bytes(NodeBroadcastCache(str(tmp_path), pid=1).get("table")) == b"abcdef"
+        with pytest.raises(KeyError):
+            cache.get("missing")
+
+    def test_loaded_once(self, tmp_path):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return b"weights"
+
+        first = NodeBroadcastCache(str(tmp_path), pid=os.getpid())
+        second = NodeBroadcastCache(str(tmp_path), pid=os.getppid())
+        assert bytes(first.get_or_create("model", loader)) == b"weights"
+        assert bytes(second.get_or_create("model", loader)) == b"weights"
+        assert len(calls) == 1
+
+    def test_removed_with_last_reference(self, tmp_path):
+        first = NodeBroadcastCache(str(tmp_path), pid=os.getpid())
+        second = NodeBroadcastCache(str(tmp_path), pid=os.getppid())
+        first.put("map", b"x" * 100)
+        second.get("map")
+        assert sorted(first.references("map")) == sorted([os.getpid(), os.getppid()])
+
+        first.close()
+        assert "map" in second
+        second.close()
+        assert "map" not in second
+
+    def test_dead_references_ignored(self, tmp_path):
+        crash(tmp_path, "map")
+        cache = NodeBroadcastCache(str(tmp_path))
+        cache.get("map")
+        assert cache.references("map") == [os.getpid()]
+        cache.release("map")
+        assert "map" not in cache
+
+    def test_other_namespaces(self, tmp_path):
+        crash(tmp_path, "map", namespace="lx01_7.0")
+        other = NodeBroadcastCache(str(tmp_path), pid=1, namespace="lx01_6.0")
+        other.get("map")
+        cache = NodeBroadcastCache(str(tmp_path), pid=1, namespace="lx01_8.0")
+        cache.get("map")
+        # References are checked by their locks, whatever namespace they are in
+        assert cache.references("map") == [1, 1]
+        assert sorted(os.listdir(tmp_path / f"{cache._digest('map')}.refs")) == [
+            "lx01_6.0.1",
+            "lx01_8.0.1",
+        ]
+        cache.release("map")
+        assert "map" in cache
+        other.release("map")
+        assert "map" not in cache
+
+    def test_loaders_lock_per_key(self, tmp_path):
+        cache = NodeBroadcastCache(str(tmp_path))
+
+        def loader():
+            return bytes(cache.get_or_create("inner", lambda: b"in")) + b"out"
+
+        assert bytes(cache.get_or_create("outer", loader)) == b"inout"
+
+    def test_sweep(self, tmp_path):
+        crash(tmp_path, "stale", "shared")
+        other = NodeBroadcastCache(str(tmp_path), namespace="other")
+        other.get("shared")
+        digest = other._digest("partial")
+        (tmp_path / f".tmp-{digest}-abc").write_bytes(b"z")
+
+        cache = NodeBroadcastCache(str(tmp_path))
+        cache.sweep()
+
+        assert "stale" not in cache
+        assert "shared" in cache
+        assert not (tmp_path / f".tmp-{digest}-abc").exists()
+
+    def test_numpy_view(self, tmp_path):
+        np = pytest.importorskip("numpy")
+        cache = NodeBroadcastCache(str(tmp_path))
+        view = cache.put("lut", np.arange(10.0))
+        assert isinstance(view, np.memmap)
+        assert not view.flags.writeable
+        np.testing.assert_array_equal(view, np.arange(10.0))
+
+
+class TestBroadcastCachePlugin:
+    """Test the worker plugin."""
+
+    def test_lifecycle(self, tmp_path):
+        plugin = BroadcastCachePlugin(str(tmp_path))
+        plugin.setup(worker=None)
+        plugin.cache.put("map", b"x")
+        plugin.teardown(worker=None)
+        assert "map" not in plugin.cache
+
+    def test_node_cached_outside_worker(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(
+            broadcast, "_process_cache", NodeBroadcastCache(str(tmp_path))
+        )
+        assert bytes(node_cached("map", lambda: b"abc")) == b"abc"
@@ -1,5 +1,6 @@
+import dask
 import pytest
-from unittest.mock import patch
+from unittest.mock import call, patch
 from pyfakefs.fake_filesystem_unittest import Patcher
 import warnings
 from dask_iclx.cluster import (
@@ -8,7 +9,9 @@ from dask_iclx.cluster import (
     get_xroot_url,
     ICJob,
     ICCluster,
+    JobTemplateCache,
 )
+from dask_iclx.eventlog import job_log_path
 
 
 class TestUtilityFunctions:
@@ -182,6 +185,65 @@ class TestICJob:
         assert "LogDirectory" in job.job_header_dict
 
 
+class TestJobTemplateCache:
+    """Test the per-cluster ICJob template cache."""
+
+    kwargs = {"cores": 2, "memory": "4 GiB", "job_extra_directives": {"a": "b"}}
+
+    def test_cached_job_matches_full_render(self):
+        """Test that a cached job renders the same script as a full initialisation."""
+        cache = JobTemplateCache()
+        full = ICJob("tcp://scheduler:8786", name="cluster-3", **self.kwargs)
+        cached = ICJob(
+            "tcp://scheduler:8786",
+            name="cluster-3",
+            template_cache=cache,
+            **self.kwargs,
+        )
+
+        assert cached.job_script() == full.job_script()
+        assert cached.job_header_dict == full.job_header_dict
+        assert cached.name == "cluster-3"
+        assert cached.worker_disk == full.worker_disk
+
+    def test_template_rendered_once_per_scheduler(self):
+        """Test that the template is only built once per scheduler address."""
+        cache = JobTemplateCache()
+        jobs = [
+            ICJob("tcp://a:8786", name=f"w-{i}", template_cache=cache, **self.kwargs)
+            for i in range(3)
+        ]
+        assert len(cache) == 1
+        assert "--name w-2" in jobs[2].job_script()
+        assert "--name w-0" in jobs[0].job_script()
+
+        ICJob("tcp://b:8786", name="w-0", template_cache=cache, **self.kwargs)
+        assert len(cache) == 2
+
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_cached_job_name_needing_quotes(self):
+        """Test that names needing quoting fall back to a full render."""
+        cache = JobTemplateCache()
+        name = "it's"
+        full = ICJob("tcp://a:8786", name=name, **self.kwargs)
+        cached = ICJob("tcp://a:8786", name=name, template_cache=cache, **self.kwargs)
+
+        assert cached.job_script() == full.job_script()
+
+    def test_cached_jobs_do_not_share_state(self):
+        """Test that per-job state is not shared between cached jobs."""
+        cache = JobTemplateCache()
+        first = ICJob("tcp://a:8786", name="w-0", template_cache=cache, **self.kwargs)
+        second = ICJob("tcp://a:8786", name="w-1", template_cache=cache, **self.kwargs)
+
+        first.job_id = "1.0"
+        assert second.job_id is None
+        assert first.lock is not second.lock
+        assert first.job_header_dict is not second.job_header_dict
+
+
 class TestICClusterInit:
     """Test ICCluster initialization."""
 
@@ -244,6 +306,431 @@ class TestICClusterInit:
         assert kwargs["worker_port_range"] == [60000, 60099]
 
 
+class TestICClusterProfileScheduler:
+    """Test that profile settings reach the scheduler."""
+
+    def test_asynchronous_start(self):
+        """Test that the settings apply when the scheduler is created in _start."""
+        import asyncio
+
+        seen = {}
+
+        async def start(self):
+            seen["interval"] = dask.config.get(
+                "distributed.scheduler.work-stealing-interval"
+            )
+
+        with patch("dask_jobqueue.HTCondorCluster.__init__", return_value=None):
+            cluster = ICCluster(profile="low-latency", asynchronous=True)
+        cluster.periodic_callbacks = {}
+        cluster._job_kwargs = {}
+
+        with patch("distributed.deploy.spec.SpecCluster._start", start):
+            asyncio.run(cluster._start())
+
+        assert seen["interval"] == "10ms"
+        assert dask.config.get("distributed.scheduler.work-stealing-interval") != "10ms"
+
+    def test_start_installs_task_stream(self):
+        """Test that tasks are recorded for accounting from the cluster's start."""
+        import asyncio
+        from unittest.mock import AsyncMock, MagicMock
+
+        with patch("dask_jobqueue.HTCondorCluster.__init__", return_value=None):
+            cluster = ICCluster()
+        cluster.periodic_callbacks = {}
+        cluster._job_kwargs = {}
+        cluster.scheduler = MagicMock()
+        cluster.scheduler.get_task_stream_index.return_value = 7
+
+        with patch("distributed.deploy.spec.SpecCluster._start", AsyncMock()):
+            asyncio.run(cluster._start())
+
+        cluster.scheduler.get_task_stream_index.assert_called_once()
+        assert cluster.accounting._stream_index == 7
+        assert "accounting" in cluster.periodic_callbacks
+
+
+class TestICClusterFairShare:
+    """Test fair-share-aware scaling of ICCluster."""
+
+    @pytest.fixture
+    def cluster(self):
+        from dask_iclx.fairshare import FairShareState
+
+        state = FairShareState("u", priority=500, quota=10, usage=6)
+        with patch("dask_jobqueue.HTCondorCluster.__init__", return_value=None):
+            cluster = ICCluster(fairshare=lambda: state, cores=2)
+        cluster.fairshare.refresh()
+        cluster.scheduler_info = {"workers": {}}
+        cluster.worker_spec = {}
+        cluster._job_kwargs = {"cores": 2, "memory": "4 GiB", "security": None}
+        cluster.job_cls = ICJob
+        return cluster, state
+
+    @patch("dask_jobqueue.HTCondorCluster.scale")
+    def test_scale_capped_by_quota(self, mock_scale, cluster):
+        """Test that scale submits only what the quota allows."""
+        cluster, _ = cluster
+        cluster.scale(jobs=5)
+
+        mock_scale.assert_called_once_with(jobs=2)
+        assert cluster._fairshare_target == 5
+        assert cluster.fairshare.last_plan.deferred == 3
+
+    @patch("dask_jobqueue.HTCondorCluster.scale")
+    def test_scale_within_quota(self, mock_scale, cluster):
+        """Test that scale is untouched when the quota has room."""
+        cluster, _ = cluster
+        cluster.scale(jobs=1)
+
+        mock_scale.assert_called_once_with(jobs=1)
+        assert cluster._fairshare_target is None
+
+    @patch("dask_jobqueue.HTCondorCluster.scale")
+    def test_rescale_submits_deferred_jobs(self, mock_scale, cluster):
+        """Test that deferred jobs are submitted once headroom appears."""
+        import asyncio
+
+        cluster, state = cluster
+        cluster.scale(jobs=5)
+        state.usage = 0
+        asyncio.run(cluster._fairshare_rescale())
+
+        mock_scale.assert_called_with(cluster, jobs=5)
+        assert cluster._fairshare_target is None
+
+    @patch("dask_jobqueue.HTCondorCluster.scale")
+    def test_source_failure_submits_uncapped(self, mock_scale, cluster):
+        """Test that deferred jobs are submitted when the quota cannot be read."""
+        import asyncio
+
+        cluster, _ = cluster
+        cluster.scale(jobs=5)
+
+        def fail():
+            raise FileNotFoundError("condor_userprio")
+
+        cluster.fairshare.source = fail
+        asyncio.run(cluster._fairshare_rescale())
+
+        mock_scale.assert_called_with(cluster, jobs=5)
+        assert cluster._fairshare_target is None
+
+    @patch("dask_jobqueue.HTCondorCluster.scale")
+    def test_scale_without_fairshare(self, mock_scale):
+        """Test that scale is passed through when fairshare is disabled."""
+        with patch("dask_jobqueue.HTCondorCluster.__init__", return_value=None):
+            cluster = ICCluster()
+        cluster.scale(5)
+
+        mock_scale.assert_called_once_with(5, jobs=0, memory=None, cores=None)
+
+
+class TestICClusterHedge:
+    """Test hedged over-submission of ICCluster."""
+
+    @pytest.fixture
+    def cluster(self):
+        with patch("dask_jobqueue.HTCondorCluster.__init__", return_value=None):
+            cluster = ICCluster(hedge=0.2, cores=1)
+        cluster.scheduler_info = {"workers": {}}
+        cluster.worker_spec = {}
+        cluster.workers = {}
+        return cluster
+
+    @patch("dask_jobqueue.HTCondorCluster.scale")
+    def test_scale_submits_extra_jobs(self, mock_scale, cluster):
+        """Test that scaling up submits the hedged number of jobs."""
+        cluster.scale(jobs=10)
+
+        mock_scale.assert_called_once_with(jobs=12)
+        assert cluster._hedge_target == 10
+
+    @patch("dask_jobqueue.HTCondorCluster.scale")
+    def test_rescale_keeps_surplus(self, mock_scale, cluster):
+        """Test that scaling again to the same target keeps the hedged surplus."""
+        cluster.scale(jobs=10)
+        cluster.worker_spec = {f"w-{i}": {} for i in range(12)}
+        cluster.scheduler_info = {
+            "workers": {str(i): {"name": f"w-{i}"} for i in range(8)}
+        }
+        cluster.scale(jobs=10)
+
+        assert mock_scale.call_args_list[-1] == call(jobs=12)
+        assert cluster._hedge_target == 10
+
+    @patch("dask_jobqueue.HTCondorCluster.scale")
+    def test_scale_down_cancels_surplus_first(self, mock_scale, cluster):
+        """Test that scaling down drops queued jobs before those of unknown state."""
+        cluster.worker_spec = {f"w-{i}": {} for i in range(4)}
+        for i in range(4):
+            job = ICJob(name=f"w-{i}")
+            job.job_id = f"{i}.0"
+            cluster.workers[f"w-{i}"] = job
+        cluster.job_states.states = {"1.0": "idle", "2.0": "held"}
+        cluster.scale(jobs=1)
+
+        assert list(cluster.worker_spec) == ["w-0", "w-3"]
+        mock_scale.assert_called_once_with(jobs=2)
+
+    def test_plan_excludes_surplus(self, cluster):
+        """Test that the hedged surplus is not part of the plan adaptive scaling sees."""
+        cluster._hedge_target = 2
+        cluster.worker_spec = {f"w-{i}": {} for i in range(3)}
+        for i in range(3):
+            job = ICJob(name=f"w-{i}")
+            job.job_id = f"{i}.0"
+            cluster.workers[f"w-{i}"] = job
+        cluster.job_states.states = {"0.0": "idle", "1.0": "idle", "2.0": "idle"}
+
+        assert cluster.plan == {"w-0", "w-1"}
+
+    def test_cancel_surplus_once_connected(self, cluster):
+        """Test that only surplus jobs that have not started are cancelled."""
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        cluster._hedge_target = 2
+        cluster.worker_spec = {f"w-{i}": {} for i in range(4)}
+        cluster.workers = {}
+        for i in range(4):
+            job = ICJob(name=f"w-{i}")
+            job.job_id = f"{i}.0"
+            cluster.workers[f"w-{i}"] = job
+        cluster.job_states.states = {"0.0": "running", "1.0": "idle", "3.0": "running"}
+        cluster.scale_down = AsyncMock()
+
+        # Nothing is cancelled before the target has connected
+        cluster.scheduler_info = {"workers": {"a": {"name": "w-0"}}}
+        asyncio.run(cluster._cancel_hedge_surplus())
+        cluster.scale_down.assert_not_called()
+
+        cluster.scheduler_info = {
+            "workers": {"a": {"name": "w-0"}, "b": {"name": "w-2"}}
+        }
+        asyncio.run(cluster._cancel_hedge_surplus())
+        cluster.scale_down.assert_awaited_once_with(["w-1"])
+        assert cluster._hedge_target is None
+
+
+class TestICClusterRecycle:
+    """Test rolling worker recycling of ICCluster."""
+
+    @pytest.fixture
+    def cluster(self):
+        from unittest.mock import AsyncMock
+
+        with patch("dask_jobqueue.HTCondorCluster.__init__", return_value=None):
+            cluster = ICCluster(
+                job_extra_directives={"+MaxRuntime": 7200}, recycle=True
+            )
+        cluster.worker_spec = {"w-0": {}, "w-1": {}}
+        cluster._i = 2
+        cluster.new_spec = {}
+        cluster._new_worker_name = lambda i: f"w-{i}"
+        cluster.scheduler_info = {
+            "workers": {"a": {"name": "w-0"}, "b": {"name": "w-1"}}
+        }
+        cluster._correct_state = AsyncMock()
+        cluster.scale_down = AsyncMock()
+        cluster.scheduler_comm = AsyncMock()
+        return cluster
+
+    def test_lifetime_from_max_runtime(self, cluster):
+        """Test that the lifetime is bounded by +MaxRuntime."""
+        assert cluster.recycle.lifetime == 7200
+        with patch("dask_jobqueue.HTCondorCluster.__init__", return_value=None):
+            cluster = ICCluster(
+                job_extra_directives={"+MaxRuntime": 7200}, recycle="1h"
+            )
+        assert cluster.recycle.lifetime == 3600
+
+    def test_lifetime_required(self):
+        """Test that recycling without a lifetime is refused."""
+        with patch("dask_jobqueue.HTCondorCluster.__init__", return_value=None):
+            with pytest.raises(ValueError, match="MaxRuntime"):
+                ICCluster(recycle=True)
+
+    def test_replace_then_retire(self, cluster):
+        """Test that the old worker is retired only after its replacement connects."""
+        import asyncio
+
+        asyncio.run(cluster._recycle_workers())
+        policy = cluster.recycle
+        first = min(policy.started, key=policy.deadline)
+        policy.started[first] -= 7200
+
+        asyncio.run(cluster._recycle_workers())
+        assert policy.replacements == {first: "w-2"}
+        assert set(cluster.worker_spec) == {"w-0", "w-1", "w-2"}
+        cluster._correct_state.assert_awaited_once()
+        cluster.scale_down.assert_not_called()
+        # The old worker does not count towards the adaptive plan
+        assert cluster.plan == {"w-0", "w-1", "w-2"} - {first}
+
+        cluster.scheduler_info["workers"]["c"] = {"name": "w-2"}
+        asyncio.run(cluster._recycle_workers())
+        cluster.scheduler_comm.retire_workers.assert_awaited_once_with(
+            names=[first], close_workers=True
+        )
+        cluster.scale_down.assert_awaited_once_with([first])
+        assert policy.replacements == {}
+
+
+class TestICClusterJobStates:
+    """Test job state lookups from the user event logs."""
+
+    def test_job_state(self, tmp_path):
+        """Test that polling follows the logs of the cluster's jobs."""
+        import asyncio
+
+        with patch("dask_jobqueue.HTCondorCluster.__init__", return_value=None):
+            cluster = ICCluster()
+        job = ICJob(name="w-0", log_directory=str(tmp_path))
+        job.job_id = "1234.0"
+        cluster.workers = {"w-0": job, "w-1": ICJob(name="w-1")}
+        (tmp_path / "worker-1234.log").write_text(
+            "001 (1234.000.000) 2025-03-04 10:16:41 Job executing on host: <...>\n...\n"
+        )
+
+        asyncio.run(cluster._poll_job_states())
+
+        assert cluster.job_state("w-0") == "running"
+        assert cluster.job_state("w-1") is None
+        assert cluster.job_state("w-2") is None
+
+    def test_callbacks_run_on_loop(self, tmp_path):
+        """Test that only the reading leaves the event loop."""
+        import asyncio
+        import threading
+
+        with patch("dask_jobqueue.HTCondorCluster.__init__", return_value=None):
+            cluster = ICCluster()
+        job = ICJob(name="w-0", log_directory=str(tmp_path))
+        job.job_id = "1234.0"
+        cluster.workers = {"w-0": job}
+        (tmp_path / "worker-1234.log").write_text(
+            "001 (1234.000.000) 2025-03-04 10:16:41 Job executing on host: <...>\n...\n"
+        )
+        threads = []
+        cluster.job_states.add_callback(
+            lambda *change: threads.append(threading.get_ident())
+        )
+
+        asyncio.run(cluster._poll_job_states())
+
+        assert threads == [threading.get_ident()]
+
+    def test_logs_of_closed_jobs_dropped(self, tmp_path, event_log_directory):
+        """Test that terminated jobs are unwatched and closed jobs forgotten."""
+        import asyncio
+
+        with patch("dask_jobqueue.HTCondorCluster.__init__", return_value=None):
+            cluster = ICCluster()
+        job = ICJob(
+            name="w-0",
+            job_extra_directives={
+                "Log": f"{event_log_directory}/worker-$(ClusterId).log"
+            },
+        )
+        job.job_id = "1234.0"
+        user = ICJob(name="w-1", log_directory=str(tmp_path))
+        user.job_id = "1235.0"
+        cluster.workers = {"w-0": job, "w-1": user}
+        default_log = event_log_directory / "worker-1234.log"
+        user_log = tmp_path / "worker-1235.log"
+        default_log.write_text(
+            "005 (1234.000.000) 2025-03-04 10:16:41 Job terminated.\n...\n"
+        )
+        user_log.write_text(
+            "005 (1235.000.000) 2025-03-04 10:16:41 Job terminated.\n...\n"
+        )
+
+        asyncio.run(cluster._poll_job_states())
+        assert cluster.job_state("w-0") == "terminated"
+        assert len(cluster.job_states.logs) == 2
+
+        asyncio.run(cluster._poll_job_states())
+        assert cluster.job_states.logs == {}
+        assert cluster.job_state("w-0") == "terminated"
+
+        cluster.workers = {}
+        asyncio.run(cluster._poll_job_states())
+        assert cluster.job_states.states == {}
+        assert cluster.job_states.last_event == {}
+        assert not default_log.exists()
+        assert user_log.exists()
+
+    def test_worker_arrival_releases_queued(self):
+        """Test that a connected worker counts its job as started without an event log."""
+        import asyncio
+
+        from dask_iclx.targets import SubmitRouter
+
+        with patch("dask_jobqueue.HTCondorCluster.__init__", return_value=None):
+            cluster = ICCluster()
+        cluster.submit_router = SubmitRouter(["a"])
+        target = cluster.submit_router.targets[0]
+        cluster.submit_router.record_submit(target, 1.0)
+        job = ICJob(name="w-0", submit_router=cluster.submit_router)
+        job.submit_target = target
+        job.queued = True
+        cluster.workers = {"w-0": job}
+        cluster.worker_spec = {"w-0": {}}
+        cluster.scheduler_info = {"workers": {"a": {"name": "w-0"}}}
+
+        asyncio.run(cluster._poll_job_states())
+
+        assert cluster.submit_router.stats[target].queued == 0
+        assert not job.queued
+
+
+class TestICClusterProfiling:
+    """Test continuous profiling of ICCluster."""
+
+    @patch("distributed.deploy.spec.SpecCluster._close")
+    def test_close_collects(self, mock_close):
+        """Test that closing the cluster collects the samples since the last collection."""
+        import asyncio
+        from unittest.mock import AsyncMock, MagicMock
+
+        with patch("dask_jobqueue.HTCondorCluster.__init__", return_value=None):
+            cluster = ICCluster()
+        profiler = MagicMock(collect=AsyncMock())
+        cluster._profiler = profiler
+
+        asyncio.run(cluster._close())
+
+        profiler.collect.assert_awaited_once_with(final=True)
+        mock_close.assert_called_once()
+        assert cluster._profiler is None
+
+    def test_stop_profiling_asynchronous(self):
+        """Test that stopping on an asynchronous cluster returns an awaitable."""
+        import asyncio
+        from unittest.mock import AsyncMock, MagicMock, PropertyMock
+
+        from distributed.core import Status
+
+        with patch("dask_jobqueue.HTCondorCluster.__init__", return_value=None):
+            cluster = ICCluster()
+        profiler = MagicMock(collect=AsyncMock(), path="profile.collapsed")
+        cluster._profiler = profiler
+        cluster.periodic_callbacks = {}
+        cluster.status = Status.running
+
+        with patch.object(
+            ICCluster, "asynchronous", new_callable=PropertyMock, return_value=True
+        ):
+            stopped = cluster.stop_profiling()
+        profiler.collect.assert_not_awaited()
+
+        assert asyncio.run(stopped) == "profile.collapsed"
+        profiler.collect.assert_awaited_once_with(final=True)
+        assert cluster._profiler is None
+
+
 class TestICClusterModifyKwargs:
     """Test ICCluster._modify_kwargs method."""
 
@@ -321,6 +808,42 @@ class TestICClusterModifyKwargs:
             == "worker-$(ClusterId).$(ProcId).out"
         )
 
+    def test_modify_kwargs_event_log(self, tmp_path, monkeypatch):
+        """Test that every job writes its user log to an absolute local path."""
+        monkeypatch.chdir(tmp_path)
+        with dask.config.set({"jobqueue.ic.event-log.directory": str(tmp_path / "ev")}):
+            default = ICCluster._modify_kwargs({}, worker_port_range=[60000, 60099])
+            eos = ICCluster._modify_kwargs(
+                {"log_directory": "/eos/user/t/testuser/logs"},
+                worker_port_range=[60000, 60099],
+            )
+        local = ICCluster._modify_kwargs(
+            {"log_directory": "logs"}, worker_port_range=[60000, 60099]
+        )
+
+        expected = f"{tmp_path}/ev/worker-$(ClusterId).log"
+        assert default["job_extra_directives"]["Log"] == expected
+        assert eos["job_extra_directives"]["Log"] == expected
+        assert (
+            local["job_extra_directives"]["Log"]
+            == f"{tmp_path}/logs/worker-$(ClusterId).log"
+        )
+
+        job = ICJob(name="w-0", job_extra_directives=default["job_extra_directives"])
+        job.job_id = "1234.0"
+        assert job_log_path(job) == f"{tmp_path}/ev/worker-1234.log"
+
+    def test_modify_kwargs_user_log(self):
+        """Test that a user log in any spelling replaces the default one."""
+        result = ICCluster._modify_kwargs(
+            {"job_extra_directives": {"log": "/data/u/condor.log"}},
+            worker_port_range=[60000, 60099],
+        )
+
+        directives = result["job_extra_directives"]
+        assert directives["Log"] == "/data/u/condor.log"
+        assert "log" not in directives
+
     @patch("dask.config.get")
     def test_modify_kwargs_gpus(self, mock_config_get):
         """Test kwargs modification with GPU requests."""
@@ -383,6 +906,134 @@ class TestICClusterModifyKwargs:
 
         assert result["job_extra_directives"]["getenv"] == "true"
 
+    @patch("dask.config.get")
+    def test_modify_kwargs_profile(self, mock_config_get):
+        """Test that a profile is layered between the kwargs and the base config."""
+        profiles = {
+            "memory-heavy": {
+                "processes": 1,
+                "death-timeout": 120,
+                "distributed": {"worker": {"memory": {"target": 0.5}}},
+            }
+        }
+        mock_config_get.side_effect = lambda key, default=None: {
+            "jobqueue.ic.container-runtime": "singularity",
+            "jobqueue.ic.worker-image": "/default/image",
+            "jobqueue.ic.job_extra_directives": {},
+            "jobqueue.ic.job_extra": {},
+            "jobqueue.ic.worker_extra_args": [],
+            "jobqueue.ic.profiles": profiles,
+        }.get(key)
+
+        kwargs = {"death_timeout": 30}
+        result = ICCluster._modify_kwargs(
+            kwargs, worker_port_range=[60000, 60099], profile="memory-heavy"
+        )
+
+        assert result["processes"] == 1
+        # Explicit kwargs win over the profile
+        assert result["death_timeout"] == 30
+        env_vars = result["job_extra_directives"]["environment"].split(",")
+        assert "DASK_DISTRIBUTED__WORKER__MEMORY__TARGET=0.5" in env_vars
+        assert "DASK_DISTRIBUTED__DIAGNOSTICS__NVML=False" in env_vars
+
+    def test_modify_kwargs_unknown_profile(self):
+        """Test that an unknown profile raises ValueError."""
+        with pytest.raises(ValueError) as excinfo:
+            ICCluster._modify_kwargs(
+                {}, worker_port_range=[60000, 60099], profile="no-such-profile"
+            )
+
+        assert "Unknown profile 'no-such-profile'" in str(excinfo.value)
+
+    def test_modify_kwargs_stage_inputs(self, tmp_path):
+        """Test that staged inputs add file transfer directives and a prologue."""
+        path = tmp_path / "calib.json"
+        path.write_text("{}")
+
+        with dask.config.set({"jobqueue.ic.staging.method": "transfer"}):
+            result = ICCluster._modify_kwargs(
+                {"job_script_prologue": ["source setup.sh"]},
+                worker_port_range=[60000, 60099],
+                stage_inputs=[str(path)],
+            )
+
+        directives = result["job_extra_directives"]
+        assert directives["transfer_input_files"] == str(path)
+        assert directives["transfer_output_files"] == '""'
+        assert result["job_script_prologue"][-1] == "source setup.sh"
+        assert "DASK_ICLX_STAGE_DIR" in result["job_script_prologue"][0]
+
+    def test_modify_kwargs_stage_inputs_user_transfer(self, tmp_path):
+        """Test that staged inputs are appended to the user's own file transfer."""
+        path = tmp_path / "calib.json"
+        path.write_text("{}")
+
+        with dask.config.set({"jobqueue.ic.staging.method": "transfer"}):
+            result = ICCluster._modify_kwargs(
+                {"job_extra_directives": {"Transfer_Input_Files": "/home/u/x509"}},
+                worker_port_range=[60000, 60099],
+                stage_inputs=[str(path)],
+            )
+
+        directives = result["job_extra_directives"]
+        assert directives["Transfer_Input_Files"] == f"/home/u/x509,{path}"
+        assert "transfer_input_files" not in directives
+
+    def test_modify_kwargs_preload(self, tmp_path):
+        """Test that preloaded modules ship the preload script and set the bytecode cache."""
+        from dask_iclx.startup import PRELOAD_SCRIPT
+
+        path = tmp_path / "calib.json"
+        path.write_text("{}")
+
+        with dask.config.set(
+            {
+                "jobqueue.ic.staging.method": "transfer",
+                "jobqueue.ic.preload.bytecode-cache": "/vols/pycache",
+            }
+        ):
+            result = ICCluster._modify_kwargs(
+                {},
+                worker_port_range=[60000, 60099],
+                worker_image="/cvmfs/images/analysis:v2",
+                stage_inputs=[str(path)],
+                preload=["numpy", "awkward"],
+            )
+
+        directives = result["job_extra_directives"]
+        # Staged inputs and the preload script share one transfer
+        assert directives["transfer_input_files"] == f"{path},{PRELOAD_SCRIPT}"
+        assert (
+            "--preload $_CONDOR_SCRATCH_DIR/preload.py" in result["worker_extra_args"]
+        )
+        env_vars = directives["environment"].split(",")
+        assert "DASK_ICLX_PRELOAD_MODULES=numpy:awkward" in env_vars
+        (prefix,) = [e for e in env_vars if e.startswith("PYTHONPYCACHEPREFIX=")]
+        assert prefix.startswith("PYTHONPYCACHEPREFIX=/vols/pycache/analysis_v2-")
+
+    def test_modify_kwargs_hardware(self):
+        """Test that hardware options add the preload, requirements and rank."""
+        result = ICCluster._modify_kwargs(
+            {"job_extra_directives": {"Requirements": "OpSysMajorVer == 9"}},
+            worker_port_range=[60000, 60099],
+            detect_hardware=True,
+            require_hardware=["avx2"],
+            prefer_hardware=["avx512f"],
+        )
+
+        directives = result["job_extra_directives"]
+        assert "Requirements" not in directives
+        assert (
+            directives["requirements"] == "(OpSysMajorVer == 9) && (has_avx2 =?= True)"
+        )
+        assert directives["rank"] == "1 * (has_avx512f =?= True)"
+        assert (
+            "--preload $_CONDOR_SCRATCH_DIR/preload.py" in result["worker_extra_args"]
+        )
+        env_vars = directives["environment"].split(",")
+        assert "DASK_ICLX_HARDWARE_FLAGS=avx:avx2:fma:avx512f" in env_vars
+
     def test_modify_kwargs_spool_error(self):
         """Test that -spool option raises NotImplementedError."""
         kwargs = {"submit_command_extra": ["-spool"]}
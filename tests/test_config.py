@@ -7,8 +7,12 @@ import yaml
 
 from dask_iclx.config import (
     _ensure_user_config_file,
+    _flatten_config,
     _set_base_config,
     _user_config_file_path,
+    get_profile,
+    profile_distributed_config,
+    profile_environment,
 )
 
 
@@ -91,6 +95,54 @@ class TestConfig(unittest.TestCase):
         for field in required_fields:
             self.assertIn(field, ic_config)
 
+    def test_yaml_profiles(self):
+        """Test that the shipped workload profiles are defined."""
+        from dask_iclx.config import PKG_CONFIG_FILE
+
+        with open(PKG_CONFIG_FILE) as f:
+            config = yaml.safe_load(f)
+
+        profiles = config["jobqueue"]["ic"]["profiles"]
+        for name in ["throughput", "low-latency", "memory-heavy", "many-small-tasks"]:
+            self.assertIn(name, profiles)
+            self.assertIn("distributed", profiles[name])
+
+
+class TestProfiles(unittest.TestCase):
+    """Test workload profile helpers."""
+
+    def test_flatten_config(self):
+        """Test flattening nested settings into dotted keys."""
+        result = _flatten_config({"a": {"b": 1, "c": {"d": "x"}}, "e": False})
+        self.assertEqual(result, {"a.b": 1, "a.c.d": "x", "e": False})
+
+    def test_get_profile(self):
+        """Test looking up a shipped profile."""
+        profile = get_profile("memory-heavy")
+        self.assertEqual(profile["processes"], 1)
+
+    def test_get_profile_unknown(self):
+        """Test that unknown profiles list the available ones."""
+        with self.assertRaises(ValueError) as ctx:
+            get_profile("no-such-profile")
+        self.assertIn("throughput", str(ctx.exception))
+
+    def test_profile_distributed_config(self):
+        """Test the scheduler-side settings of a profile."""
+        profile = {"cores": 2, "distributed": {"scheduler": {"work-stealing": False}}}
+        self.assertEqual(
+            profile_distributed_config(profile),
+            {"distributed.scheduler.work-stealing": False},
+        )
+
+    def test_profile_environment(self):
+        """Test the worker-side environment of a profile."""
+        profile = {"distributed": {"scheduler": {"work-stealing-interval": "10ms"}}}
+        self.assertEqual(
+            profile_environment(profile),
+            ["DASK_DISTRIBUTED__SCHEDULER__WORK_STEALING_INTERVAL=10ms"],
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
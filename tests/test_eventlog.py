@@ -0,0 +1,187 @@
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from dask_iclx.cluster import ICJob
+from dask_iclx.eventlog import (
+    EVICTED,
+    HELD,
+    RUNNING,
+    SUBMITTED,
+    TERMINATED,
+    JobEventLog,
+    JobStateEngine,
+    job_log_path,
+    parse_event,
+)
+
+DATA = Path(__file__).parent / "data"
+
+
+@pytest.fixture
+def logs(tmp_path):
+    for name in ("worker-1234.log", "worker-1235.log"):
+        shutil.copy(DATA / name, tmp_path / name)
+    return tmp_path
+
+
+class TestParseEvent:
+    """Test parsing of single user log events."""
+
+    def test_event(self):
+        event = parse_event(
+            "012 (1234.000.000) 2025-03-04 11:30:01 Job was held.\n\tCode 34"
+        )
+        assert event.code == 12
+        assert event.job_id == "1234.0"
+        assert event.state == HELD
+        assert event.timestamp == datetime(2025, 3, 4, 11, 30, 1)
+        assert "Code 34" in event.text
+
+    def test_short_timestamp(self):
+        event = parse_event("005 (1235.001.000) 03/04 10:59:30 Job terminated.")
+        assert event.job_id == "1235.1"
+        assert event.timestamp == datetime(1900, 3, 4, 10, 59, 30)
+
+    def test_invalid(self):
+        assert parse_event("not an event") is None
+
+
+class TestJobEventLog:
+    """Test incremental reading of recorded user logs."""
+
+    def test_read_all(self, logs):
+        log = JobEventLog(str(logs / "worker-1234.log"))
+        codes = [e.code for e in log.read_events()]
+        assert codes == [0, 40, 40, 1, 6, 4, 1, 12, 9]
+        assert log.read_events() == []
+
+    def test_partial_event_is_read_later(self, logs):
+        path = logs / "worker-1235.log"
+        content = path.read_bytes()
+        cut = content.index(b"005 (1235") + 20
+        path.write_bytes(content[:cut])
+
+        log = JobEventLog(str(path))
+        assert [e.code for e in log.read_events()] == [0, 1]
+
+        path.write_bytes(content)
+        assert [e.code for e in log.read_events()] == [5]
+
+    def test_resume_from_offset(self, logs):
+        path = str(logs / "worker-1235.log")
+        first = JobEventLog(path)
+        first.read_events()
+        assert JobEventLog(path, first.offset).read_events() == []
+
+    def test_missing_file(self, tmp_path):
+        assert JobEventLog(str(tmp_path / "missing.log")).read_events() == []
+
+
+class TestJobStateEngine:
+    """Test the job state table."""
+
+    def test_states_from_logs(self, logs):
+        engine = JobStateEngine()
+        engine.watch(str(logs / "worker-1234.log"))
+        engine.watch(str(logs / "worker-1235.log"))
+        engine.poll()
+
+        assert engine.state("1234.0") == TERMINATED
+        assert engine.state("1235.0") == TERMINATED
+        assert engine.state("9999.0") is None
+        assert engine.last_event["1234.0"].code == 9
+
+    def test_callbacks(self, logs):
+        changes = []
+        engine = JobStateEngine()
+        engine.add_callback(lambda *change: changes.append(change))
+        engine.add_callback(lambda *change: 1 / 0)  # errors are logged, not raised
+        engine.watch(str(logs / "worker-1234.log"))
+        engine.poll()
+
+        assert changes == [
+            ("1234.0", None, SUBMITTED),
+            ("1234.0", SUBMITTED, RUNNING),
+            ("1234.0", RUNNING, EVICTED),
+            ("1234.0", EVICTED, RUNNING),
+            ("1234.0", RUNNING, HELD),
+            ("1234.0", HELD, TERMINATED),
+        ]
+
+    def test_incremental_states(self, logs):
+        path = logs / "worker-1234.log"
+        content = path.read_bytes()
+        path.write_bytes(content[: content.index(b"006 (1234")])
+
+        engine = JobStateEngine()
+        engine.watch(str(path))
+        engine.poll()
+        assert engine.state("1234.0") == RUNNING
+        assert engine.jobs_in(RUNNING) == ["1234.0"]
+
+        path.write_bytes(content)
+        engine.poll()
+        assert engine.jobs_in(RUNNING) == []
+
+    def test_save_and_resume(self, logs, tmp_path):
+        state_file = str(tmp_path / "states.json")
+        path = logs / "worker-1235.log"
+        content = path.read_bytes()
+        path.write_bytes(content[: content.index(b"005 (1235")])
+
+        engine = JobStateEngine(state_file=state_file)
+        engine.watch(str(path))
+        engine.poll()
+        assert engine.state("1235.0") == RUNNING
+
+        path.write_bytes(content)
+        resumed = JobStateEngine(state_file=state_file)
+        assert resumed.state("1235.0") == RUNNING
+        events = resumed.poll()
+        assert [e.code for e in events] == [5]
+        assert resumed.state("1235.0") == TERMINATED
+
+    def test_read_does_not_apply(self, logs):
+        engine = JobStateEngine()
+        engine.watch(str(logs / "worker-1234.log"))
+        events = engine.read()
+        assert engine.state("1234.0") is None
+
+        engine.update(events)
+        assert engine.state("1234.0") == TERMINATED
+
+    def test_unwatch_and_forget(self, logs, tmp_path):
+        state_file = str(tmp_path / "states.json")
+        engine = JobStateEngine(state_file=state_file)
+        engine.watch(str(logs / "worker-1234.log"))
+        engine.watch(str(logs / "worker-1235.log"))
+        engine.poll()
+
+        engine.unwatch(str(logs / "worker-1234.log"))
+        engine.forget("1234.0")
+        engine.save()
+        assert list(engine.logs) == [str(logs / "worker-1235.log")]
+        assert "1234.0" not in engine.states
+        assert "1234.0" not in engine.last_event
+
+        resumed = JobStateEngine(state_file=state_file)
+        assert list(resumed.logs) == [str(logs / "worker-1235.log")]
+        assert list(resumed.states) == ["1235.0"]
+
+
+class TestJobLogPath:
+    """Test resolving the user log of a submitted job."""
+
+    def test_log_directory(self, tmp_path):
+        job = ICJob(name="w-0", log_directory=str(tmp_path))
+        assert job_log_path(job) is None
+        job.job_id = "1234.0"
+        assert job_log_path(job) == f"{tmp_path}/worker-1234.log"
+
+    def test_no_log(self):
+        job = ICJob(name="w-0")
+        job.job_id = "1234.0"
+        assert job_log_path(job) is None
@@ -0,0 +1,148 @@
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+from dask_iclx.fairshare import (
+    FairShareScaler,
+    FairShareState,
+    _parse_userprio,
+    condor_fairshare_source,
+)
+
+USERPRIO_OUTPUT = """
+LastUpdate = 1760000000
+Name1 = "group_cms"
+IsAccountingGroup1 = true
+EffectiveQuota1 = 200.0
+ResourcesUsed1 = 150
+Priority1 = 1000.0
+Name2 = "group_cms.tr1123@hep.ph.ic.ac.uk"
+IsAccountingGroup2 = false
+AccountingGroup2 = "group_cms"
+Priority2 = 2000.0
+ResourcesUsed2 = 40
+Name3 = "someone@hep.ph.ic.ac.uk"
+IsAccountingGroup3 = false
+AccountingGroup3 = "<none>"
+Priority3 = 500.0
+ResourcesUsed3 = 3
+"""
+
+
+class TestParseUserprio:
+    """Test parsing of condor_userprio -long output."""
+
+    def test_entries(self):
+        entries = _parse_userprio(USERPRIO_OUTPUT)
+        assert len(entries) == 3
+        assert entries[0]["Name"] == "group_cms"
+        assert entries[0]["IsAccountingGroup"] is True
+        assert entries[1]["Priority"] == 2000.0
+
+
+class TestCondorFairShareSource:
+    """Test reading the fair-share state from condor_userprio."""
+
+    @pytest.fixture(autouse=True)
+    def userprio(self, monkeypatch):
+        monkeypatch.setattr(
+            subprocess,
+            "run",
+            lambda cmd, **kwargs: SimpleNamespace(stdout=USERPRIO_OUTPUT),
+        )
+
+    def test_group_user(self):
+        state = condor_fairshare_source("tr1123")
+        assert state.priority == 2000.0
+        assert state.quota == 200.0
+        assert state.usage == 150
+
+    def test_user_without_group(self):
+        state = condor_fairshare_source("someone")
+        assert state.priority == 500.0
+        assert state.quota is None
+        assert state.usage == 3
+
+    def test_unknown_user(self):
+        state = condor_fairshare_source("nobody")
+        assert state.priority == 0.5
+        assert state.quota is None
+
+
+class TestFairShareScaler:
+    """Test capping and pacing of scale requests."""
+
+    def test_no_quota(self):
+        scaler = FairShareScaler(
+            lambda: FairShareState("u", priority=500), start_rate=10
+        )
+        scaler.refresh()
+        plan = scaler.plan(20)
+        assert plan.allowed == 20
+        assert not plan.capped
+        assert plan.eta_seconds == pytest.approx(120)
+        assert scaler.last_plan is plan
+
+    def test_quota_caps_request(self):
+        state = FairShareState("u", priority=500, quota=100, usage=90)
+        scaler = FairShareScaler(lambda: state, cores_per_job=2)
+        scaler.refresh()
+        plan = scaler.plan(20, running=3)
+        assert plan.allowed == 8
+        assert plan.capped
+        assert plan.quota_limited
+        assert plan.deferred == 12
+        assert plan.eta_seconds is None
+
+    def test_priority_paces_submission(self):
+        scaler = FairShareScaler(
+            lambda: None, start_rate=10, reference_priority=1000, horizon="5m"
+        )
+        good = scaler.plan(200, running=10, state=FairShareState("u", 500))
+        assert good.allowed == 60
+        assert good.capped and not good.quota_limited
+        assert good.eta_seconds == pytest.approx(190 / 10 * 60)
+        # A worse priority starts, and so queues, proportionally fewer jobs
+        poor = scaler.plan(200, running=10, state=FairShareState("u", 4000))
+        assert poor.allowed == 23
+        assert poor.eta_seconds == pytest.approx(190 / 2.5 * 60)
+
+    def test_scale_down_not_capped(self):
+        state = FairShareState("u", priority=500, quota=10, usage=50)
+        plan = FairShareScaler(lambda: state).plan(2, running=5, state=state)
+        assert plan.allowed == 2
+        assert plan.eta_seconds == 0
+
+    def test_source_failure_uncapped(self, caplog):
+        def source():
+            raise FileNotFoundError("condor_userprio")
+
+        scaler = FairShareScaler(source)
+        assert scaler.refresh() is None
+        assert "Could not read the fair-share state" in caplog.text
+        plan = scaler.plan(20, running=3)
+        assert plan.allowed == 20
+        assert plan.eta_seconds is None
+
+    def test_plan_does_not_read_source(self):
+        scaler = FairShareScaler(lambda: pytest.fail("source should not be read"))
+        assert scaler.plan(4).allowed == 4
+
+    def test_priority_slows_start_rate(self):
+        scaler = FairShareScaler(lambda: None, start_rate=10, reference_priority=1000)
+        assert scaler.expected_start_rate(FairShareState("u", 500)) == 10
+        assert scaler.expected_start_rate(FairShareState("u", 4000)) == 2.5
+        observed = FairShareState("u", 4000, start_rate=6)
+        assert scaler.expected_start_rate(observed) == 6
+
+    def test_explicit_state(self):
+        scaler = FairShareScaler(lambda: pytest.fail("source should not be read"))
+        plan = scaler.plan(4, state=FairShareState("u", priority=1000))
+        assert plan.allowed == 4
+
+    def test_defaults_from_config(self):
+        scaler = FairShareScaler(lambda: None)
+        assert scaler.start_rate == 10
+        assert scaler.reference_priority == 1000
+        assert scaler.horizon == 300
@@ -0,0 +1,98 @@
+import gc
+import os
+
+import pytest
+
+from dask_iclx.gather import SharedResult, shared_gather, write_result
+
+
+class TestWriteResult:
+    """Test writing results to the shared directory."""
+
+    def test_raw(self, tmp_path):
+        written = write_result(b"abc", str(tmp_path))
+        assert written["format"] == "raw"
+        assert written["nbytes"] == 3
+        handle = SharedResult(**written)
+        assert isinstance(handle.value, memoryview)
+        assert bytes(handle.value) == b"abc"
+
+    def test_pickle(self, tmp_path):
+        handle = SharedResult(**write_result({"a": [1, 2]}, str(tmp_path)))
+        assert handle.format == "pickle"
+        assert handle.value == {"a": [1, 2]}
+
+    def test_numpy(self, tmp_path):
+        np = pytest.importorskip("numpy")
+        handle = SharedResult(**write_result(np.arange(5), str(tmp_path)))
+        assert isinstance(handle.value, np.memmap)
+        np.testing.assert_array_equal(handle.value, np.arange(5))
+
+    def test_arrow(self, tmp_path):
+        pa = pytest.importorskip("pyarrow")
+        table = pa.table({"x": [1, 2, 3]})
+        handle = SharedResult(**write_result(table, str(tmp_path)))
+        assert handle.format == "arrow"
+        assert handle.value.equals(table)
+
+    def test_no_partial_files(self, tmp_path):
+        class Unpicklable:
+            def __reduce__(self):
+                raise TypeError("no")
+
+        with pytest.raises(TypeError):
+            write_result(Unpicklable(), str(tmp_path))
+        assert os.listdir(tmp_path) == []
+
+
+class TestSharedResult:
+    """Test cleanup of gathered results."""
+
+    def test_release(self, tmp_path):
+        directory = tmp_path / "gather"
+        directory.mkdir()
+        first = SharedResult(**write_result(b"abc", str(directory)))
+        second = SharedResult(**write_result(b"def", str(directory)))
+        view = first.value
+        first.release()
+        assert not os.path.exists(first.path)
+        assert bytes(view) == b"abc"
+        with pytest.raises(ValueError, match="released"):
+            first.value
+        # The directory goes with the last result
+        with second:
+            pass
+        assert not directory.exists()
+
+    def test_garbage_collected(self, tmp_path):
+        handle = SharedResult(**write_result(b"abc", str(tmp_path)))
+        path = handle.path
+        del handle
+        gc.collect()
+        assert not os.path.exists(path)
+
+
+class TestSharedGather:
+    """Test gathering through the shared filesystem."""
+
+    def test_requires_directory(self):
+        with pytest.raises(ValueError, match="shared-gather"):
+            shared_gather([1])
+
+    def test_gather(self, tmp_path):
+        from distributed import Client, LocalCluster
+
+        with LocalCluster(
+            n_workers=2, processes=False, dashboard_address=None
+        ) as cluster:
+            with Client(cluster) as client:
+                futures = client.map(lambda i: bytes([i]) * 10, range(4))
+                handles = shared_gather(futures, directory=str(tmp_path))
+                assert [bytes(h.value) for h in handles] == [
+                    bytes([i]) * 10 for i in range(4)
+                ]
+                (directory,) = os.listdir(tmp_path)
+                assert len(os.listdir(tmp_path / directory)) == 4
+                for handle in handles:
+                    handle.release()
+                assert os.listdir(tmp_path) == []
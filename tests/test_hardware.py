@@ -0,0 +1,143 @@
+import os
+from types import SimpleNamespace
+
+import dask
+import pytest
+
+from dask_iclx import preload
+from dask_iclx.hardware import feature_expression, hardware_directives
+from dask_iclx.preload import (
+    detect_hardware,
+    hardware_resources,
+    microarch_levels,
+    read_cpuinfo,
+    read_machine_ad,
+)
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+MACHINE_AD = os.path.join(DATA, "machine.ad")
+CPUINFO = os.path.join(DATA, "cpuinfo")
+
+
+class TestDetection:
+    """Test detecting node hardware on the worker."""
+
+    def test_machine_ad(self):
+        ad = read_machine_ad(MACHINE_AD)
+        assert ad["microarch"] == "x86_64-v3"
+        assert ad["has_avx2"] is True
+        assert ad["has_avx512f"] is False
+        assert read_machine_ad(None) == {}
+
+    def test_cpuinfo(self):
+        flags, model = read_cpuinfo(CPUINFO)
+        assert "avx512f" in flags
+        assert model == "Intel(R) Xeon(R) Gold 6248 CPU @ 2.50GHz"
+
+    def test_microarch_levels(self):
+        flags, _ = read_cpuinfo(CPUINFO)
+        assert microarch_levels(flags) == ["x86_64-v2", "x86_64-v3", "x86_64-v4"]
+        assert microarch_levels(flags - {"avx512vl"}) == ["x86_64-v2", "x86_64-v3"]
+        assert microarch_levels(set()) == []
+
+    def test_from_cpuinfo(self, tmp_path):
+        hardware = detect_hardware(
+            ["avx2", "avx512f", "sve"],
+            machine_ad=str(tmp_path / "missing"),
+            cpuinfo=CPUINFO,
+            scratch=str(tmp_path),
+        )
+        assert hardware["flags"] == ["avx2", "avx512f"]
+        assert hardware["microarch"][-1] == "x86_64-v4"
+        assert hardware["model"].startswith("Intel")
+
+    def test_from_machine_ad(self, tmp_path):
+        hardware = detect_hardware(
+            ["avx2", "avx512f"],
+            machine_ad=MACHINE_AD,
+            cpuinfo=str(tmp_path / "missing"),
+            scratch=str(tmp_path),
+        )
+        assert hardware["flags"] == ["avx2"]
+        assert hardware["microarch"] == ["x86_64-v2", "x86_64-v3"]
+        assert hardware["model"] == "AMD EPYC 7763 64-Core Processor"
+
+    def test_machine_ad_preferred(self, tmp_path):
+        # The cpuinfo has avx512f and x86_64-v4, the ad of the slot says otherwise
+        hardware = detect_hardware(
+            ["avx2", "avx512f", "avx512bw"],
+            machine_ad=MACHINE_AD,
+            cpuinfo=CPUINFO,
+            scratch=str(tmp_path),
+        )
+        assert hardware["flags"] == ["avx2", "avx512bw"]
+        assert hardware["microarch"] == ["x86_64-v2", "x86_64-v3"]
+        assert hardware["model"] == "AMD EPYC 7763 64-Core Processor"
+
+    def test_resources(self):
+        hardware = {"flags": ["avx2"], "microarch": ["x86_64-v2"], "scratch": "ssd"}
+        assert hardware_resources(hardware, 4) == {
+            "avx2": 4.0,
+            "x86_64-v2": 4.0,
+            "ssd": 4.0,
+        }
+        hardware["scratch"] = "hdd"
+        assert "ssd" not in hardware_resources(hardware, 4)
+
+    def test_model_resource(self):
+        hardware = {
+            "model": "AMD EPYC 7763 64-Core Processor",
+            "flags": [],
+            "microarch": [],
+            "scratch": None,
+        }
+        assert hardware_resources(hardware, 2) == {
+            "cpu-model-amd-epyc-7763-64-core-processor": 2.0
+        }
+
+    def test_dask_setup_sets_resources(self, monkeypatch):
+        monkeypatch.setenv("DASK_ICLX_HARDWARE_FLAGS", "avx2")
+        monkeypatch.setattr(
+            preload,
+            "detect_hardware",
+            lambda flags: {
+                "model": "m",
+                "flags": flags,
+                "microarch": [],
+                "scratch": None,
+            },
+        )
+        monkeypatch.setattr(preload.asyncio, "ensure_future", lambda coro: coro.close())
+        state = SimpleNamespace(
+            nthreads=2, total_resources={"GPU": 1}, available_resources={"GPU": 1}
+        )
+        preload.dask_setup(SimpleNamespace(name="w", state=state))
+        expected = {"GPU": 1, "avx2": 2.0, "cpu-model-m": 2.0}
+        assert state.total_resources == expected
+        assert state.available_resources == expected
+
+
+class TestExpressions:
+    """Test matching jobs to hardware."""
+
+    def test_feature_expression(self):
+        assert feature_expression("avx512f") == "(has_avx512f =?= True)"
+        assert feature_expression("x86_64-v3") == '(Microarch >= "x86_64-v3")'
+        with pytest.raises(ValueError, match="hardware.expressions"):
+            feature_expression("ssd scratch")
+        with dask.config.set({"jobqueue.ic.hardware.expressions": {"ssd": "IsSSD"}}):
+            assert feature_expression("ssd") == "(IsSSD)"
+
+    def test_directives(self):
+        directives = hardware_directives(
+            require=["avx2"],
+            prefer=["avx512f", "x86_64-v4"],
+            existing="OpSysMajorVer == 9",
+        )
+        assert directives["requirements"] == (
+            "(OpSysMajorVer == 9) && (has_avx2 =?= True)"
+        )
+        assert directives["rank"] == (
+            '2 * (has_avx512f =?= True) + 1 * (Microarch >= "x86_64-v4")'
+        )
+        assert hardware_directives() == {}
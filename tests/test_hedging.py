@@ -0,0 +1,46 @@
+from dask_iclx.hedging import hedged_jobs, select_surplus
+
+
+class TestHedgedJobs:
+    """Test the number of jobs submitted with hedging."""
+
+    def test_no_hedge(self):
+        assert hedged_jobs(100, 0, 0) == 100
+        assert hedged_jobs(100, 0, None) == 100
+
+    def test_hedge_missing_jobs(self):
+        assert hedged_jobs(100, 0, 0.1) == 110
+        assert hedged_jobs(100, 90, 0.1) == 101
+
+    def test_no_hedge_when_running(self):
+        assert hedged_jobs(100, 100, 0.1) == 100
+        assert hedged_jobs(10, 20, 0.1) == 10
+
+
+class TestSelectSurplus:
+    """Test the surplus cancellation policy."""
+
+    names = ["w-0", "w-1", "w-2", "w-3", "w-4", "w-5"]
+
+    def test_newest_idle_first(self):
+        connected = {"w-0", "w-2"}
+        states = {name: "idle" for name in self.names}
+        states.update({"w-0": "running", "w-2": "running"})
+        assert select_surplus(self.names, connected, states, 2) == ["w-5", "w-4"]
+
+    def test_unknown_state_last(self):
+        states = {"w-1": "idle", "w-3": "submitted"}
+        assert select_surplus(self.names, set(), states, 3) == ["w-3", "w-1", "w-5"]
+
+    def test_held_first(self):
+        states = {"w-1": "held", "w-4": "idle"}
+        assert select_surplus(self.names, set(), states, 2) == ["w-1", "w-4"]
+
+    def test_running_never_cancelled(self):
+        states = {name: "running" for name in self.names}
+        states["w-3"] = "evicted"
+        assert select_surplus(self.names, {"w-0"}, states, 4) == ["w-3"]
+
+    def test_no_surplus(self):
+        assert select_surplus(self.names, set(), {}, 0) == []
+        assert select_surplus(self.names, set(), {}, -1) == []
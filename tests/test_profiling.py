@@ -0,0 +1,149 @@
+import asyncio
+import json
+from collections import Counter
+from types import SimpleNamespace
+
+import dask
+import pytest
+
+from dask_iclx import profiling
+from dask_iclx.profiling import (
+    ContinuousProfiler,
+    collapse,
+    collect_stacks,
+    default_profile_path,
+    write_profile,
+)
+
+
+def node(name, count, children=()):
+    return {
+        "identifier": name,
+        "description": {"name": name, "filename": f"{name}.py", "line_number": 1},
+        "count": count,
+        "children": {child["identifier"]: child for child in children},
+    }
+
+
+def tree():
+    return node("root", 10, [node("main", 10, [node("load", 3), node("fit", 6)])])
+
+
+class FakeScheduler:
+    def __init__(self, trees):
+        self.task_prefixes = dict.fromkeys(trees)
+        self.trees = trees
+        self.calls = []
+
+    async def get_profile(self, start=None, stop=None, key=None):
+        self.calls.append((start, stop, key))
+        if key is None:
+            return next(iter(self.trees.values()))
+        return self.trees[key]
+
+
+class TestCollapse:
+    """Test flattening profile trees into collapsed stacks."""
+
+    def test_collapse(self):
+        # 10 samples through main, 3 deeper in load and 6 in fit, so one sample
+        # had load or fit as its innermost frame and stays on main
+        stacks = collapse(tree(), prefix="fit-model")
+        assert stacks == {
+            "fit-model;main (main.py:1)": 1,
+            "fit-model;main (main.py:1);load (load.py:1)": 3,
+            "fit-model;main (main.py:1);fit (fit.py:1)": 6,
+        }
+
+    def test_innermost_frame(self):
+        # Worker trees do not count samples on the innermost frame
+        stacks = collapse(node("root", 5, [node("call", 5, [node("busy", 0)])]))
+        assert stacks == {"call (call.py:1);busy (busy.py:1)": 5}
+
+    def test_empty(self):
+        assert collapse(node("root", 0)) == Counter()
+
+
+class TestWriteProfile:
+    """Test the profile file formats."""
+
+    def test_collapsed(self, tmp_path):
+        path = tmp_path / "p.collapsed"
+        write_profile(Counter({"a;b": 2, "a": 1}), str(path), "collapsed")
+        assert path.read_text() == "a 1\na;b 2\n"
+
+    def test_speedscope(self, tmp_path):
+        path = tmp_path / "p.json"
+        stacks = Counter({"load-x;f;g": 2, "load-x;f": 1, "fit-y;h": 4})
+        write_profile(stacks, str(path), "speedscope", name="test")
+        document = json.loads(path.read_text())
+        frames = [f["name"] for f in document["shared"]["frames"]]
+        profiles = {p["name"]: p for p in document["profiles"]}
+        assert set(profiles) == {"load-x", "fit-y"}
+        assert profiles["fit-y"]["endValue"] == 4
+        assert [[frames[i] for i in s] for s in profiles["load-x"]["samples"]] == [
+            ["f"],
+            ["f", "g"],
+        ]
+
+    def test_unknown_format(self, tmp_path):
+        with pytest.raises(ValueError, match="speedscope"):
+            write_profile(Counter(), str(tmp_path / "p"), "pprof")
+
+
+class TestCollect:
+    """Test gathering worker profiles through the scheduler."""
+
+    def test_collect_by_prefix(self):
+        scheduler = FakeScheduler({"fit": tree(), "idle": node("root", 0)})
+        stacks = asyncio.run(collect_stacks(scheduler, start=1, stop=2, by_prefix=True))
+        assert sum(stacks.values()) == 10
+        assert all(s.startswith("fit;") for s in stacks)
+        assert scheduler.calls == [(1, 2, "fit"), (1, 2, "idle")]
+
+    def test_collect_single_request(self):
+        scheduler = FakeScheduler({"fit": tree(), "idle": node("root", 0)})
+        stacks = asyncio.run(collect_stacks(scheduler, start=1, stop=2))
+        assert sum(stacks.values()) == 10
+        assert all(s.startswith("all;") for s in stacks)
+        assert scheduler.calls == [(1, 2, None)]
+
+    def test_default_path(self, tmp_path):
+        cluster = SimpleNamespace(
+            name="abc", _job_kwargs={"log_directory": str(tmp_path)}
+        )
+        assert default_profile_path(cluster, "collapsed") == str(
+            tmp_path / "profile-abc.collapsed"
+        )
+        with pytest.raises(ValueError, match="log_directory"):
+            default_profile_path(SimpleNamespace(name="abc", _job_kwargs={}))
+
+    def test_continuous_accumulates(self, tmp_path, monkeypatch):
+        clock = iter([100.0, 110.0, 120.0])
+        monkeypatch.setattr(
+            profiling, "time", SimpleNamespace(time=lambda: next(clock))
+        )
+        path = tmp_path / "p.collapsed"
+        cluster = SimpleNamespace(name="abc", scheduler=FakeScheduler({"fit": tree()}))
+        with dask.config.set({"distributed.worker.profile.cycle": "1s"}):
+            profiler = ContinuousProfiler(cluster, str(path), "collapsed")
+            asyncio.run(profiler.collect())
+            asyncio.run(profiler.collect())
+            asyncio.run(profiler.collect(final=True))
+        assert sum(profiler.stacks.values()) == 30
+        assert "all;main (main.py:1);fit (fit.py:1) 18" in path.read_text()
+        # One request per collection, stopping short of the unfinished cycle and
+        # starting after the cycle the last one got past its stop
+        assert cluster.scheduler.calls == [
+            (100.0, 108.0, None),
+            (109.0, 118.0, None),
+            (119.0, None, None),
+        ]
+
+    def test_continuous_waits_for_whole_cycles(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(profiling, "time", SimpleNamespace(time=lambda: 100.0))
+        cluster = SimpleNamespace(name="abc", scheduler=FakeScheduler({"fit": tree()}))
+        with dask.config.set({"distributed.worker.profile.cycle": "1s"}):
+            profiler = ContinuousProfiler(cluster, str(tmp_path / "p"), "collapsed")
+            asyncio.run(profiler.collect())
+        assert cluster.scheduler.calls == []
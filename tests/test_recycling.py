@@ -0,0 +1,86 @@
+import pytest
+
+from dask_iclx.recycling import RecyclePolicy, runtime_limit, staggered_lifetime
+
+
+class TestRuntimeLimit:
+    """Test reading the runtime limit from the job directives."""
+
+    def test_spellings(self):
+        assert runtime_limit({"+MaxRuntime": 3600}) == 3600
+        assert runtime_limit({"MY.MaxRuntime": "7200"}) == 7200
+        assert runtime_limit({"+maxruntime": '"60"'}) == 60
+
+    def test_missing_or_expression(self):
+        assert runtime_limit({"universe": "vanilla"}) is None
+        assert runtime_limit(None) is None
+        assert runtime_limit({"+MaxRuntime": "2 * $(Hours)"}) is None
+
+
+class TestStaggeredLifetime:
+    """Test the spread of worker lifetimes."""
+
+    def test_first_gets_full_lifetime(self):
+        assert staggered_lifetime(3600, 0, stagger=0.2, margin=600) == 3000
+
+    def test_spread_within_window(self):
+        lifetimes = [staggered_lifetime(1000, i, stagger=0.2) for i in range(50)]
+        assert all(800 < lifetime <= 1000 for lifetime in lifetimes)
+        # Successive workers get deadlines spread over the window
+        assert max(lifetimes) - min(lifetimes) > 190
+        assert len(set(lifetimes)) == 50
+
+    def test_no_stagger(self):
+        assert staggered_lifetime(1000, 7, stagger=0) == 1000
+
+
+class TestRecyclePolicy:
+    """Test the replacement and retirement of workers."""
+
+    def test_invalid(self):
+        with pytest.raises(ValueError, match="stagger"):
+            RecyclePolicy(3600, stagger=1)
+        with pytest.raises(ValueError, match="no time"):
+            RecyclePolicy("10m", margin="5m", lead="10m")
+
+    def test_replace_then_retire(self):
+        policy = RecyclePolicy("1h", stagger=0.5, margin="5m", lead="10m")
+        policy.observe({"a", "b"}, ["a", "b"], now=0)
+        assert policy.deadline("a") != policy.deadline("b")
+        assert policy.deadline("c") is None
+        first = min(["a", "b"], key=policy.deadline)
+
+        assert policy.due({"a", "b"}, now=0) == []
+        now = policy.deadline(first) - 600
+        assert policy.due({"a", "b"}, now) == [first]
+
+        policy.replacements[first] = "c"
+        assert policy.due({"a", "b"}, now) == []
+        # The old worker stays until its replacement connects
+        assert policy.retirable({"a", "b"}) == []
+        policy.observe({"a", "b", "c"}, ["a", "b", "c"], now + 60)
+        assert policy.retirable({"a", "b", "c"}) == [first]
+        assert policy.deadline("c") == now + 60 + policy.lifetimes["c"]
+
+    def test_old_worker_gone(self):
+        policy = RecyclePolicy("1h", margin=0, lead="10m")
+        policy.observe({"a"}, ["a"], now=0)
+        policy.replacements["a"] = "b"
+        assert policy.retirable({"b"}) == ["a"]
+        assert policy.retirable(set()) == ["a"]
+
+    def test_cancelled_replacement_resubmitted(self):
+        policy = RecyclePolicy("1h", margin=0, lead="10m")
+        policy.observe({"a"}, ["a"], now=0)
+        policy.replacements["a"] = "b"
+        # The replacement was removed by a scale down
+        policy.observe({"a"}, ["a"], now=3000)
+        assert policy.replacements == {}
+        assert policy.due({"a"}, now=3000) == ["a"]
+
+    def test_forget_removed_jobs(self):
+        policy = RecyclePolicy("1h")
+        policy.observe({"a"}, ["a"], now=0)
+        policy.observe(set(), [], now=10)
+        assert policy.started == {}
+        assert policy.lifetimes == {}
@@ -0,0 +1,182 @@
+import os
+
+import pytest
+
+from dask_iclx.fairshare import FairShareState
+from dask_iclx.simulation import CapacitySimulator, PoolTrace, Workload
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+def trace(cores=1000, memory="10 TiB", **kwargs):
+    from dask.utils import parse_bytes
+
+    return PoolTrace(slots=[(0, cores, parse_bytes(memory))], **kwargs)
+
+
+class TestPoolTrace:
+    """Test recorded pool traces."""
+
+    def test_free_steps(self):
+        t = PoolTrace(slots=[(600, 10, 100), (0, 4, 40)])
+        assert t.free(0) == (4, 40)
+        assert t.free(599) == (4, 40)
+        assert t.free(3600) == (10, 100)
+
+    def test_round_trip(self, tmp_path):
+        original = PoolTrace.from_dict(
+            {
+                "slots": [{"time": 0, "cores": 8, "memory": "16 GiB"}],
+                "match_latency": [10, 20],
+                "eviction_rate": 0.1,
+                "fairshare": [{"time": 0, "user": "u", "priority": 500, "quota": 8}],
+            }
+        )
+        assert original.free(0) == (8, 16 * 2**30)
+        path = str(tmp_path / "trace.json")
+        original.to_file(path)
+        loaded = PoolTrace.from_file(path)
+        assert loaded.slots == original.slots
+        assert loaded.match_latency == [10, 20]
+        assert loaded.fairshare_state(100).quota == 8
+
+    def test_from_event_logs(self):
+        t = PoolTrace.from_event_logs(
+            [
+                os.path.join(DATA, "worker-1234.log"),
+                os.path.join(DATA, "worker-1235.log"),
+            ],
+            slots=[(0, 10, 100)],
+        )
+        # Submit to execute, eviction to execute again, and the second job
+        assert sorted(t.match_latency) == [99, 129, 462]
+        # One eviction over 2732s + 1206s + 2538s of running
+        assert t.eviction_rate == pytest.approx(3600 / 6476)
+
+    def test_from_event_logs_without_year(self, tmp_path):
+        import re
+        from datetime import datetime
+
+        paths = []
+        for name in ("worker-1234.log", "worker-1235.log"):
+            with open(os.path.join(DATA, name)) as f:
+                text = re.sub(r"\) 2025-(\d\d)-(\d\d) ", r") \1/\2 ", f.read())
+            path = tmp_path / name
+            path.write_text(text)
+            modified = datetime(2025, 3, 5).timestamp()
+            os.utime(path, (modified, modified))
+            paths.append(str(path))
+        t = PoolTrace.from_event_logs(paths, slots=[(0, 10, 100)])
+        assert sorted(t.match_latency) == [99, 129, 462]
+        assert t.eviction_rate == pytest.approx(3600 / 6476)
+        given = PoolTrace.from_event_logs(paths, slots=[(0, 10, 100)], year=2025)
+        assert given.match_latency == t.match_latency
+
+    def test_from_event_logs_new_year(self, tmp_path):
+        from datetime import datetime
+
+        path = tmp_path / "worker-1.log"
+        path.write_text(
+            "000 (1.000.000) 12/31 23:59:00 Job submitted from host: <...>\n...\n"
+            "001 (1.000.000) 01/01 00:01:00 Job executing on host: <...>\n...\n"
+        )
+        modified = datetime(2026, 1, 1, 1).timestamp()
+        os.utime(path, (modified, modified))
+        t = PoolTrace.from_event_logs([str(path)], slots=[(0, 10, 100)])
+        assert t.match_latency == [120]
+
+
+class TestCapacitySimulator:
+    """Test the capacity simulation."""
+
+    def test_requires_one_of_jobs_or_adapt(self):
+        with pytest.raises(ValueError):
+            CapacitySimulator(trace(), Workload.uniform(1, 1))
+        with pytest.raises(ValueError, match="fair-share"):
+            CapacitySimulator(trace(), Workload.uniform(1, 1), jobs=1, fairshare=True)
+
+    def test_ample_pool(self):
+        result = CapacitySimulator(
+            trace(match_latency=[60]), Workload.uniform(40, 100), cores=2, jobs=5
+        ).run()
+        assert result.time_to_capacity == 60
+        # 40 tasks on 10 cores take four rounds
+        assert result.makespan == 60 + 400
+        assert result.idle_slot_hours == 0
+        assert result.slot_hours == pytest.approx(10 * 400 / 3600)
+
+    def test_idle_slots(self):
+        result = CapacitySimulator(
+            trace(), Workload.uniform(1, 3600), cores=2, jobs=1
+        ).run()
+        assert result.idle_slot_hours == pytest.approx(1)
+        assert result.slot_hours == pytest.approx(2)
+
+    def test_shape_limited_by_memory(self):
+        t = PoolTrace(slots=[(0, 100, 8 * 2**30), (1800, 100, 16 * 2**30)])
+        result = CapacitySimulator(
+            t, Workload.uniform(8, 600), cores=1, memory="4 GiB", jobs=4
+        ).run()
+        assert result.peak_jobs == 4
+        assert result.time_to_capacity == 1800
+        assert result.makespan == 1800 + 600
+
+    def test_never_reaches_capacity(self):
+        result = CapacitySimulator(
+            trace(cores=2), Workload.uniform(4, 60), cores=1, jobs=4
+        ).run()
+        assert result.time_to_capacity is None
+        assert result.makespan == 120
+
+    def test_evictions_rerun_tasks(self):
+        result = CapacitySimulator(
+            trace(eviction_rate=10), Workload.uniform(20, 600), cores=1, jobs=4, seed=1
+        ).run()
+        assert result.evictions > 0
+        assert result.makespan > 5 * 600
+
+    def test_hedge_cancels_surplus(self):
+        t = trace(match_latency=[10, 10, 10, 10000])
+        result = CapacitySimulator(
+            t, Workload.uniform(100, 60), cores=1, jobs=10, hedge=0.5, seed=3
+        ).run()
+        assert result.jobs_submitted == 15
+        assert result.jobs_cancelled > 0
+
+    def test_adaptive_keeps_hedge_surplus(self):
+        # Nothing starts within the run, so the hedge never reaches its target
+        t = trace(match_latency=[10000])
+        result = CapacitySimulator(
+            t,
+            Workload.uniform(1000, 600),
+            cores=1,
+            adapt={"maximum": 10},
+            hedge=0.5,
+            max_time=100,
+        ).run()
+        assert result.jobs_submitted == 15
+        assert result.jobs_cancelled == 0
+
+    def test_fairshare_caps_jobs(self):
+        t = trace(
+            fairshare=[
+                (0, FairShareState("u", priority=500, quota=10, usage=6)),
+                (3600, FairShareState("u", priority=500, quota=10, usage=0)),
+            ]
+        )
+        result = CapacitySimulator(
+            t, Workload.uniform(100, 600), cores=1, jobs=10, fairshare=True
+        ).run()
+        assert result.jobs_submitted == 10
+        assert result.time_to_capacity == pytest.approx(3600, abs=60)
+
+    def test_adaptive_scales_down(self):
+        # The last long task keeps one job busy while the others go idle
+        workload = Workload([30.0] * 100 + [3600.0])
+        result = CapacitySimulator(
+            trace(), workload, cores=1, adapt={"maximum": 20}
+        ).run()
+        assert result.peak_jobs == 20
+        assert result.time_to_capacity is not None
+        assert result.jobs_cancelled == 19
+        assert result.idle_slot_hours < 0.1
@@ -0,0 +1,150 @@
+import hashlib
+import os
+import subprocess
+
+import pytest
+
+from dask_iclx.staging import (
+    STAGE_DIR_ENV,
+    file_digest,
+    staged_path,
+    staging_setup,
+)
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    shared = tmp_path / "vols"
+    shared.mkdir()
+    paths = []
+    for name, content in [("calib.json", b"{}"), ("lookup.bin", b"\x00" * 1000)]:
+        path = shared / name
+        path.write_bytes(content)
+        paths.append(str(path))
+    return paths
+
+
+class TestFileDigest:
+    """Test content hashing of staged inputs."""
+
+    def test_digest(self, inputs):
+        expected = hashlib.sha256(b"\x00" * 1000).hexdigest()
+        assert file_digest(inputs[1], block_size=7) == expected
+
+
+class TestStagingSetup:
+    """Test submit directives and prologue for staged inputs."""
+
+    def test_no_inputs(self):
+        assert staging_setup(None) == ({}, [])
+        assert staging_setup([], method="bogus") == ({}, [])
+
+    def test_unknown_method(self, inputs):
+        with pytest.raises(ValueError, match="Unknown staging method"):
+            staging_setup(inputs, method="bogus")
+
+    def test_missing_file(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            staging_setup([str(tmp_path / "missing")])
+
+    def test_duplicate_names(self, inputs, tmp_path):
+        other = tmp_path / "calib.json"
+        other.write_text("{}")
+        with pytest.raises(ValueError, match="calib.json"):
+            staging_setup([inputs[0], str(other)])
+
+    def test_transfer(self, inputs):
+        directives, prologue = staging_setup(inputs, method="transfer")
+        assert directives["should_transfer_files"] == "YES"
+        assert directives["transfer_input_files"] == ",".join(inputs)
+        assert prologue == [f"export {STAGE_DIR_ENV}=$_CONDOR_SCRATCH_DIR"]
+
+    def test_cache(self, inputs, tmp_path):
+        """Test that the cache prologue stages files once per node."""
+        cache = tmp_path / "cache"
+        directives, prologue = staging_setup(
+            inputs, method="cache", cache_directory=str(cache)
+        )
+        assert directives == {}
+
+        for job in ("job1", "job2"):
+            scratch = tmp_path / job
+            scratch.mkdir()
+            env = dict(os.environ, _CONDOR_SCRATCH_DIR=str(scratch))
+            subprocess.run(["/bin/sh", "-c", "; ".join(prologue)], env=env, check=True)
+
+            staged = scratch / "dask-iclx-inputs" / "lookup.bin"
+            assert staged.read_bytes() == b"\x00" * 1000
+
+        digest = file_digest(inputs[1])
+        cached = cache / digest / "lookup.bin"
+        assert cached.exists()
+        # Both jobs share the cached inode, which they cannot write to
+        assert os.stat(cached).st_nlink == 3
+        assert not os.stat(cached).st_mode & 0o222
+        assert sorted(os.listdir(cache / digest)) == ["lookup.bin"]
+
+    def test_cache_verifies_digest(self, inputs, tmp_path):
+        """Test that a file changed after submission is not cached under the old digest."""
+        cache = tmp_path / "cache"
+        _, prologue = staging_setup(inputs, method="cache", cache_directory=str(cache))
+        with open(inputs[1], "wb") as f:
+            f.write(b"\x01" * 1000)
+
+        scratch = tmp_path / "job"
+        scratch.mkdir()
+        env = dict(os.environ, _CONDOR_SCRATCH_DIR=str(scratch))
+        run = subprocess.run(
+            ["/bin/sh", "-c", "; ".join(prologue)],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+
+        assert "changed since submission" in run.stderr
+        staged = scratch / "dask-iclx-inputs" / "lookup.bin"
+        assert staged.read_bytes() == b"\x01" * 1000
+        digest = hashlib.sha256(b"\x00" * 1000).hexdigest()
+        assert os.listdir(cache / digest) == []
+
+    def test_cache_eviction(self, inputs, tmp_path):
+        """Test that least recently used entries are removed beyond the size limit."""
+        cache = tmp_path / "cache"
+        for i in range(3):
+            stale = cache / f"stale{i}"
+            stale.mkdir(parents=True)
+            (stale / "data").write_bytes(b"\x01" * 65536)
+            os.utime(stale, (1000 + i, 1000 + i))
+        _, prologue = staging_setup(
+            inputs,
+            method="cache",
+            cache_directory=str(cache),
+            cache_max_size=100 * 1024,
+        )
+
+        scratch = tmp_path / "job"
+        scratch.mkdir()
+        env = dict(os.environ, _CONDOR_SCRATCH_DIR=str(scratch))
+        subprocess.run(["/bin/sh", "-c", "; ".join(prologue)], env=env, check=True)
+
+        entries = set(os.listdir(cache))
+        # This job's inputs are kept, then the most recently used stale entry
+        assert {file_digest(p) for p in inputs} <= entries
+        assert "stale2" in entries
+        assert "stale0" not in entries
+        assert (scratch / "dask-iclx-inputs" / "calib.json").exists()
+
+
+class TestStagedPath:
+    """Test resolving staged inputs from inside a task."""
+
+    def test_outside_job(self, monkeypatch):
+        monkeypatch.delenv(STAGE_DIR_ENV, raising=False)
+        assert staged_path("/vols/calib.json") == "/vols/calib.json"
+
+    def test_inside_job(self, monkeypatch, tmp_path):
+        (tmp_path / "calib.json").write_text("{}")
+        monkeypatch.setenv(STAGE_DIR_ENV, str(tmp_path))
+        assert staged_path("/vols/calib.json") == str(tmp_path / "calib.json")
+        assert staged_path("/vols/other.json") == "/vols/other.json"
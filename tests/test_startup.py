@@ -0,0 +1,131 @@
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from dask_iclx import preload
+from dask_iclx.startup import PRELOAD_SCRIPT, bytecode_cache_key, startup_setup
+
+
+class TestBytecodeCacheKey:
+    """Test the bytecode cache naming."""
+
+    def test_keyed_by_image(self):
+        key = bytecode_cache_key("/cvmfs/unpacked.cern.ch/img:v1", "singularity")
+        assert key.startswith("img_v1-")
+        assert key != bytecode_cache_key(
+            "/cvmfs/unpacked.cern.ch/img:v2", "singularity"
+        )
+
+    def test_keyed_by_environment(self, monkeypatch):
+        view = "/cvmfs/sft.cern.ch/lcg/views/LCG_107/x86_64-el9-gcc14-opt"
+        monkeypatch.setattr(sys, "executable", f"{view}/bin/python3")
+        key = bytecode_cache_key("/some/image", "singularity", lcg=True)
+        assert key.startswith("x86_64-el9-gcc14-opt-")
+        assert key == bytecode_cache_key(None, "none")
+
+
+class TestStartupSetup:
+    """Test the submit settings for faster worker start-up."""
+
+    def test_nothing(self):
+        assert startup_setup() == ({}, [], [])
+
+    def test_bytecode_cache_only(self):
+        directives, env, args = startup_setup(bytecode_cache="/vols/pyc", key="k")
+        assert directives == {}
+        assert env == ["PYTHONPYCACHEPREFIX=/vols/pyc/k"]
+        assert args == []
+
+    def test_preload(self):
+        directives, env, args = startup_setup(["numpy", "uproot.models"])
+        assert directives["transfer_input_files"] == PRELOAD_SCRIPT
+        assert env == ["DASK_ICLX_PRELOAD_MODULES=numpy:uproot.models"]
+        assert args == ["--preload $_CONDOR_SCRATCH_DIR/preload.py"]
+
+    def test_invalid_module(self):
+        with pytest.raises(ValueError, match="Invalid module"):
+            startup_setup(["numpy; rm -rf /"])
+
+
+class TestPreload:
+    """Test the worker preload."""
+
+    def test_warm_imports(self):
+        timings = preload.warm_imports(["json", "no_such_module_here"])
+        assert timings["json"] >= 0
+        assert timings["no_such_module_here"] is None
+
+    def test_reports_once_connected(self, monkeypatch):
+        monkeypatch.setenv("DASK_ICLX_PRELOAD_MODULES", "json")
+        events = []
+        worker = SimpleNamespace(
+            name="ic-worker-0",
+            status=SimpleNamespace(name="running"),
+            batched_stream=SimpleNamespace(comm=None),
+            log_event=lambda topic, msg: events.append((topic, msg)),
+        )
+
+        async def run():
+            preload.dask_setup(worker)
+            await asyncio.sleep(0.15)
+            assert events == []
+            worker.batched_stream.comm = object()
+            await asyncio.sleep(0.15)
+
+        asyncio.run(run())
+        ((topic, msg),) = events
+        assert topic == "iclx-startup"
+        assert msg["name"] == "ic-worker-0"
+        assert set(msg["imports"]) == {"json"}
+
+    def test_startup_excludes_imports(self, monkeypatch):
+        events = []
+        worker = SimpleNamespace(
+            name="ic-worker-0",
+            status=SimpleNamespace(name="running"),
+            batched_stream=SimpleNamespace(comm=object()),
+            log_event=lambda topic, msg: events.append((topic, msg)),
+        )
+        monkeypatch.setenv("DASK_ICLX_PRELOAD_MODULES", "slow")
+        monkeypatch.setattr(preload, "_process_start", time.time)
+
+        def slow_imports(modules):
+            time.sleep(0.2)
+            return dict.fromkeys(modules, 0.2)
+
+        monkeypatch.setattr(preload, "warm_imports", slow_imports)
+
+        async def run():
+            preload.dask_setup(worker)
+            await asyncio.sleep(0.15)
+
+        asyncio.run(run())
+        ((_, msg),) = events
+        assert msg["startup"] < 0.1
+        assert msg["import_seconds"] >= 0.2
+
+
+class TestImportTimings:
+    """Test reading the start-up timings on the cluster."""
+
+    def test_import_timings(self):
+        from unittest.mock import patch
+
+        from dask_iclx.cluster import ICCluster
+
+        with patch("dask_jobqueue.HTCondorCluster.__init__", return_value=None):
+            cluster = ICCluster()
+        first = {"name": "w-0", "worker": "tcp://a:1", "startup": 12.0, "imports": {}}
+        restarted = {
+            "name": "w-0",
+            "worker": "tcp://a:2",
+            "startup": 4.0,
+            "imports": {},
+        }
+        cluster.scheduler = SimpleNamespace(
+            get_events=lambda topic: ((1.0, first), (2.0, restarted))
+        )
+        assert cluster.import_timings() == {"w-0": restarted}
@@ -0,0 +1,161 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from dask_iclx.cluster import ICJob
+from dask_iclx.targets import SubmitRouter, SubmitTarget
+
+
+class TestSubmitTarget:
+    """Test building submit targets."""
+
+    def test_from_spec(self):
+        assert SubmitTarget.from_spec("lx04") == SubmitTarget(name="lx04")
+        target = SubmitTarget.from_spec(
+            {"name": "lx05", "pool": "cm.ic.ac.uk", "weight": 2}
+        )
+        assert target.weight == 2.0
+        assert SubmitTarget.from_spec(target) is target
+        with pytest.raises(TypeError):
+            SubmitTarget.from_spec(42)
+
+    def test_label_and_args(self):
+        target = SubmitTarget(name="lx04.hep.ph.ic.ac.uk", pool="cm:9618")
+        assert target.label == "cm_9618_lx04.hep.ph.ic.ac.uk"
+        assert target.command_args == [
+            "-name",
+            "lx04.hep.ph.ic.ac.uk",
+            "-pool",
+            "cm:9618",
+        ]
+        assert SubmitTarget().label == "local"
+        assert SubmitTarget().command_args == []
+
+
+class TestSubmitRouter:
+    """Test distributing jobs over submit targets."""
+
+    def test_requires_targets(self):
+        with pytest.raises(ValueError):
+            SubmitRouter([])
+
+    def test_weights(self):
+        router = SubmitRouter(["a", {"name": "b", "weight": 3}])
+        placed = []
+        for _ in range(8):
+            target = router.candidates()[0]
+            router.record_submit(target, 1.0)
+            placed.append(target.name)
+        assert placed.count("b") == 6
+
+    def test_slow_start_rate_gets_fewer_jobs(self):
+        router = SubmitRouter(["fast", "slow"], smoothing=1.0)
+        fast, slow = router.targets
+        router.record_start(fast, 10)
+        router.record_start(slow, 600)
+        assert router.candidates()[0] == fast
+        # (1 + 10) * (queued + 1) passes (1 + 600) once 54 jobs are queued on fast
+        for _ in range(54):
+            router.record_submit(fast, 1.0)
+        assert router.candidates()[0] == slow
+
+    def test_failing_target_cools_down(self):
+        router = SubmitRouter(["a", "b"], cooldown=60)
+        a, b = router.targets
+        router.record_failure(a, now=0)
+        assert router.candidates(now=10) == [b, a]
+        assert router.candidates(now=61)[0] == a
+        router.record_failure(a, now=61)
+        assert router.stats[a].cooldown_until == 61 + 120
+        router.record_gone(a)
+        assert router.stats[a].queued == 0
+
+
+class TestICJobSubmitTargets:
+    """Test ICJob submission through a submit router."""
+
+    def test_apply_target(self, tmp_path):
+        job = ICJob(name="w-0", log_directory=str(tmp_path))
+        job._apply_submit_target(SubmitTarget(name="lx04"))
+        assert job.submit_command.endswith("-name lx04")
+        assert job.cancel_command.startswith("condor_rm")
+        assert job.cancel_command.endswith("-name lx04")
+        assert job.job_header_dict["Log"].endswith("/worker-lx04-$(ClusterId).log")
+        assert "worker-lx04-" in job.job_script()
+
+        job._apply_submit_target(SubmitTarget(name="lx05"))
+        assert job.submit_command.endswith("-name lx05")
+        assert "lx04" not in job.submit_command
+        assert job.job_header_dict["Log"].endswith("/worker-lx05-$(ClusterId).log")
+
+        job.job_id = "12.0"
+        assert job.state_key == "lx05/12.0"
+
+    def test_apply_target_keeps_directories(self):
+        log = "/vols/cms/u/dask-worker-logs/worker-$(ClusterId).log"
+        job = ICJob(name="w-0", job_extra_directives={"Log": log})
+        job._apply_submit_target(SubmitTarget(name="lx04"))
+        job._apply_submit_target(SubmitTarget(name="lx05"))
+        assert (
+            job.job_header_dict["Log"]
+            == "/vols/cms/u/dask-worker-logs/worker-lx05-$(ClusterId).log"
+        )
+
+    def test_start_falls_back_to_next_target(self):
+        router = SubmitRouter(["full", "free"])
+        job = ICJob(name="w-0", submit_router=router)
+        commands = []
+
+        async def call(cmd, **kwargs):
+            commands.append(cmd)
+            if "full" in cmd:
+                raise RuntimeError(
+                    "Number of submitted jobs would exceed MAX_JOBS_PER_OWNER"
+                )
+            return "1 job(s) submitted to cluster 77."
+
+        job._call = call
+        asyncio.run(job.start())
+
+        assert job.job_id == "77.0"
+        assert job.submit_target.name == "free"
+        assert job.submitted_at is not None
+        assert len(commands) == 2
+        assert router.stats[router.targets[0]].failures == 1
+        assert router.stats[router.targets[1]].queued == 1
+
+    def test_start_fails_on_every_target(self):
+        job = ICJob(name="w-0", submit_router=SubmitRouter(["a"]))
+
+        async def call(cmd, **kwargs):
+            raise RuntimeError("schedd down")
+
+        job._call = call
+        with pytest.raises(RuntimeError, match="every submit target"):
+            asyncio.run(job.start())
+
+    def test_queued_released_once(self):
+        router = SubmitRouter(["a"])
+        job = ICJob(name="w-0", submit_router=router)
+
+        async def call(cmd, **kwargs):
+            return "1 job(s) submitted to cluster 77."
+
+        job._call = call
+        asyncio.run(job.start())
+        stats = router.stats[router.targets[0]]
+        assert stats.queued == 1
+
+        # Started, seen by both the event log and the worker connecting
+        job._left_queue(started=True)
+        job._left_queue(started=True)
+        assert stats.queued == 0
+        assert stats.start_delay is not None
+
+        asyncio.run(job.start())
+        assert stats.queued == 1
+        # Cancelled by a scale down before it started
+        with patch.object(ICJob, "_close_job", AsyncMock()):
+            asyncio.run(job.close())
+        assert stats.queued == 0